@@ -0,0 +1,92 @@
+"""
+Compares the crawler's lxml link extractor with the BeautifulSoup implementation it replaced.
+
+Run from backend/: python -m benchmarks.bench_link_extraction --links 2000 --rounds 20
+"""
+import re
+import time
+import random
+import argparse
+
+from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup
+
+from medscrape.links import extract_links
+
+BASE_URL = "https://www.example-hospital.org/services/cardiology/"
+DOMAIN = "www.example-hospital.org"
+
+def baseline_extract_links(html, base_url, domain_name):
+    """
+    The extraction loop previously inlined in enumeration.fetch_page_links.
+    """
+    def is_valid(url):
+        parsed = urlparse(url)
+        return bool(parsed.netloc) and bool(parsed.scheme)
+
+    def should_exclude_link(href):
+        excluded_patterns = [
+            '^#', '^mailto:', '^tel:', '^javascript:', r'\.(pdf|docx|xlsx|zip)$',
+            '/login', '/logout', '/register', '/password',
+        ]
+        return any(re.search(pattern, href, re.IGNORECASE) for pattern in excluded_patterns)
+
+    candidates = set()
+    soup = BeautifulSoup(html, "html.parser")
+    for a_tag in soup.findAll("a"):
+        href = a_tag.get("href")
+        if href and not should_exclude_link(href):
+            normalized_href = urljoin(base_url, href).split('#')[0].split('?')[0]
+            parsed_href = urlparse(normalized_href)
+            if parsed_href.scheme in ['http', 'https'] and is_valid(normalized_href) and parsed_href.netloc == domain_name:
+                candidates.add(normalized_href)
+    return candidates
+
+def synthetic_page(link_count, seed=0):
+    """
+    Builds a page shaped like a hospital site: nav and footer links repeated around body text, with relative,
+    absolute, external, anchor, mailto and download links.
+    """
+    rng = random.Random(seed)
+    shapes = [
+        lambda i: f"/departments/{i % 200}/",
+        lambda i: f"../doctors/profile-{i}.html?ref=nav",
+        lambda i: f"https://{DOMAIN}/news/{2024 - i % 5}/article-{i}#top",
+        lambda i: f"https://partner-{i % 7}.example.com/page",
+        lambda i: f"#section-{i}",
+        lambda i: f"mailto:clinic{i}@example-hospital.org",
+        lambda i: f"/files/brochure-{i}.pdf",
+        lambda i: "/patient-portal/login",
+    ]
+    parts = ["<html><head><title>Cardiology</title></head><body><nav>"]
+    for i in range(link_count):
+        href = rng.choice(shapes)(i)
+        parts.append(f'<div class="item"><p>Lorem ipsum dolor sit amet {i}.</p><a class="link" href="{href}">Link {i}</a></div>')
+    parts.append("</nav></body></html>")
+    return "".join(parts)
+
+def run(extractor, html, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        links = extractor(html, BASE_URL, DOMAIN)
+    return time.perf_counter() - start, links
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--links", type=int, default=2000, help="Anchors per synthetic page")
+    parser.add_argument("--rounds", type=int, default=20, help="Times each extractor parses the page")
+    args = parser.parse_args()
+
+    html = synthetic_page(args.links)
+    results = {}
+    for name, extractor in (("beautifulsoup", baseline_extract_links), ("lxml", extract_links)):
+        extractor(html, BASE_URL, DOMAIN)  # Warm up imports and caches
+        elapsed, links = run(extractor, html, args.rounds)
+        results[name] = links
+        print(f"{name:>14}: {args.links * args.rounds / elapsed:>12,.0f} anchors/s  {args.rounds / elapsed:>8,.1f} pages/s  ({len(links)} links kept)")
+
+    if results["beautifulsoup"] != results["lxml"]:
+        raise SystemExit("Extractors disagree on the links found")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Offline end-to-end benchmarks for crawl, ingest and query.
+
+A synthetic hospital site is served locally and crawled with get_all_website_links. The crawled pages are ingested
+through process_html_content into a temporary LanceDB directory, and the corpus is then queried with lance_search and
+lance_retrieval. Redis is replaced by fakeredis and the LLM by a local OpenAI-compatible stub, so no external service
+is contacted. Prerequisites: the embedding and ColBERT models must already be in the local Hugging Face cache, and
+fakeredis must be installed (it is in the dev and test dependency groups).
+
+Run from backend/:
+    python -m benchmarks.run_benchmarks --pages 500 --output results.json
+    python -m benchmarks.run_benchmarks --output new.json --baseline results.json  # Exits 1 on a regression
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from .synthetic_site import SyntheticSite, serve
+
+QUESTIONS = [
+    "How is atrial fibrillation treated?",
+    "Which department runs clinical trials for melanoma?",
+    "How long is the wait for a migraine referral?",
+    "Is pre-authorization needed for chemotherapy?",
+    "Where is physical therapy for hip fractures offered?",
+    "What should patients know before catheter ablation?",
+    "Are there trials enrolling adults with type 2 diabetes?",
+    "Who explains the risks of laparoscopic surgery?",
+]
+
+# (stage, metric, whether higher is better) checked against --baseline
+TRACKED_METRICS = [
+    ("crawl", "pages_per_second", True),
+    ("ingest", "chunks_per_second", True),
+    ("search", "p95_ms", False),
+    ("retrieval", "p95_ms", False),
+]
+
+def latency_summary(samples) -> dict:
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+async def serve_stub_llm(latency):
+    """
+    OpenAI-compatible chat completions endpoint that answers every question by quoting the start of its context.
+    """
+    from aiohttp import web
+
+    async def chat_completions(request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        context, question = body["messages"][1]["content"], body["messages"][-1]["content"].removeprefix("Question: ")
+        arguments = {
+            "tld": "benchmark",
+            "question": question,
+            "answer": [{"flag": True, "response": "See the quoted context.", "reasoning": "Quoted from the context.", "substring_quote": [context[:80]], "source_url": ["none"]}],
+        }
+        return web.json_response({
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": None, "tool_calls": [{"id": "call_benchmark", "type": "function", "function": {"name": "QuestionAnswered", "arguments": json.dumps(arguments)}}]},
+            }],
+            "usage": {"prompt_tokens": len(context) // 4, "completion_tokens": 50, "total_tokens": len(context) // 4 + 50},
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return await serve(app)
+
+def configure_environment(workdir, llm_base_url):
+    """
+    Points every module at temporary storage and the stub LLM; must run before medscrape is imported.
+    """
+    os.environ["LANCE_DB_URI"] = os.path.join(workdir, "lancedb")
+    os.environ["CONTENT_CACHE_DIR"] = os.path.join(workdir, "pages")
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["OPENAI_BASE_URL"] = llm_base_url
+    os.environ.setdefault("PARTITION_EXECUTOR", "process")
+    os.environ["RETRIEVAL_WARMUP"] = "false"
+    os.environ["EXPORT_SINK"] = "csv"
+    os.environ["EXPORT_PATH"] = os.path.join(workdir, "answers.csv")
+
+def use_fake_redis(stages):
+    """
+    Swaps the module-level Redis clients for fakeredis clients sharing one in-memory server.
+
+    Only the modules the selected stages use are imported, so a crawl-only run does not need the ingest stack.
+    """
+    import fakeredis
+    from medscrape import enumeration, log_shipping
+
+    server = fakeredis.FakeServer()
+    async_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    enumeration.redis_client = async_client
+    log_shipping.log_shipper.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    if "ingest" in stages or "query" in stages:
+        from medscrape import answer_cache, processing
+
+        processing.redis_client = async_client
+        processing.page_state_store.redis_client = async_client
+        answer_cache.redis_client = async_client
+        answer_cache.answer_cache.redis_client = async_client
+    return async_client
+
+async def bench_crawl(site_url, session, args):
+    from medscrape.enumeration import USER_AGENT, get_all_website_links
+    from medscrape.politeness import PolitenessScheduler
+
+    # The politeness defaults would measure the rate limit rather than the crawler
+    scheduler = PolitenessScheduler(USER_AGENT, rate=args.crawl_rate, initial_window=args.workers, max_window=args.workers)
+    start = time.perf_counter()
+    website = await get_all_website_links(f"{site_url}/", session, max_pages=args.pages * 2, workers=args.workers, scheduler=scheduler, mode=args.enumeration_mode)
+    elapsed = time.perf_counter() - start
+    return website, {
+        "pages": len(website.urls),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(website.urls) / elapsed, 2),
+        "mode": args.enumeration_mode,
+        "connection_stats": website.connection_stats,
+    }
+
+async def bench_ingest(urls, tld, session):
+    from medscrape import processing
+    from medscrape.writer import BulkWriter
+
+    writer = BulkWriter(processing.table, processing.embed_func, write_lock=processing.table_write_lock, embedding_cache=None)
+    pending = iter(urls)
+    seen_pdfs = set()
+
+    async def worker():
+        for url in pending:
+            await processing.process_html_content(url, tld, session=session, seen_pdfs=seen_pdfs, writer=writer)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(processing.MAX_IN_FLIGHT_PAGES, len(urls)))))
+    writer_stats = await writer.close(compact=False)
+    elapsed = time.perf_counter() - start
+
+    # Not timed: the search stage needs the full-text index, which is rebuilt once per crawl in production
+    index_start = time.perf_counter()
+    await asyncio.to_thread(processing._rebuild_fts_index)
+    return {
+        "pages": len(urls),
+        "chunks": writer.rows_written,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(writer.rows_written / elapsed, 2),
+        "pages_per_second": round(len(urls) / elapsed, 2),
+        "embed_seconds": writer_stats.get("embed_seconds"),
+        "write_seconds": writer_stats.get("write_seconds"),
+        "fts_index_seconds": round(time.perf_counter() - index_start, 3),
+    }
+
+async def bench_queries(tld, redis_client, iterations):
+    from medscrape.models import UserQueries
+    from medscrape.retrieval import get_retrieval_service, lance_retrieval, lance_search
+
+    warmup_start = time.perf_counter()
+    await asyncio.to_thread(get_retrieval_service().warmup)
+    warmup_seconds = round(time.perf_counter() - warmup_start, 3)
+
+    search_samples, retrieval_samples = [], []
+    for i in range(iterations):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        start = time.perf_counter()
+        await lance_search(UserQueries(tld=tld, questions=[question]))
+        search_samples.append(time.perf_counter() - start)
+
+        await redis_client.flushdb()  # Every retrieval should reach search and the LLM, not the answer cache
+        start = time.perf_counter()
+        await lance_retrieval(UserQueries(tld=tld, questions=[question]))
+        retrieval_samples.append(time.perf_counter() - start)
+    return {**latency_summary(search_samples), "warmup_seconds": warmup_seconds}, latency_summary(retrieval_samples)
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for stage, metric, higher_is_better in TRACKED_METRICS:
+        current = results.get(stage, {}).get(metric)
+        previous = baseline.get("results", {}).get(stage, {}).get(metric)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{stage}.{metric}: {previous} -> {current} ({change:+.1%})")
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args) -> dict:
+    site = SyntheticSite(pages=args.pages, fan_out=args.fan_out, pdf_ratio=args.pdf_ratio, boilerplate_ratio=args.boilerplate_ratio, seed=args.seed)
+    site_runner, site_url = await serve(site.app())
+    llm_runner, llm_url = await serve_stub_llm(args.llm_latency)
+    workdir = tempfile.mkdtemp(prefix="medscrape-bench-")
+    configure_environment(workdir, f"{llm_url}/v1")
+    redis_client = use_fake_redis(args.stages)
+    from medscrape.fetching import ConnectionStats, create_session
+
+    results = {}
+    try:
+        # The same pooled session the app shares between crawls
+        async with create_session(ConnectionStats()) as session:
+            website, results["crawl"] = await bench_crawl(site_url, session, args)
+            if "ingest" in args.stages or "query" in args.stages:
+                results["ingest"] = await bench_ingest(website.urls, site_url, session)
+            if "query" in args.stages:
+                results["search"], results["retrieval"] = await bench_queries(website.tld, redis_client, args.queries)
+    finally:
+        await site_runner.cleanup()
+        await llm_runner.cleanup()
+        if "ingest" in args.stages or "query" in args.stages:
+            from medscrape.processing import shutdown_partition_executor
+            shutdown_partition_executor()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workdir": workdir,
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks for crawl, ingest and query.")
+    parser.add_argument("--pages", type=int, default=500, help="Pages on the synthetic site")
+    parser.add_argument("--fan-out", type=int, default=8, help="Related-page links on every page")
+    parser.add_argument("--pdf-ratio", type=float, default=0.1, help="Share of pages linking a PDF")
+    parser.add_argument("--boilerplate-ratio", type=float, default=0.3, help="Share of each page that is navigation and footer boilerplate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default="crawl,ingest,query", help="Comma-separated stages; ingest and query need the crawl")
+    parser.add_argument("--enumeration-mode", default="links", choices=["links", "sitemap", "auto"])
+    parser.add_argument("--workers", type=int, default=32, help="Crawl fetch workers")
+    parser.add_argument("--crawl-rate", type=float, default=10000, help="Requests per second allowed to the local site")
+    parser.add_argument("--queries", type=int, default=50, help="Timed lance_search and lance_retrieval calls")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds the stub LLM waits before answering")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier results to compare against; exits 1 if a tracked metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change allowed before a metric counts as regressed")
+    args = parser.parse_args()
+    args.stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(report["results"], json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
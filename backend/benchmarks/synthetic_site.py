@@ -0,0 +1,134 @@
+"""
+Deterministic synthetic hospital website served from a local aiohttp server, for offline benchmarks.
+"""
+import random
+
+from aiohttp import web
+
+DEPARTMENTS = ["cardiology", "oncology", "neurology", "pediatrics", "orthopedics", "radiology", "dermatology", "urology"]
+CONDITIONS = [
+    "atrial fibrillation", "heart failure", "breast cancer", "migraine", "epilepsy", "asthma", "hip fracture",
+    "psoriasis", "kidney stones", "type 2 diabetes", "hypertension", "stroke", "scoliosis", "melanoma",
+]
+TREATMENTS = ["catheter ablation", "chemotherapy", "physical therapy", "laparoscopic surgery", "immunotherapy", "MRI-guided biopsy"]
+SENTENCES = [
+    "Our {department} team treats {condition} with {treatment} and follow-up care tailored to each patient.",
+    "Patients with {condition} are usually seen within two weeks of referral by a {department} specialist.",
+    "{treatment} for {condition} is offered at the main campus and at two outpatient clinics.",
+    "Before {treatment}, the {department} nurses explain preparation, risks and recovery times.",
+    "Insurance pre-authorization is required for {treatment} in most {department} cases.",
+    "Clinical trials for {condition} are currently enrolling adults through the {department} research office.",
+]
+BOILERPLATE = (
+    "<p>Call 555-0100 to schedule an appointment. Visiting hours are 8am to 8pm daily. "
+    "Masks are required in all patient care areas. Parking is free for patients in the north garage. "
+    "This website does not provide medical advice. In an emergency, call 911.</p>"
+)
+
+def minimal_pdf(text):
+    """
+    Builds a one-page PDF containing `text` with correct xref offsets, so PDF parsers accept it.
+    """
+    content = f"BT /F1 11 Tf 72 720 Td ({text.replace('(', '').replace(')', '')}) Tj ET".encode("latin-1", "replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+class SyntheticSite:
+    """
+    A site of `pages` pages, each linking to `fan_out` others, with navigation, footer and disclaimer boilerplate
+    making up roughly `boilerplate_ratio` of every page and a PDF linked from a `pdf_ratio` share of them.
+    """
+
+    def __init__(self, pages=500, fan_out=8, pdf_ratio=0.1, boilerplate_ratio=0.3, paragraphs=6, seed=0):
+        self.pages = pages
+        self.fan_out = fan_out
+        self.pdf_ratio = pdf_ratio
+        self.boilerplate_ratio = boilerplate_ratio
+        self.paragraphs = paragraphs
+        self.seed = seed
+
+    def path(self, i):
+        return "/" if i == 0 else f"/{DEPARTMENTS[i % len(DEPARTMENTS)]}/page-{i}"
+
+    def has_pdf(self, i):
+        return random.Random(f"{self.seed}-pdf-{i}").random() < self.pdf_ratio
+
+    def _sentence(self, rng):
+        return rng.choice(SENTENCES).format(department=rng.choice(DEPARTMENTS), condition=rng.choice(CONDITIONS), treatment=rng.choice(TREATMENTS))
+
+    def page_html(self, i):
+        rng = random.Random(f"{self.seed}-page-{i}")
+        body = "".join(f"<p>{' '.join(self._sentence(rng) for _ in range(4))}</p>" for _ in range(self.paragraphs))
+        # Repeat the shared blocks until they make up the requested share of the page
+        body_chars = len(body)
+        repeats = 0
+        if self.boilerplate_ratio > 0:
+            target = body_chars * self.boilerplate_ratio / (1 - self.boilerplate_ratio)
+            repeats = max(1, round(target / len(BOILERPLATE)))
+        nav = "".join(f'<a href="{self.path(j)}">{DEPARTMENTS[j % len(DEPARTMENTS)].title()}</a>' for j in range(1, min(self.pages, len(DEPARTMENTS) + 1)))
+        links = "".join(f'<li><a href="{self.path(rng.randrange(self.pages))}?ref=related">Related page</a></li>' for _ in range(self.fan_out))
+        pdf = f'<a href="/documents/patient-guide-{i}.pdf">Patient guide (PDF)</a>' if self.has_pdf(i) else ""
+        return (
+            f"<!DOCTYPE html><html><head><title>Page {i}</title></head><body>"
+            f"<nav>{nav}<a href=\"/patient-portal/login\">Log in</a></nav>"
+            f"<main><h1>{CONDITIONS[i % len(CONDITIONS)].title()} care, page {i}</h1>{body}<ul>{links}</ul>{pdf}</main>"
+            f"<footer>{BOILERPLATE * repeats}<a href=\"mailto:info@example-hospital.org\">Contact</a></footer>"
+            "</body></html>"
+        )
+
+    def sitemap_xml(self, base_url):
+        entries = "".join(f"<url><loc>{base_url}{self.path(i)}</loc><lastmod>2024-01-01</lastmod></url>" for i in range(self.pages))
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+
+    def app(self) -> web.Application:
+        paths = {self.path(i): i for i in range(self.pages)}
+
+        async def page(request):
+            if request.path not in paths:
+                raise web.HTTPNotFound()
+            return web.Response(text=self.page_html(paths[request.path]), content_type="text/html")
+
+        async def pdf(request):
+            i = int(request.match_info["i"])
+            if not self.has_pdf(i):
+                raise web.HTTPNotFound()
+            return web.Response(body=minimal_pdf(f"Patient guide {i}: {CONDITIONS[i % len(CONDITIONS)]} and {TREATMENTS[i % len(TREATMENTS)]}."), content_type="application/pdf")
+
+        async def sitemap(request):
+            return web.Response(text=self.sitemap_xml(f"http://{request.host}"), content_type="application/xml")
+
+        async def robots(request):
+            return web.Response(text=f"User-agent: *\nDisallow: /patient-portal/\nSitemap: http://{request.host}/sitemap.xml\n")
+
+        app = web.Application()
+        app.router.add_get("/robots.txt", robots)
+        app.router.add_get("/sitemap.xml", sitemap)
+        app.router.add_get("/documents/patient-guide-{i}.pdf", pdf)
+        app.router.add_get("/{path:.*}", page)
+        return app
+
+async def serve(app, host="127.0.0.1", port=0):
+    """
+    Starts `app` and returns (runner, base URL); call `runner.cleanup()` to stop it.
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
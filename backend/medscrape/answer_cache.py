@@ -0,0 +1,134 @@
+import os
+import re
+import time
+import hashlib
+import logging
+
+from typing import Optional
+from redis.asyncio import Redis
+
+from .models import QuestionAnswered
+from .metrics import cache_requests
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 7 * 24 * 3600))  # Default to 7 days
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 10000))
+ANSWER_CACHE_PREFIX = "answer_cache"
+TLD_VERSIONS_KEY = "tld_versions"
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+redis_client = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+
+def normalize_question(question):
+    """
+    Lowercases a question and collapses whitespace and trailing punctuation so trivial rewordings share a cache entry.
+    """
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.! ").lower()
+
+class AnswerCache:
+    """
+    Redis cache of QuestionAnswered results keyed by tld, normalized question, model and corpus version.
+
+    The corpus version of a tld is the ExtractedData table version recorded when it was last ingested, so re-ingesting
+    a site moves its questions to new keys; `record_ingest` also deletes the old entries straight away. Entries expire
+    after `ttl` seconds and the least recently used ones are evicted beyond `max_entries`.
+
+    Keys are indexed twice: ``<prefix>:lru`` scores them by last use and ``<prefix>:expiry`` by when their TTL runs
+    out, so entries Redis has already expired are dropped from the index before anything live is evicted.
+    """
+
+    def __init__(self, redis_client, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES, prefix=ANSWER_CACHE_PREFIX):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.lru_key = f"{prefix}:lru"
+        self.expiry_key = f"{prefix}:expiry"
+        self.stats_key = f"{prefix}:stats"
+        self.hits = 0
+        self.misses = 0
+
+    async def corpus_version(self, tld) -> str:
+        return await self.redis_client.hget(TLD_VERSIONS_KEY, tld) or "0"
+
+    def key(self, tld, question, model, version):
+        question_hash = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{tld}:{model}:{version}:{question_hash}"
+
+    async def get(self, key) -> Optional[QuestionAnswered]:
+        cached = await self.redis_client.get(key)
+        if cached is None:
+            self.misses += 1
+            cache_requests.inc(cache="answer", result="miss")
+            await self.redis_client.hincrby(self.stats_key, "misses", 1)
+            return None
+        self.hits += 1
+        cache_requests.inc(cache="answer", result="hit")
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(self.lru_key, {key: time.time()}, xx=True)
+        pipe.hincrby(self.stats_key, "hits", 1)
+        await pipe.execute()
+        return QuestionAnswered.model_validate_json(cached)
+
+    async def set(self, key, answer: QuestionAnswered):
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.set(key, answer.model_dump_json(), ex=self.ttl)
+        pipe.zadd(self.lru_key, {key: now})
+        pipe.zadd(self.expiry_key, {key: now + self.ttl})
+        pipe.zcard(self.lru_key)
+        *_, entries = await pipe.execute()
+        if entries > self.max_entries:
+            entries = await self._prune_expired()
+        if entries > self.max_entries:
+            await self._evict(entries - self.max_entries)
+
+    async def _prune_expired(self) -> int:
+        """
+        Removes index entries whose keys have expired and returns the number of live entries.
+        """
+        expired = await self.redis_client.zrangebyscore(self.expiry_key, "-inf", time.time())
+        pipe = self.redis_client.pipeline(transaction=False)
+        if expired:
+            pipe.zrem(self.lru_key, *expired)
+            pipe.zrem(self.expiry_key, *expired)
+        pipe.zcard(self.lru_key)
+        *_, entries = await pipe.execute()
+        return entries
+
+    async def _evict(self, count):
+        oldest = [key for key, _ in await self.redis_client.zpopmin(self.lru_key, count)]
+        if oldest:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(*oldest)
+            pipe.zrem(self.expiry_key, *oldest)
+            await pipe.execute()
+
+    async def record_ingest(self, tld, version):
+        """
+        Records a new corpus version for `tld` and drops the answers cached against the previous one.
+        """
+        await self.redis_client.hset(TLD_VERSIONS_KEY, tld, str(version))
+        stale = [key async for key, _ in self.redis_client.zscan_iter(self.lru_key, match=f"{self.prefix}:{tld}:*")]
+        if stale:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(*stale)
+            pipe.zrem(self.lru_key, *stale)
+            pipe.zrem(self.expiry_key, *stale)
+            await pipe.execute()
+        logger.info(f"Answer cache invalidated {len(stale)} entries for {tld} at corpus version {version}")
+
+    async def stats(self) -> dict:
+        totals = await self.redis_client.hgetall(self.stats_key)
+        hits, misses = int(totals.get("hits", 0)), int(totals.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": await self._prune_expired(),
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+        }
+
+answer_cache = AnswerCache(redis_client)
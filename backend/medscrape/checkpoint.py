@@ -0,0 +1,96 @@
+import os
+import json
+import time
+
+from typing import Dict, Optional
+
+CRAWL_CHECKPOINT_SECONDS = float(os.getenv('CRAWL_CHECKPOINT_SECONDS', 10))  # How often a running crawl saves its progress
+CRAWL_CHECKPOINT_TTL = int(os.getenv('CRAWL_CHECKPOINT_TTL', 86400))  # An interrupted crawl can be resumed for this long
+
+# A page moves through these in order; a resumed crawl redoes only the steps after the last one recorded
+DISCOVERED = "discovered"
+FETCHED = "fetched"
+PARTITIONED = "partitioned"
+WRITTEN = "written"
+SKIPPED = "skipped"  # Failed, disallowed or not HTML; not retried on resume
+
+class CrawlCheckpoint:
+    """
+    Progress of one tld's crawl and ingest, saved to Redis so an interrupted run can pick up where it stopped.
+
+    Every URL the crawl has seen has a record with its state and crawl depth; the frontier is the set of URLs still
+    "discovered". Fetched pages also keep their page state and whether they were unchanged, so a resumed crawl can
+    rebuild its result without requesting them again. Counters and the current stage are kept alongside.
+
+    Updates are buffered in memory and written in one pipeline by `save`, which `maybe_save` calls at most every
+    `interval` seconds. Both keys expire `ttl` seconds after the last save.
+    """
+
+    def __init__(self, redis_client, tld, prefix="crawl_checkpoint", interval=CRAWL_CHECKPOINT_SECONDS, ttl=CRAWL_CHECKPOINT_TTL):
+        self.redis_client = redis_client
+        self.tld = tld
+        self.meta_key = f"{prefix}:{tld}"
+        self.urls_key = f"{prefix}:{tld}:urls"
+        self.interval = interval
+        self.ttl = ttl
+        self._pending: Dict[str, dict] = {}
+        self._records: Dict[str, dict] = {}
+        self._last_save = time.monotonic()
+
+    async def load(self) -> Optional[dict]:
+        """
+        Returns the saved checkpoint as {"stage", "counters", "urls"}, or None when there is nothing to resume.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hgetall(self.meta_key)
+        pipe.hgetall(self.urls_key)
+        meta, urls = await pipe.execute()
+        if not meta:
+            return None
+        self._records = {url: json.loads(record) for url, record in urls.items()}
+        stage = meta.pop("stage", None)
+        meta.pop("updated_at", None)
+        return {"stage": stage, "counters": {name: int(value) for name, value in meta.items()}, "urls": dict(self._records)}
+
+    def state(self, url) -> Optional[str]:
+        record = self._records.get(url)
+        return record["state"] if record else None
+
+    def mark(self, url, state, **fields):
+        """
+        Records a URL's new state, keeping the fields of its earlier record that are not given.
+        """
+        record = {**self._records.get(url, {}), **fields, "state": state}
+        self._records[url] = record
+        self._pending[url] = record
+
+    async def save(self, stage=None, counters: Optional[Dict[str, int]] = None):
+        pending, self._pending = self._pending, {}
+        self._last_save = time.monotonic()
+        meta = {"updated_at": time.time(), **(counters or {})}
+        if stage is not None:
+            meta["stage"] = stage
+        pipe = self.redis_client.pipeline(transaction=False)
+        if pending:
+            pipe.hset(self.urls_key, mapping={url: json.dumps(record) for url, record in pending.items()})
+        pipe.hset(self.meta_key, mapping=meta)
+        pipe.expire(self.urls_key, self.ttl)
+        pipe.expire(self.meta_key, self.ttl)
+        try:
+            await pipe.execute()
+        except Exception:
+            pending.update(self._pending)
+            self._pending = pending  # Keep unsaved records for the next attempt
+            raise
+
+    async def maybe_save(self, stage=None, counters: Optional[Dict[str, int]] = None):
+        if time.monotonic() - self._last_save >= self.interval:
+            await self.save(stage, counters)
+
+    async def clear(self):
+        """
+        Removes the checkpoint once the run it belongs to has finished.
+        """
+        self._pending = {}
+        self._records = {}
+        await self.redis_client.delete(self.meta_key, self.urls_key)
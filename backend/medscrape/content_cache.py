@@ -0,0 +1,85 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CONTENT_CACHE_DIR = os.getenv('CONTENT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'medscrape', 'pages'))
+CONTENT_CACHE_MAX_BYTES = int(os.getenv('CONTENT_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # Default to 512 MB
+
+class ContentCache:
+    """
+    Size-capped on-disk cache of fetched page bodies keyed by URL and validated by ETag.
+
+    The crawler stores every page it downloads so the processing stage can partition the text without fetching it
+    a second time. Once the cache grows past `max_bytes` the least recently written entries are evicted.
+    """
+
+    def __init__(self, directory=CONTENT_CACHE_DIR, max_bytes=CONTENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """
+        Stores the body fetched for `url` together with its validators.
+        """
+        path = self._path(url)
+        entry = json.dumps({"url": url, "etag": etag, "last_modified": last_modified, "fetched_at": time.time(), "body": body})
+        with self._lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+                temp_file.write(entry)
+            os.replace(temp_path, path)  # Readers never see a partially written entry
+            self._total_bytes += os.path.getsize(path) - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def get_entry(self, url, etag=None) -> Optional[dict]:
+        """
+        Returns the cached entry for `url`, or None if it is missing or its ETag does not match `etag`.
+        """
+        try:
+            with open(self._path(url), encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url or (etag is not None and entry.get("etag") != etag):
+            return None
+        return entry
+
+    def get(self, url, etag=None) -> Optional[str]:
+        """
+        Returns the cached body for `url`, or None on a miss.
+        """
+        entry = self.get_entry(url, etag)
+        return entry["body"] if entry else None
+
+    def _evict(self):
+        # Drop the oldest entries until the cache is back under 90% of its budget
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.is_file()), key=lambda entry: entry.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+                self._total_bytes -= size
+            except OSError:
+                continue
+        logger.info(f"Content cache evicted entries, now {self._total_bytes} bytes")
+
+content_cache = ContentCache()
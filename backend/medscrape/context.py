@@ -0,0 +1,69 @@
+import os
+import math
+import logging
+
+from typing import Dict, List
+
+from .models import ResponseData
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv('CONTEXT_CHARS_PER_TOKEN', 4))  # Rough average for English text with GPT tokenizers
+CHUNK_OVERLAP_CHARS = 30  # Matches overlap= in partition_html_rows
+MIN_OVERLAP_CHARS = 10
+
+def estimate_tokens(text, chars_per_token=CONTEXT_CHARS_PER_TOKEN):
+    return math.ceil(len(text) / chars_per_token)
+
+def _trim_overlap(text, previous):
+    """
+    Removes the characters `text` shares with the end or the start of a neighbouring chunk of the same page.
+    """
+    for k in range(min(CHUNK_OVERLAP_CHARS * 2, len(previous), len(text)), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:k]):
+            return text[k:].lstrip()
+        if previous.startswith(text[-k:]):
+            return text[:-k].rstrip()
+    return text
+
+def _source_header(url):
+    return f"Source: {url}\n"
+
+def build_context(results: List[ResponseData], token_budget=CONTEXT_TOKEN_BUDGET, chars_per_token=CONTEXT_CHARS_PER_TOKEN) -> str:
+    """
+    Assembles the LLM context from reranked search results.
+
+    Chunks are taken in reranker order (best first) until `token_budget` is spent. Exact repeats and chunks contained
+    in one already taken are dropped, and the by-title overlap shared with a neighbouring chunk of the same page is cut.
+    The selected chunks are grouped under one header per URL, with pages ordered by their best chunk.
+
+    :param results: Search results as returned by the reranker, most relevant first.
+    :return: The context text, or an empty string when there are no results.
+    """
+    selected: Dict[str, List[str]] = {}
+    used_tokens = 0
+    for result in results:
+        text = result.text_chunk.strip()
+        siblings = selected.get(result.url, [])
+        if not text or any(text in chunk for chunks in selected.values() for chunk in chunks):
+            continue
+        for previous in siblings:
+            text = _trim_overlap(text, previous)
+        if not text:
+            continue
+
+        cost = estimate_tokens(text + "\n\n", chars_per_token)
+        if result.url not in selected:
+            cost += estimate_tokens(_source_header(result.url), chars_per_token)
+        if used_tokens + cost > token_budget:
+            if selected:
+                continue  # A shorter, lower-ranked chunk may still fit
+            # Never send an empty context because the best chunk alone is too long
+            text = text[:int((token_budget - estimate_tokens(_source_header(result.url), chars_per_token)) * chars_per_token)]
+            cost = token_budget
+        selected.setdefault(result.url, []).append(text)
+        used_tokens += cost
+
+    logger.debug(f"Built context of ~{used_tokens} tokens from {sum(map(len, selected.values()))} of {len(results)} chunks")
+    return "\n".join(_source_header(url) + "\n\n".join(chunks) + "\n" for url, chunks in selected.items())
@@ -0,0 +1,105 @@
+import os
+import array
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+
+from typing import Callable, Dict, List, Sequence
+
+from .metrics import cache_requests
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'medscrape', 'embeddings.sqlite'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 500000))
+
+class EmbeddingCache:
+    """
+    Content-addressed SQLite cache of embeddings keyed by the SHA-256 of the model name and chunk text.
+
+    Navigation menus, disclaimers and footers produce the same chunk on every page of a site, so most of them are
+    embedded once and served from the cache afterwards. Vectors are stored as float32 and the least recently used
+    entries are evicted once the cache holds more than `max_entries` vectors.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, model_name=""):
+        self.path = path
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, vector in self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch):
+                    found[key] = array.array("f", vector).tolist()
+                self._conn.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [time.time(), *batch])
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]):
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array.array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            self._entries += self._conn.total_changes - before
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop the least recently used entries until the cache is back under 90% of its budget
+        excess = self._entries - int(self.max_entries * 0.9)
+        self._conn.execute("DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Embedding cache evicted {excess} entries, {self._entries} remain")
+
+    def embed(self, texts: Sequence[str], compute: Callable[[List[str]], List[Sequence[float]]]) -> List[List[float]]:
+        """
+        Returns an embedding for every text, calling `compute` only for texts that are not cached.
+        """
+        keys = [self.key(text) for text in texts]
+        vectors = self.get_many(list(dict.fromkeys(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += len(keys) - len(missing)  # Every text that did not need the model, including repeats within the batch
+        self.misses += len(missing)
+        cache_requests.inc(len(keys) - len(missing), cache="embedding", result="hit")
+        cache_requests.inc(len(missing), cache="embedding", result="miss")
+        if missing:
+            computed = dict(zip(missing, compute(list(missing.values()))))
+            self.put_many(computed)
+            vectors.update(computed)
+        return [list(vectors[key]) for key in keys]
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,25 +1,54 @@
-import re
 import asyncio
+import hashlib
+import itertools
 import logging
-import redis
 import os
 import time
+import random
+import weakref
 
 from redis.asyncio import Redis
 from pydantic import BaseModel, Field
-from typing import List
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlparse
 
-# Initialize Redis client (adjust parameters as needed for your Redis setup)
-redis_client = redis.Redis(host=os.getenv('REDIS_HOST', 'localhost'), port=int(os.getenv('REDIS_PORT', 6379)), db=0, decode_responses=True)
+from .checkpoint import DISCOVERED, FETCHED, SKIPPED, CrawlCheckpoint
+from .content_cache import content_cache
+from .fetching import ConnectionStats, SkippedResponse, crawl_connection_stats, read_html
+from .links import EXCLUDED_LINK_PATTERN, extract_links
+from .metrics import cache_requests, crawl_fetches_in_flight, crawl_pages, registry, timed_stage
+from .politeness import CRAWL_MAX_RETRY_AFTER, THROTTLE_STATUSES, PolitenessScheduler
+from .sitemap import fetch_sitemap_urls
+from .visited import REVISIT_INTERVAL, PageStateStore, VisitedUrlCache
+
+# Initialize async Redis client (adjust parameters as needed for your Redis setup)
+redis_client = Redis(host=os.getenv('REDIS_HOST', 'localhost'), port=int(os.getenv('REDIS_PORT', 6379)), db=0, decode_responses=True)
+
+# Frontiers of the crawls in progress, read when /metrics is scraped
+_active_frontiers = weakref.WeakSet()
+registry.gauge("medscrape_crawl_frontier_size", "URLs waiting in the frontiers of running crawls.", function=lambda: sum(frontier.qsize() for frontier in list(_active_frontiers)))
+registry.gauge("medscrape_crawls_in_progress", "Crawls currently running.", function=lambda: len(_active_frontiers))
 
 class Website(BaseModel):
     tld: str = Field(..., description="The top-level domain of the website.")
     urls: List[str] = Field(..., description="The sub pages collected from the website.")
+    depths: Dict[str, int] = Field(default_factory=dict, description="The crawl depth at which each collected URL was found.")
+    unchanged_urls: List[str] = Field(default_factory=list, description="Collected URLs whose content is unchanged since their last ingest.")
+    page_states: Dict[str, Dict[str, Optional[str]]] = Field(default_factory=dict, description="Validators and content hash of each new or changed URL.")
+    connection_stats: Dict[str, Optional[Union[int, float]]] = Field(default_factory=dict, description="Requests, connection reuse and DNS cache hits during the crawl.")
+
+    def changed_urls(self) -> List[str]:
+        unchanged = set(self.unchanged_urls)
+        return [url for url in self.urls if url not in unchanged]
 
-CONCURRENCY_LIMIT = int(os.getenv('CONCURRENCY_LIMIT', 100))
-REVISIT_INTERVAL = int(os.getenv('REVISIT_INTERVAL', 43200))  # Default to 12 hours
+CONCURRENCY_LIMIT = int(os.getenv('CONCURRENCY_LIMIT', 100))  # Number of concurrent fetch workers per crawl; each host's share adapts within it
+ENUMERATION_MODE = os.getenv('ENUMERATION_MODE', 'auto')  # links, sitemap (links only when there is no sitemap) or auto (both)
+CRAWL_MAX_RETRIES = int(os.getenv('CRAWL_MAX_RETRIES', 2))  # Retries of a page answered with 429 or 5xx
+CRAWL_RETRY_BACKOFF_SECONDS = float(os.getenv('CRAWL_RETRY_BACKOFF_SECONDS', 1.0))  # First backoff when no Retry-After is sent
+CRAWL_MAX_RETRY_SECONDS = float(os.getenv('CRAWL_MAX_RETRY_SECONDS', 60))  # Total time a page may spend waiting to be retried
+MAX_CRAWL_DEPTH = int(os.getenv('MAX_CRAWL_DEPTH', 10))
+MAX_CRAWL_PAGES = int(os.getenv('MAX_CRAWL_PAGES', 10000))
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
 
 def is_valid(url):
     """
@@ -29,16 +58,7 @@ def is_valid(url):
     return bool(parsed.netloc) and bool(parsed.scheme)
 
 def should_exclude_link(href):
-    # Define patterns for links to exclude
-    excluded_patterns = [
-        '^#',  # Anchor links
-        '^mailto:',  # Mail links
-        '^tel:',  # Telephone links
-        '^javascript:',  # JavaScript links
-        '\.(pdf|docx|xlsx|zip)$',  # Direct file downloads
-        '/login', '/logout', '/register', '/password'  # Authentication links
-    ]
-    return any(re.search(pattern, href, re.IGNORECASE) for pattern in excluded_patterns)
+    return EXCLUDED_LINK_PATTERN.search(href) is not None
 
 def extract_tld(url):
     """
@@ -50,59 +70,272 @@ def extract_tld(url):
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
-# Initialize Redis client for publishing logs
-REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
-log_redis_client = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
 
-async def get_all_website_links(url, session, visited=set(), semaphore=None):
+async def get_page(url, session, headers, scheduler):
     """
-    Recursively finds all URLs within the same domain as the starting URL, with improved error handling and caching of visited URLs using Redis.
+    GETs a page within its host's rate limit and concurrency window, retrying throttled responses after backing off.
+
+    A throttled page waits for its Retry-After, or an exponential backoff with jitter when none is sent, before it is
+    requested again. It is given up once CRAWL_MAX_RETRIES retries or CRAWL_MAX_RETRY_SECONDS of waiting are used up.
+
+    :return: A tuple of (status, response headers, body); the body is None for a 304 or a throttled response.
+    :raises SkippedResponse: If the page is not HTML or is larger than MAX_PAGE_BYTES.
     """
-    if semaphore is None:
-        semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT) 
+    deadline = time.monotonic() + CRAWL_MAX_RETRY_SECONDS
+    for attempt in range(CRAWL_MAX_RETRIES + 1):
+        async with scheduler.slot(url, session) as slot:
+            with crawl_fetches_in_flight.track_in_progress(), timed_stage("fetch"):
+                async with session.get(url, headers=headers) as response:
+                    # Judge the host on time to headers so a skipped body does not count as a failure
+                    slot.done(response.status, response.headers)
+                    delay = retry_delay(slot.retry_after, attempt)
+                    if response.status not in THROTTLE_STATUSES or attempt == CRAWL_MAX_RETRIES or time.monotonic() + delay > deadline:
+                        body = await read_html(response) if response.status not in THROTTLE_STATUSES | {304} else None
+                        return response.status, response.headers, body
+        # Wait outside the slot so the host's other pages are not held up behind this one
+        await asyncio.sleep(delay)
 
-    # Check if URL has been visited recently using Redis
-    visited_timestamp = redis_client.hget("visited_urls", url)
-    if visited_timestamp and (time.time() - float(visited_timestamp)) < REVISIT_INTERVAL:
-        log_message = f"URL visited recently, skipping: {url}"
-        logger.info(log_message)
-        await log_redis_client.publish('log_channel', log_message)  # Publish log message to Redis channel
-        return Website(tld='', urls=[])  # Return an empty Website model if URL has been visited recently
+def retry_delay(retry_after, attempt):
+    if retry_after is not None:
+        return min(retry_after, CRAWL_MAX_RETRY_AFTER)
+    return CRAWL_RETRY_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+async def fetch_page_links(url, session, domain_name, visited, page_states, scheduler=None):
+    """
+    Fetches a single page and returns the same-domain links found on it, or None if the page was skipped or failed.
+
+    Pages ingested before are requested conditionally. A 304, or a 200 whose body hashes to the stored content hash,
+    marks the page unchanged so the processing stage can skip it; links are still extracted from the cached body.
+    Pages visited within REVISIT_INTERVAL are not requested again but read from the content cache, so a re-run still
+    follows their links and ingests any that an interrupted run fetched but never wrote.
+
+    :return: A tuple of (links, page state, unchanged) or None.
+    """
+    # Check if URL has been visited recently; answered locally for links this crawl already resolved against Redis
+    if (await visited.visited_recently([url]))[url]:
+        return await cached_page_links(url, domain_name, visited, page_states)
+    scheduler = scheduler or PolitenessScheduler(USER_AGENT, respect_robots=False)
+    if not await scheduler.allowed(url, session):
+        log_message = f"URL disallowed by robots.txt, skipping: {url}"
+        logger.info(log_message, extra={"channel": "log_channel"})
+        return None
     log_message = f"Visiting: {url}"
-    logger.info(log_message)
-    await log_redis_client.publish('response_channel', log_message)  # Publish log message to Redis channel
-    
-    # Add URL to Redis hash with current timestamp
-    redis_client.hset("visited_urls", url, time.time())
-    log_message = f"Adding URL to visited set in Redis with timestamp: {url}"  # Added detailed logging
-    logger.info(log_message)
-    await log_redis_client.publish('log_channel', log_message)  # Publish log message to Redis channel
-
-    urls = set()
+    logger.info(log_message, extra={"channel": "response_channel"})
+
+    # Record the visit; the timestamp is written to Redis in the same pipeline as this page's link lookup
+    visited.mark(url)
+
+    previous_state = await page_states.get(url)
+    cached_entry = await asyncio.to_thread(content_cache.get_entry, url) if previous_state else None
+    if previous_state:
+        cache_requests.inc(cache="content", result="miss" if cached_entry is None else "hit")
+    headers = {'User-Agent': USER_AGENT}
+    # Only revalidate when the cached body is available to extract links from on a 304
+    if cached_entry is not None:
+        if previous_state.get("etag"):
+            headers['If-None-Match'] = previous_state["etag"]
+        if previous_state.get("last_modified"):
+            headers['If-Modified-Since'] = previous_state["last_modified"]
+
+    try:
+        status, response_headers, body = await get_page(url, session, headers, scheduler)
+        if status in THROTTLE_STATUSES:
+            logger.error(f"Giving up on {url} after HTTP {status}", extra={"channel": "log_channel"})
+            return None
+        if status == 304 and cached_entry is not None:
+            html_content = cached_entry["body"]
+            page_state = previous_state
+        else:
+            html_content = body or ""
+            page_state = new_page_state(html_content, response_headers.get('ETag'), response_headers.get('Last-Modified'), time.time())
+            # Keep the body so the processing stage can partition it without downloading the page again
+            await asyncio.to_thread(content_cache.put, url, html_content, page_state["etag"], page_state["last_modified"])
+        unchanged = previous_state is not None and previous_state.get("content_hash") == page_state["content_hash"]
+        candidates = extract_links(html_content, url, domain_name)
+    except SkippedResponse as e:
+        logger.info(f"Not an HTML page, skipping {url}: {e}", extra={"channel": "log_channel"})
+        return None
+    except Exception as e:
+        log_message = f"Error fetching {url}: {str(e)}"  # Added detailed logging
+        logger.error(log_message, extra={"channel": "log_channel"})
+        return None
+
+    # Resolve every link on the page with a single batched lookup, so the workers that claim them answer locally
+    await visited.visited_recently(candidates)
+    return candidates, page_state, unchanged
+
+def new_page_state(html_content, etag, last_modified, fetched_at):
+    return {
+        "fetched_at": str(fetched_at),
+        "etag": etag,
+        "last_modified": last_modified,
+        "content_hash": hashlib.sha256(html_content.encode("utf-8")).hexdigest(),
+    }
+
+async def cached_page_links(url, domain_name, visited, page_states):
+    """
+    Works from the body downloaded on a recent visit instead of requesting the page again.
+
+    :return: The same tuple as fetch_page_links, or None when the body is no longer cached.
+    """
+    cached_entry = await asyncio.to_thread(content_cache.get_entry, url)
+    cache_requests.inc(cache="content", result="miss" if cached_entry is None else "hit")
+    if cached_entry is None:
+        log_message = f"URL visited recently, skipping: {url}"
+        logger.info(log_message, extra={"channel": "log_channel"})
+        return None
+    previous_state = await page_states.get(url)
+    html_content = cached_entry["body"]
+    page_state = new_page_state(html_content, cached_entry.get("etag"), cached_entry.get("last_modified"), cached_entry.get("fetched_at", time.time()))
+    unchanged = previous_state is not None and previous_state.get("content_hash") == page_state["content_hash"]
+    candidates = extract_links(html_content, url, domain_name)
+    await visited.visited_recently(candidates)
+    return candidates, previous_state if unchanged else page_state, unchanged
+
+async def unchanged_since(url, lastmod, page_states):
+    """
+    Tells whether a page was fetched and ingested after the sitemap's lastmod for it, so it need not be fetched again.
+    """
+    previous_state = await page_states.get(url)
+    fetched_at = previous_state.get("fetched_at") if previous_state else None
+    return fetched_at is not None and float(fetched_at) >= lastmod
+
+async def get_all_website_links(url, session, max_depth=MAX_CRAWL_DEPTH, max_pages=MAX_CRAWL_PAGES, workers=CONCURRENCY_LIMIT, scheduler=None, mode=ENUMERATION_MODE, checkpoint: Optional[CrawlCheckpoint] = None):
+    """
+    Crawls all URLs within the same domain as the starting URL using a shallowest-first frontier drained by a fixed pool of fetch workers.
+
+    Memory and task count stay bounded regardless of site size: at most `workers` fetches are in flight, pages deeper than
+    `max_depth` are not followed and the crawl stops scheduling new pages once `max_pages` have been claimed. Within that,
+    the PolitenessScheduler paces requests to each host and adapts how many run at once to how the host responds.
+
+    Unless `mode` is "links", the site's sitemaps seed the whole frontier up front, and listed pages whose lastmod is
+    older than their last fetch are reported unchanged without a request. In "sitemap" mode links are only followed
+    when no sitemap lists any page.
+
+    With a `checkpoint`, every discovered and fetched URL is recorded and saved periodically. If the checkpoint holds
+    an interrupted crawl, its frontier is restored and pages it already fetched are taken from it instead of the web.
+    """
     domain_name = extract_tld(url)  # Replacing direct urlparse call with extract_tld function
+    frontier = asyncio.PriorityQueue()
+    _active_frontiers.add(frontier)
+    sequence = itertools.count()  # Tie-breaker so URLs at the same depth are visited in discovery order
+    visited = VisitedUrlCache(redis_client, revisit_interval=REVISIT_INTERVAL)
+    page_states = PageStateStore(redis_client)
+    seen = {url}
+    depths = {}
+    unchanged_urls = []
+    fetched_states = {}
+    claimed_pages = 0
+    scheduler = scheduler or PolitenessScheduler(USER_AGENT)
+    skipped_by_lastmod = 0
+    connection_stats = ConnectionStats()
+    # Worker tasks copy the context, so every request they send is counted for this crawl
+    stats_token = crawl_connection_stats.set(connection_stats)
+
+    def discover(link, depth):
+        seen.add(link)
+        frontier.put_nowait((depth, next(sequence), link))
+        if checkpoint is not None:
+            checkpoint.mark(link, DISCOVERED, depth=depth)
+
+    def counters():
+        return {"skipped_by_lastmod": skipped_by_lastmod}
+
+    resumed = await checkpoint.load() if checkpoint is not None else None
+    if resumed:
+        for page_url, record in resumed["urls"].items():
+            seen.add(page_url)
+            if record["state"] == DISCOVERED:
+                frontier.put_nowait((record["depth"], next(sequence), page_url))
+                continue
+            claimed_pages += 1
+            if record["state"] == SKIPPED:
+                continue
+            depths[page_url] = record["depth"]
+            if record.get("unchanged"):
+                unchanged_urls.append(page_url)
+            else:
+                fetched_states[page_url] = record["page_state"]
+        skipped_by_lastmod = resumed["counters"].get("skipped_by_lastmod", 0)
+        logger.info(f"Resuming crawl of {domain_name}: {len(depths)} pages already fetched, {frontier.qsize()} in the frontier", extra={"channel": "log_channel"})
+    else:
+        discover(url, 0)
+    sitemap_lastmods = {}
+    # A resumed crawl that had got past enumeration already holds everything the sitemaps list
+    if mode in ("sitemap", "auto") and (not resumed or resumed["stage"] == "crawling"):
+        await scheduler.host_policy(url, session)  # Loads robots.txt and its Sitemap: lines
+        robots = scheduler.robots.get(urlparse(url).netloc)
+        sitemap_lastmods = await fetch_sitemap_urls(url, session, domain_name, robots.site_maps() if robots else None, scheduler, max_urls=max_pages)
+        for link in sitemap_lastmods:
+            if link not in seen and len(seen) < max_pages:
+                discover(link, 1)
+    follow_links = mode == "links" or mode == "auto" or not sitemap_lastmods
+
+    async def worker():
+        nonlocal claimed_pages, skipped_by_lastmod
+        while True:
+            depth, _, page_url = await frontier.get()
+            try:
+                if claimed_pages >= max_pages:
+                    continue
+                claimed_pages += 1
+                lastmod = sitemap_lastmods.get(page_url)
+                if lastmod is not None and await unchanged_since(page_url, lastmod, page_states):
+                    depths[page_url] = depth
+                    unchanged_urls.append(page_url)
+                    skipped_by_lastmod += 1
+                    crawl_pages.inc(outcome="lastmod_unchanged")
+                    if checkpoint is not None:
+                        checkpoint.mark(page_url, FETCHED, unchanged=True)
+                    continue
+                try:
+                    result = await fetch_page_links(page_url, session, domain_name, visited, page_states, scheduler)
+                except Exception as e:
+                    logger.error(f"Unexpected error crawling {page_url}: {str(e)}")
+                    result = None
+                if result is None:
+                    crawl_pages.inc(outcome="skipped")
+                    if checkpoint is not None:
+                        checkpoint.mark(page_url, SKIPPED)
+                    continue
+                links, page_state, unchanged = result
+                crawl_pages.inc(outcome="unchanged" if unchanged else "fetched")
+                depths[page_url] = depth
+                if unchanged:
+                    unchanged_urls.append(page_url)
+                else:
+                    fetched_states[page_url] = page_state
+                if depth < max_depth and follow_links:
+                    for link in links:
+                        if link not in seen and len(seen) < max_pages:
+                            discover(link, depth + 1)
+                if checkpoint is not None:
+                    # Recorded after the page's links so a resumed crawl never loses them
+                    checkpoint.mark(page_url, FETCHED, unchanged=unchanged, page_state=page_state)
+            finally:
+                frontier.task_done()
+                if checkpoint is not None:
+                    try:
+                        await checkpoint.maybe_save("crawling", counters())
+                    except Exception as e:
+                        logger.error(f"Could not save the crawl checkpoint for {domain_name}: {e}")
+
+    worker_tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+    finished = False
+    try:
+        await frontier.join()
+        finished = True
+    finally:
+        for task in worker_tasks:
+            task.cancel()
+        await asyncio.gather(*worker_tasks, return_exceptions=True)
+        _active_frontiers.discard(frontier)
+        await visited.flush()
+        crawl_connection_stats.reset(stats_token)
+        if checkpoint is not None:
+            await checkpoint.save("crawled" if finished else "crawling", counters())
+
+    log_message = f"Crawl of {domain_name} finished: {len(depths)} pages collected ({len(unchanged_urls)} unchanged), {claimed_pages} pages attempted, {len(sitemap_lastmods)} listed in sitemaps, {skipped_by_lastmod} skipped by lastmod, connections {connection_stats.stats()}, host limits {scheduler.stats()}"
+    logger.info(log_message, extra={"channel": "log_channel"})
 
-    async with semaphore:  # Use semaphore to limit concurrency
-        try:
-            async with session.get(url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}) as response:
-                html_content = await response.text()
-                soup = BeautifulSoup(html_content, "html.parser")
-                a_tags_found = soup.findAll("a")
-                for a_tag in a_tags_found:
-                    href = a_tag.get("href")
-                    if href and not should_exclude_link(href):
-                        normalized_href = urljoin(url, href).split('#')[0].split('?')[0]
-                        parsed_href = urlparse(normalized_href)
-                        if parsed_href.scheme in ['http', 'https'] and is_valid(normalized_href) and parsed_href.netloc == domain_name and not redis_client.hexists("visited_urls", normalized_href):
-                            urls.add(normalized_href)
-        except Exception as e:
-            log_message = f"Error fetching {url}: {str(e)}"  # Added detailed logging
-            logger.error(log_message)
-            await log_redis_client.publish('log_channel', log_message)  # Publish log message to Redis channel
-            return Website(tld=domain_name, urls=list(urls))  # Return Website model with partial data on error
-
-    await asyncio.sleep(0.05)  # Delay for rate limiting
-
-    tasks = [asyncio.create_task(get_all_website_links(found_url, session, visited, semaphore)) for found_url in urls.copy() if not redis_client.hexists("visited_urls", found_url)]
-    await asyncio.gather(*tasks)
-
-    return Website(tld=domain_name, urls=list(urls))  # Return the Website model instance with the TLD and discovered URLs
+    return Website(tld=domain_name, urls=list(depths), depths=depths, unchanged_urls=unchanged_urls, page_states=fetched_states, connection_stats=connection_stats.stats())  # Return the Website model instance with the TLD, discovered URLs and their depths
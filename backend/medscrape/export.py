@@ -0,0 +1,210 @@
+import os
+import csv
+import json
+import time
+import queue
+import logging
+import sqlite3
+import threading
+
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXPORT_SINK = os.getenv('EXPORT_SINK', 'google_sheets')  # google_sheets, csv, sqlite or none
+EXPORT_PATH = os.getenv('EXPORT_PATH', 'data/exports/answers.csv')  # Used by the csv and sqlite sinks
+EXPORT_BATCH_ROWS = int(os.getenv('EXPORT_BATCH_ROWS', 500))
+EXPORT_FLUSH_SECONDS = float(os.getenv('EXPORT_FLUSH_SECONDS', 5))
+EXPORT_MAX_RETRIES = int(os.getenv('EXPORT_MAX_RETRIES', 5))
+EXPORT_BACKOFF_SECONDS = float(os.getenv('EXPORT_BACKOFF_SECONDS', 2.0))
+EXPORT_QUEUE_SIZE = int(os.getenv('EXPORT_QUEUE_SIZE', 10000))
+
+def _plain(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+def format_answer(answer) -> str:
+    """
+    Renders an answer as JSON text, so Response models and their model_dump() dicts export identically.
+    """
+    if answer is None:
+        return "N/A"
+    if isinstance(answer, str):
+        return answer
+    return json.dumps(_plain(answer), ensure_ascii=False)
+
+def answer_rows(tld, formatted_answers) -> List[List[str]]:
+    """
+    Converts answered questions into [tld, question, answer] rows.
+    """
+    return [[tld, str(answer["question"]), format_answer(answer.get("answer"))] for answer in formatted_answers]
+
+def _ensure_parent(path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+class GoogleSheetsSink:
+    """
+    Appends rows to the first worksheet of a Google Sheet, authenticating once and reusing the worksheet handle.
+    """
+
+    def __init__(self, credentials_path=None, sheet_id=None):
+        self.credentials_path = credentials_path or os.getenv('GOOGLE_CREDENTIALS_PATH')
+        self.sheet_id = sheet_id or os.getenv('GOOGLE_SHEET_ID')
+        self._sheet = None
+
+    def _worksheet(self):
+        if self._sheet is None:
+            import gspread  # Only needed when this sink is selected
+
+            # Set up the Google Sheets client using your JSON key file for authentication
+            gc = gspread.service_account(filename=self.credentials_path)
+            self._sheet = gc.open_by_key(self.sheet_id).sheet1
+        return self._sheet
+
+    def append_rows(self, rows):
+        try:
+            self._worksheet().append_rows(rows)
+        except Exception:
+            self._sheet = None  # Re-authenticate on the next attempt in case the session went stale
+            raise
+
+class CsvSink:
+    def __init__(self, path=EXPORT_PATH):
+        self.path = path
+        _ensure_parent(path)
+
+    def append_rows(self, rows):
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+
+class SqliteSink:
+    def __init__(self, path=EXPORT_PATH):
+        self.path = path
+        _ensure_parent(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS answers (tld TEXT, question TEXT, answer TEXT, exported_at REAL)")
+        self._conn.commit()
+
+    def append_rows(self, rows):
+        now = time.time()
+        self._conn.executemany("INSERT INTO answers (tld, question, answer, exported_at) VALUES (?, ?, ?, ?)", [(*row, now) for row in rows])
+        self._conn.commit()
+
+def create_sink(name=EXPORT_SINK, path=EXPORT_PATH):
+    if name == "google_sheets":
+        return GoogleSheetsSink()
+    if name == "csv":
+        return CsvSink(path)
+    if name == "sqlite":
+        return SqliteSink(path)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown EXPORT_SINK: {name}")
+
+class ResultExporter:
+    """
+    Exports answer rows from a background thread so queries never wait on the sink.
+
+    Rows submitted within `flush_seconds` of each other are coalesced into one append of up to `batch_rows` rows.
+    A failed append is retried with exponential backoff up to `max_retries` times before its rows are given up on.
+    Once `close` is called the backoff is skipped, so retries and the remaining rows are written within its timeout.
+    """
+
+    def __init__(self, sink, batch_rows=EXPORT_BATCH_ROWS, flush_seconds=EXPORT_FLUSH_SECONDS, max_retries=EXPORT_MAX_RETRIES, backoff_seconds=EXPORT_BACKOFF_SECONDS, queue_size=EXPORT_QUEUE_SIZE):
+        self.sink = sink
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.rows_exported = 0
+        self.rows_failed = 0
+        self.rows_dropped = 0
+        self.appends = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def submit(self, rows: List[List[str]]):
+        """
+        Queues rows for export and returns immediately.
+        """
+        if self.sink is None:
+            return
+        if self._thread is None:
+            self._start()
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.rows_dropped += 1
+                logger.error("Export queue is full, dropping a result row")
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._drain, name="result-exporter", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        # Wait up to flush_seconds for more rows so concurrent queries share one append
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 and not self._stopping.is_set() else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _append(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.append_rows(batch)
+                self.rows_exported += len(batch)
+                self.appends += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.rows_failed += len(batch)
+                    logger.error(f"Giving up exporting {len(batch)} rows after {attempt + 1} attempts: {e}")
+                    return
+                delay = 0 if self._stopping.is_set() else self.backoff_seconds * (2 ** attempt)
+                logger.warning(f"Export of {len(batch)} rows failed ({e}), retrying in {delay:.1f}s")
+                self._stopping.wait(delay)  # Returns early when close() is called
+
+    def _drain(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._append(batch)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "rows_exported": self.rows_exported,
+            "rows_failed": self.rows_failed,
+            "rows_dropped": self.rows_dropped,
+            "appends": self.appends,
+        }
+
+    def close(self, timeout=30):
+        """
+        Exports what is still queued and stops the background thread.
+        """
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout=timeout)
+
+result_exporter = ResultExporter(create_sink())
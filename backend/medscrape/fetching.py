@@ -0,0 +1,135 @@
+import os
+import codecs
+import logging
+import aiohttp
+
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 200))  # Open connections across all hosts
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 32))  # Matches the politeness window's ceiling
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 10))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', 60))
+MAX_PAGE_BYTES = int(os.getenv('MAX_PAGE_BYTES', 5 * 1024 * 1024))
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+
+class SkippedResponse(Exception):
+    """
+    Raised instead of reading a response body that is not HTML or is larger than allowed.
+    """
+
+class ConnectionStats:
+    """
+    Counts requests, new and reused connections and DNS cache hits, filled in by the session's TraceConfig.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.failed = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def stats(self) -> dict:
+        connections = self.new_connections + self.reused_connections
+        return {
+            "requests": self.requests,
+            "failed": self.failed,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": round(self.reused_connections / connections, 3) if connections else None,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
+
+# Set by a crawl so requests made from its tasks are also counted against it, whichever session sends them
+crawl_connection_stats: ContextVar[Optional[ConnectionStats]] = ContextVar("crawl_connection_stats", default=None)
+
+def _counter(session_stats, field):
+    async def on_signal(session, trace_config_ctx, params):
+        for stats in (session_stats, crawl_connection_stats.get()):
+            if stats is not None:
+                setattr(stats, field, getattr(stats, field) + 1)
+    return on_signal
+
+def connection_trace_config(stats: ConnectionStats) -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_end.append(_counter(stats, "requests"))
+    trace_config.on_request_exception.append(_counter(stats, "failed"))
+    trace_config.on_connection_create_end.append(_counter(stats, "new_connections"))
+    trace_config.on_connection_reuseconn.append(_counter(stats, "reused_connections"))
+    trace_config.on_dns_cache_hit.append(_counter(stats, "dns_cache_hits"))
+    trace_config.on_dns_cache_miss.append(_counter(stats, "dns_cache_misses"))
+    return trace_config
+
+def create_session(stats: ConnectionStats, limit=HTTP_POOL_LIMIT, limit_per_host=HTTP_POOL_LIMIT_PER_HOST) -> aiohttp.ClientSession:
+    """
+    Creates a ClientSession with a pooled, keep-alive connector, a DNS cache and connection reuse tracing.
+
+    Response bodies are decompressed transparently, so gzip and deflate are always advertised.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+        enable_cleanup_closed=True,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT),
+        headers={"Accept-Encoding": "gzip, deflate"},
+        trace_configs=[connection_trace_config(stats)],
+    )
+
+class HttpClient:
+    """
+    Holds the session shared by every crawl in the process, opened and closed with the app or worker.
+    """
+
+    def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.connection_stats = ConnectionStats()
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            self.session = create_session(self.connection_stats)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def stats(self) -> dict:
+        return self.connection_stats.stats()
+
+http_client = HttpClient()
+
+async def read_html(response: aiohttp.ClientResponse, max_bytes=MAX_PAGE_BYTES) -> str:
+    """
+    Reads an HTML response body in chunks, refusing other content types and bodies over `max_bytes`.
+
+    Both checks use the headers first, so images and downloads served under page-like URLs are never read.
+
+    :raises SkippedResponse: If the body is not HTML or is too large.
+    """
+    content_type = response.headers.get("Content-Type")
+    if content_type and response.content_type not in HTML_CONTENT_TYPES:
+        raise SkippedResponse(f"content type {response.content_type}")
+    if response.content_length is not None and response.content_length > max_bytes:
+        raise SkippedResponse(f"{response.content_length} bytes, limit is {max_bytes}")
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise SkippedResponse(f"body exceeds the {max_bytes} byte limit")
+    try:
+        encoding = codecs.lookup(response.charset or "utf-8").name
+    except LookupError:
+        encoding = "utf-8"
+    return body.decode(encoding, errors="replace")
@@ -0,0 +1,74 @@
+import os
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_MIN_ROWS = int(os.getenv('VECTOR_INDEX_MIN_ROWS', 50000))
+VECTOR_INDEX_REBUILD_GROWTH = float(os.getenv('VECTOR_INDEX_REBUILD_GROWTH', 0.5))  # Retrain once the table grew by 50%
+VECTOR_INDEX_TYPE = os.getenv('VECTOR_INDEX_TYPE', 'IVF_PQ')  # IVF_PQ, or IVF_HNSW_SQ on LanceDB versions that support it
+VECTOR_COLUMN = "embeddings"
+SCALAR_INDEX_COLUMNS = ["tld"]
+
+# Row count each table's vector index was last trained on, seeded from the table on first use
+indexed_row_counts = {}
+
+def _index_names(table):
+    try:
+        return {index["name"] if isinstance(index, dict) else index.name for index in table.to_lance().list_indices()}
+    except Exception:
+        return set()
+
+def _num_sub_vectors(dimension):
+    # PQ needs the dimension to split evenly into sub-vectors
+    return next(n for n in (96, 64, 48, 32, 16, 8, 4, 2, 1) if dimension % n == 0)
+
+def ensure_indexes(table, force=False) -> dict:
+    """
+    Builds the ANN index on the embeddings column once the table holds VECTOR_INDEX_MIN_ROWS rows, retrains it when
+    the row count has grown past VECTOR_INDEX_REBUILD_GROWTH since the last build, and keeps scalar indexes on the
+    prefilter columns.
+
+    Rows appended after a build stay searchable: Lance scans unindexed fragments alongside the index.
+
+    :return: A summary of what was built.
+    """
+    row_count = table.count_rows()
+    summary = {"rows": row_count, "vector_index_built": False, "scalar_indexes_built": []}
+    if not row_count:
+        return summary
+
+    existing = _index_names(table)
+    has_vector_index = any(VECTOR_COLUMN in name for name in existing)
+    if has_vector_index and table.name not in indexed_row_counts:
+        indexed_row_counts[table.name] = row_count  # Index predates this process; treat it as current
+    last_indexed = indexed_row_counts.get(table.name, 0)
+    needs_vector_index = force or (
+        row_count >= VECTOR_INDEX_MIN_ROWS
+        and (not has_vector_index or row_count >= last_indexed * (1 + VECTOR_INDEX_REBUILD_GROWTH))
+    )
+
+    if needs_vector_index:
+        dimension = table.schema.field(VECTOR_COLUMN).type.list_size
+        index_options = {
+            "vector_column_name": VECTOR_COLUMN,
+            "num_partitions": max(1, min(4096, int(math.sqrt(row_count)))),
+            "num_sub_vectors": _num_sub_vectors(dimension),
+            "replace": True,
+        }
+        if VECTOR_INDEX_TYPE != "IVF_PQ":
+            index_options["index_type"] = VECTOR_INDEX_TYPE
+        logger.info(f"Building {VECTOR_INDEX_TYPE} index on {table.name}.{VECTOR_COLUMN} over {row_count} rows")
+        table.create_index(**index_options)
+        indexed_row_counts[table.name] = row_count
+        summary["vector_index_built"] = True
+
+    if not hasattr(table, "create_scalar_index"):
+        logger.warning("This LanceDB version cannot build scalar indexes; tld prefilters will scan")
+        return summary
+    for column in SCALAR_INDEX_COLUMNS:
+        # Scalar indexes are cheap, so build them as soon as there is data and refresh them with the vector index
+        if needs_vector_index or not any(column in name for name in existing):
+            table.create_scalar_index(column, replace=True)
+            summary["scalar_indexes_built"].append(column)
+    return summary
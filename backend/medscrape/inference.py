@@ -1,52 +1,104 @@
 import json
+import random
+import asyncio
+import weakref
 import instructor
 import logging
-import redis.asyncio as redis
 import os
 
-from openai import OpenAI
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from .metrics import llm_requests, llm_tokens, timed_stage
 from .models import QuestionAnswered
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Redis setup for publishing logs
-REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
-log_redis_client = redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4')
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', 8))  # Maximum in-flight completions per event loop
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 5))
+LLM_BACKOFF_SECONDS = float(os.getenv('LLM_BACKOFF_SECONDS', 1.0))
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
-client = instructor.patch(OpenAI())
+# Retries are handled in query_llm so they respect the concurrency limit and Retry-After
+client = instructor.patch(AsyncOpenAI(max_retries=0))
 
 #Local Processing through Ollama — replace model with "<ollama-model-name>" in the response call
 # client = instructor.patch(
-#     OpenAI(
+#     AsyncOpenAI(
 #         base_url="http://localhost:11434/v1", 
 #         api_key="ollama",
 #     ),
 #     mode=instructor.Mode.JSON,
 # )
 
-async def query_llm(question: str, context: str, tld: str) -> QuestionAnswered:
-    log_message = f"Querying LLM with question: '{question}' and using context: '{context}'"
-    logger.info(log_message)
-    await log_redis_client.publish('log_channel', log_message)
-    
-    response = client.chat.completions.create(
-        model="gpt-4",
-        response_model=QuestionAnswered,
-        temperature=0,
-        messages=[
-            {
-                "role": "system",
-                "content": """ You are a world class medical research algorithm designed to answer questions with correct and exact citations.
-                        Provide the most accurate and relevant information for the question provided.
-                        """,
-            },
-            {"role": "user", "content": f"{context}"},
-            {"role": "user", "content": f"Question: {question}"},
-        ],
-        validation_context={"text_chunk": context},
-    )
+# asyncio primitives are bound to one event loop, so keep a semaphore per loop
+_llm_semaphores = weakref.WeakKeyDictionary()
+
+def _llm_semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _llm_semaphores[loop] = asyncio.Semaphore(LLM_CONCURRENCY)
+    return semaphore
+
+def _retry_delay(error, attempt):
+    # Prefer the server's Retry-After, otherwise back off exponentially with jitter
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return LLM_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+def _record_usage(response):
+    # instructor keeps the raw completion, whose usage covers any validation re-asks
+    usage = getattr(getattr(response, "_raw_response", None), "usage", None)
+    if usage is None:
+        return
+    llm_tokens.inc(usage.prompt_tokens or 0, type="prompt")
+    llm_tokens.inc(usage.completion_tokens or 0, type="completion")
+
+async def query_llm(question: str, context: str, tld: str, llm_client=None, model=LLM_MODEL) -> QuestionAnswered:
+    # The context itself can run to thousands of tokens, so only its size is logged
+    log_message = f"Querying LLM with question: '{question}' and {len(context)} characters of context"
+    logger.info(log_message, extra={"channel": "log_channel"})
+
+    llm_client = llm_client or client
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with _llm_semaphore():
+                with timed_stage("llm"):
+                    response = await llm_client.chat.completions.create(
+                        model=model,
+                        response_model=QuestionAnswered,
+                        temperature=0,
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": """ You are a world class medical research algorithm designed to answer questions with correct and exact citations.
+                                    Provide the most accurate and relevant information for the question provided.
+                                    """,
+                            },
+                            {"role": "user", "content": f"{context}"},
+                            {"role": "user", "content": f"Question: {question}"},
+                        ],
+                        validation_context={"text_chunk": context},
+                    )
+            break
+        except RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                llm_requests.inc(outcome="error")
+                raise
+            llm_requests.inc(outcome="retried")
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"LLM call failed with {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{LLM_MAX_RETRIES})")
+            await asyncio.sleep(delay)
+        except Exception:
+            llm_requests.inc(outcome="error")
+            raise
+    llm_requests.inc(outcome="success")
+    _record_usage(response)
     # Ensure the response is unpacked correctly
     answer = response.answer
     return QuestionAnswered(tld=tld, question=question, answer=answer)
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import uuid
+import logging
+
+from typing import Optional
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 7 * 24 * 3600))  # Keep finished jobs for 7 days
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', 300))  # Requeue running jobs whose worker stopped heartbeating
+JOB_PREFIX = "jobs"
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobQueue:
+    """
+    Redis-backed queue of crawl jobs shared by the API and any number of worker processes.
+
+    Each job is a hash at ``jobs:<id>``. Workers claim job ids by atomically moving them from the ``jobs:queue`` list
+    to ``jobs:processing``, so a job is never lost between the two: if its worker dies, the heartbeat stops and
+    `requeue_stale` puts the job back on the queue. Progress updates are stored on the job and published on
+    ``jobs:<id>:progress`` for that job's viewers only.
+    """
+
+    def __init__(self, redis_client, prefix=JOB_PREFIX, result_ttl=JOB_RESULT_TTL):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.result_ttl = result_ttl
+        self.queue_key = f"{prefix}:queue"
+        self.processing_key = f"{prefix}:processing"
+
+    def job_key(self, job_id):
+        return f"{self.prefix}:{job_id}"
+
+    def progress_channel(self, job_id):
+        return f"{self.prefix}:{job_id}:progress"
+
+    async def submit(self, kind, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(self.job_key(job_id), mapping={
+            "id": job_id,
+            "kind": kind,
+            "payload": json.dumps(payload),
+            "status": QUEUED,
+            "created_at": time.time(),
+        })
+        pipe.rpush(self.queue_key, job_id)
+        await pipe.execute()
+        logger.info(f"Queued {kind} job {job_id}", extra={"channel": "log_channel"})
+        return job_id
+
+    async def get(self, job_id) -> Optional[dict]:
+        job = await self.redis_client.hgetall(self.job_key(job_id))
+        if not job:
+            return None
+        for field in ("payload", "progress", "result"):
+            if field in job:
+                job[field] = json.loads(job[field])
+        job["cancel_requested"] = job.get("cancel_requested") == "1"
+        return job
+
+    async def claim(self, worker_id, timeout=5) -> Optional[dict]:
+        """
+        Waits up to `timeout` seconds for a queued job and marks it as running on `worker_id`.
+        """
+        job_id = await self.redis_client.blmove(self.queue_key, self.processing_key, timeout, "LEFT", "RIGHT")
+        if job_id is None:
+            return None
+        job = await self.get(job_id)
+        if job is None or job["status"] == CANCELLED:
+            await self.redis_client.lrem(self.processing_key, 0, job_id)
+            return None
+        now = time.time()
+        await self.redis_client.hset(self.job_key(job_id), mapping={"status": RUNNING, "worker": worker_id, "started_at": now, "heartbeat_at": now})
+        job.update(status=RUNNING, worker=worker_id)
+        return job
+
+    async def heartbeat(self, job_id):
+        await self.redis_client.hset(self.job_key(job_id), "heartbeat_at", time.time())
+
+    async def update_progress(self, job_id, progress: dict):
+        message = json.dumps(progress)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(self.job_key(job_id), mapping={"progress": message, "heartbeat_at": time.time()})
+        pipe.publish(self.progress_channel(job_id), message)
+        await pipe.execute()
+
+    async def finish(self, job_id, status, result=None, error=None):
+        fields = {"status": status, "finished_at": time.time()}
+        if result is not None:
+            fields["result"] = json.dumps(result)
+        if error is not None:
+            fields["error"] = error
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(self.job_key(job_id), mapping=fields)
+        pipe.expire(self.job_key(job_id), self.result_ttl)
+        pipe.lrem(self.processing_key, 0, job_id)
+        pipe.publish(self.progress_channel(job_id), json.dumps({"status": status, **({"error": error} if error else {})}))
+        await pipe.execute()
+        logger.info(f"Job {job_id} {status}", extra={"channel": "log_channel"})
+
+    async def cancel(self, job_id) -> Optional[str]:
+        """
+        Cancels a queued job outright, or asks the worker running it to stop.
+
+        :return: The job's status after the request, or None if there is no such job.
+        """
+        job = await self.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == QUEUED and await self.redis_client.lrem(self.queue_key, 0, job_id):
+            await self.finish(job_id, CANCELLED)
+            return CANCELLED
+        if job["status"] in (QUEUED, RUNNING):
+            # The worker may have claimed it since it was read; it checks this flag while running
+            await self.redis_client.hset(self.job_key(job_id), "cancel_requested", "1")
+        return job["status"]
+
+    async def cancel_requested(self, job_id) -> bool:
+        return await self.redis_client.hget(self.job_key(job_id), "cancel_requested") == "1"
+
+    async def requeue_stale(self, stale_seconds=JOB_STALE_SECONDS) -> int:
+        """
+        Moves running jobs whose worker has not sent a heartbeat for `stale_seconds` back onto the queue.
+        """
+        requeued = 0
+        now = time.time()
+        for job_id in await self.redis_client.lrange(self.processing_key, 0, -1):
+            heartbeat_at = await self.redis_client.hget(self.job_key(job_id), "heartbeat_at")
+            # No heartbeat yet means a worker is between claiming the job and marking it running
+            if heartbeat_at is None or now - float(heartbeat_at) < stale_seconds:
+                continue
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.lrem(self.processing_key, 0, job_id)
+            pipe.rpush(self.queue_key, job_id)
+            pipe.hset(self.job_key(job_id), "status", QUEUED)
+            await pipe.execute()
+            requeued += 1
+            logger.warning(f"Requeued job {job_id} after its worker stopped responding", extra={"channel": "log_channel"})
+        return requeued
+
+    async def stats(self) -> dict:
+        return {"queued": await self.redis_client.llen(self.queue_key), "running": await self.redis_client.llen(self.processing_key)}
+
+redis_client = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+job_queue = JobQueue(redis_client)
@@ -0,0 +1,76 @@
+import re
+
+from typing import Set
+from urllib.parse import urljoin, urlsplit
+from lxml import etree
+
+# Anchors, non-HTTP schemes, direct downloads and authentication pages, matched against the raw href
+EXCLUDED_LINK_PATTERN = re.compile(
+    r"^(?:#|mailto:|tel:|javascript:)|\.(?:pdf|docx|xlsx|zip)$|/(?:login|logout|register|password)",
+    re.IGNORECASE,
+)
+
+# urljoin strips and removes these, so hrefs containing them take the slow path
+_NEEDS_URLJOIN = re.compile(r"[\x00-\x20]")
+
+class _AnchorCollector:
+    """
+    lxml parser target that keeps anchor hrefs and discards everything else, so no tree is built.
+    """
+
+    def __init__(self):
+        self.hrefs = set()
+
+    def start(self, tag, attrib):
+        if tag == "a":
+            href = (attrib.get("href") or "").strip()  # Browsers ignore surrounding whitespace too
+            if href:
+                self.hrefs.add(href)
+
+    def close(self):
+        return self.hrefs
+
+def anchor_hrefs(html) -> Set[str]:
+    try:
+        return etree.fromstring(html, etree.HTMLParser(target=_AnchorCollector()))
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return etree.fromstring(html.encode("utf-8"), etree.HTMLParser(target=_AnchorCollector(), encoding="utf-8"))
+
+def extract_links(html, base_url, domain_name) -> Set[str]:
+    """
+    Returns the same-domain http(s) links on a page without their query string or fragment.
+
+    lxml's C parser streams the page to a target that only keeps anchor hrefs, and each distinct href is resolved and
+    checked once. Root-relative and absolute http(s) hrefs, the bulk of most pages, are resolved with string
+    operations; anything else goes through urljoin.
+    """
+    if not html or not html.strip():
+        return set()
+    try:
+        hrefs = anchor_hrefs(html)
+    except etree.LxmlError:
+        return set()
+
+    base = urlsplit(base_url)
+    root = f"{base.scheme}://{base.netloc}"
+    links = set()
+    for href in hrefs:
+        if not href or EXCLUDED_LINK_PATTERN.search(href):
+            continue
+        if _NEEDS_URLJOIN.search(href):
+            link = urljoin(base_url, href)
+        elif href.startswith("/") and not href.startswith("//") and "/." not in href:
+            if base.netloc != domain_name or base.scheme not in ("http", "https"):
+                continue
+            links.add(root + href.partition("#")[0].partition("?")[0])
+            continue
+        elif href.startswith(("http://", "https://")):
+            link = href
+        else:
+            link = urljoin(base_url, href)
+        link = link.partition("#")[0].partition("?")[0]
+        parts = urlsplit(link)
+        if parts.scheme in ("http", "https") and parts.netloc and parts.netloc == domain_name:
+            links.add(link)
+    return links
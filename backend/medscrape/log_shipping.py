@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+
+import redis
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 200))
+LOG_FLUSH_SECONDS = float(os.getenv('LOG_FLUSH_SECONDS', 0.25))
+LOG_STREAM_MAXLEN = int(os.getenv('LOG_STREAM_MAXLEN', 10000))
+LOG_MAX_MESSAGE_CHARS = int(os.getenv('LOG_MAX_MESSAGE_CHARS', 4000))
+# Failed sends are reported on stderr at most once per this many seconds, so a Redis outage does not flood it
+LOG_FAILURE_REPORT_SECONDS = float(os.getenv('LOG_FAILURE_REPORT_SECONDS', 60))
+LOG_STREAM_PREFIX = "logs"
+
+def truncate(message, max_chars=LOG_MAX_MESSAGE_CHARS):
+    if len(message) <= max_chars:
+        return message
+    return f"{message[:max_chars]}... [{len(message) - max_chars} characters truncated]"
+
+class LogShipper(logging.Handler):
+    """
+    Ships log lines and events to Redis from a background thread.
+
+    Log records carrying a `channel` attribute (``logger.info(msg, extra={"channel": "log_channel"})``) and events
+    passed to `publish` are put on a bounded queue, which costs the caller no I/O. A drain thread sends them in
+    pipelined batches: each entry is appended to the capped Redis Stream ``logs:<channel>`` (XADD MAXLEN) for history,
+    and published on ``<channel>`` for the live SSE endpoints. When the queue is full, entries are dropped and counted
+    rather than blocking the caller. Batches that fail to send are counted too, and reported on stderr at most once
+    per `failure_report_seconds`.
+    """
+
+    def __init__(self, redis_url=REDIS_URL, queue_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE, flush_seconds=LOG_FLUSH_SECONDS, stream_maxlen=LOG_STREAM_MAXLEN, max_message_chars=LOG_MAX_MESSAGE_CHARS, failure_report_seconds=LOG_FAILURE_REPORT_SECONDS, redis_client=None):
+        super().__init__()
+        self.redis_url = redis_url
+        self.redis_client = redis_client
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.stream_maxlen = stream_maxlen
+        self.max_message_chars = max_message_chars
+        self.failure_report_seconds = failure_report_seconds
+        self.shipped = 0
+        self.dropped = 0
+        self.failed = 0
+        self._unreported_failures = 0
+        self._last_failure_report = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def emit(self, record):
+        channel = getattr(record, "channel", None)
+        if channel is None:
+            return
+        try:
+            self._enqueue(channel, truncate(self.format(record), self.max_message_chars))
+        except Exception:
+            self.handleError(record)
+
+    def publish(self, channel, message):
+        """
+        Queues an event (e.g. a JSON progress update) for `channel` without writing it to the application log.
+        """
+        self._enqueue(channel, truncate(message, self.max_message_chars))
+
+    def _enqueue(self, channel, message):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((channel, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._drain, name="log-shipper", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_seconds)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch):
+        if self.redis_client is None:
+            self.redis_client = redis.Redis.from_url(self.redis_url, encoding="utf-8", decode_responses=True)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for channel, message in batch:
+            pipe.xadd(f"{LOG_STREAM_PREFIX}:{channel}", {"message": message}, maxlen=self.stream_maxlen, approximate=True)
+            pipe.publish(channel, message)
+        pipe.execute()
+
+    def _drain(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._send(batch)
+                self.shipped += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                self._report_failure(len(batch), e)
+
+    def _report_failure(self, count, error):
+        self._unreported_failures += count
+        now = time.monotonic()
+        if self._last_failure_report is not None and now - self._last_failure_report < self.failure_report_seconds:
+            return
+        # Logging about a logging failure through `logging` could loop, so report it on stderr
+        print(f"Log shipper failed to send {self._unreported_failures} entries ({self.failed} in total): {error}", file=sys.stderr)
+        self._unreported_failures = 0
+        self._last_failure_report = now
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "shipped": self.shipped, "dropped": self.dropped, "failed": self.failed}
+
+    def close(self):
+        """
+        Sends what is still queued and stops the drain thread.
+        """
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout=self.flush_seconds + 5)
+        super().close()
+
+log_shipper = LogShipper()
+# Attached to the package logger rather than the root one, so modules' logging.basicConfig calls still take effect
+logging.getLogger(__name__.split(".")[0]).addHandler(log_shipper)
@@ -1,28 +1,29 @@
 import os
 import logging
 import json
-import aiohttp
 import asyncio
-import gspread
 
 from dotenv import load_dotenv
 from json import JSONEncoder
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from redis.asyncio import Redis
 from contextlib import asynccontextmanager
-from urllib.parse import urlparse
 from starlette.requests import Request
 from starlette.responses import JSONResponse, Response as StarletteResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
 
-from .models import UserQueries, Response, ResponseData
-from .processing import process_html_content
-from .retrieval import lance_retrieval, lance_search
-from .enumeration import get_all_website_links
-from .retrieval import lance_retrieval
+from .models import JobRequest, UserQueries, Response, ResponseData
+from .answer_cache import answer_cache
+from .streaming import pubsub_hub
+from .log_shipping import log_shipper
+from .export import answer_rows, result_exporter
+from .fetching import http_client
+from .jobs import FINISHED_STATUSES, SUCCEEDED, job_queue
+from .metrics import METRICS_ENABLED, http_request_seconds, registry
+from .processing import shutdown_partition_executor
+from .retrieval import get_retrieval_service, lance_retrieval, lance_search, stream_answers
 
 
 
@@ -32,19 +33,42 @@ logging.basicConfig(filename='app.log', level=logging.INFO)
 load_dotenv()
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+RETRIEVAL_WARMUP = os.getenv('RETRIEVAL_WARMUP', 'true').lower() == 'true'
 
 @asynccontextmanager
 async def app_lifespan(app: FastAPI):
-    global log_redis_client
-    log_redis_client = await Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+    # One pooled session for every crawl keeps DNS answers and keep-alive connections warm between requests
+    await http_client.start()
+    if RETRIEVAL_WARMUP:
+        # Load the table handle, embedder and ColBERT checkpoint before serving the first query
+        await asyncio.to_thread(get_retrieval_service().warmup)
     try:
         yield
     finally:
-        await log_redis_client.close()
-        await log_redis_client.wait_closed()
+        await http_client.close()
+        shutdown_partition_executor()
+        await pubsub_hub.close()
+        # Send the log lines still queued before the process exits
+        await asyncio.to_thread(result_exporter.close)
+        await asyncio.to_thread(log_shipper.close)
 
 app = FastAPI(lifespan=app_lifespan)
 
+# Values the background components already keep, read when /metrics is scraped
+registry.gauge("medscrape_queue_depth", "Items waiting in in-process and Redis queues.", ["queue"], function=lambda: {
+    "log_shipper": log_shipper.stats()["queued"],
+    "result_exporter": result_exporter.stats()["queued"],
+})
+registry.counter("medscrape_log_entries_total", "Log lines and events handled by the log shipper by outcome.", ["outcome"], function=lambda: {
+    outcome: log_shipper.stats()[outcome] for outcome in ("shipped", "dropped", "failed")
+})
+registry.gauge("medscrape_stream_clients", "Clients subscribed to each streamed Redis channel.", ["channel"], function=lambda: pubsub_hub.stats()["clients"])
+registry.counter("medscrape_http_client_connections_total", "Connections used by the shared crawl session.", ["kind"], function=lambda: {
+    "new": http_client.stats()["new_connections"],
+    "reused": http_client.stats()["reused_connections"],
+})
+job_queue_depth = registry.gauge("medscrape_job_queue_depth", "Jobs queued and running in the Redis job queue.", ["state"])
+
 # Split the CORS_ORIGINS by comma to support multiple origins
 allowed_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
 
@@ -65,129 +89,265 @@ class ResponseEncoder(JSONEncoder):
             return obj.__dict__  
         return JSONEncoder.default(self, obj)
 
+def format_event(event, data, stream_format="sse"):
+    """
+    Serializes one streamed event as a Server-Sent Event or as a line of NDJSON.
+    """
+    payload = json.dumps(data, cls=ResponseEncoder)
+    if stream_format == "ndjson":
+        return json.dumps({"event": event, "data": json.loads(payload)}) + "\n"
+    return f"event: {event}\ndata: {payload}\n\n"
+
+def streaming_response(generator, stream_format="sse"):
+    media_type = "application/x-ndjson" if stream_format == "ndjson" else "text/event-stream"
+    # Stop proxies from buffering the stream so each answer reaches the client as soon as it is sent
+    return StreamingResponse(generator, media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def answer_events(query: UserQueries, stream_format="sse"):
+    """
+    Yields an `answer` event per question as it completes, then a `summary` event once all are answered.
+    """
+    start = time.monotonic()
+    questions = list(query.questions)
+    formatted_answers = [None] * len(questions)
+    first_answer_seconds = None
+    async for index, answer in stream_answers(query):
+        if first_answer_seconds is None:
+            first_answer_seconds = round(time.monotonic() - start, 3)
+        formatted_answers[index] = {"question": questions[index], "answer": answer.answer}
+        yield format_event("answer", {"index": index, "question": questions[index], "answer": answer.answer}, stream_format)
+    result_exporter.submit(answer_rows(query.tld, formatted_answers))
+    summary = {
+        "message": "Inference call made successfully",
+        "tld": query.tld,
+        "answered": len(questions),
+        "first_answer_seconds": first_answer_seconds,
+        "elapsed_seconds": round(time.monotonic() - start, 3),
+    }
+    log_shipper.publish('response_channel', json.dumps({**summary, "data": formatted_answers}, cls=ResponseEncoder))
+    yield format_event("summary", summary, stream_format)
+
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         start_time = time.time()
         response = await call_next(request)
         process_time = time.time() - start_time
+        if METRICS_ENABLED:
+            # The route template keeps ids in paths like /jobs/{job_id} from creating a series per request
+            route = request.scope.get("route")
+            http_request_seconds.observe(process_time, method=request.method, route=route.path if route else "unmatched", status=response.status_code)
         log_message = f'Path: {request.url.path}, Method: {request.method}, Status: {response.status_code}, Time: {process_time}'
-        logger.info(log_message)
-        asyncio.create_task(log_redis_client.publish('log_channel', log_message))
+        logger.info(log_message, extra={"channel": "log_channel"})
         return response
 
 app.add_middleware(LoggingMiddleware)
 
+async def submit_job_request(job: JobRequest) -> str:
+    """
+    Queues a crawl for the worker processes and returns its id.
+    """
+    if job.kind == "run" and not job.questions:
+        raise HTTPException(status_code=400, detail="A run job needs at least one question")
+    return await job_queue.submit(job.kind, job.model_dump(exclude={"kind"}))
+
+async def enqueue_job(job: JobRequest):
+    """
+    Queues a crawl for the worker processes and answers 202 with the job id and a Location to poll.
+    """
+    job_id = await submit_job_request(job)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"}, headers={"Location": f"/jobs/{job_id}"})
+
 @app.post("/run/")
 async def medscrape(query: UserQueries):
-    website_url = query.tld
-    user_questions = query.questions
-    tld = urlparse(website_url).netloc
-    async with aiohttp.ClientSession() as session:
-        website = await get_all_website_links(website_url, session)
-        tasks = [process_html_content(url, tld, session) for url in website.urls]
-        await asyncio.gather(*tasks)
-    answers = await lance_retrieval(query)
-    formatted_answers = [{"question": q, "answer": a.answer} for q, a in zip(user_questions, answers)]
-    response =  {"message": "Completed processing and answering questions.", "data": formatted_answers}
-    log_message = f'Processing and answering questions completed for {website_url}'
-    logger.info(log_message)
-    asyncio.create_task(log_redis_client.publish('response_channel', json.dumps(response, cls=ResponseEncoder)))
-    return response
+    """
+    Queues a crawl that ingests the site and then answers the questions; poll /jobs/{job_id} for the answers.
+    """
+    return await enqueue_job(JobRequest(kind="run", tld=query.tld, questions=query.questions))
 
 @app.post("/process/")
 async def scrape_and_process(request: Request):
+    """
+    Queues a crawl that ingests the site; poll /jobs/{job_id} or stream /jobs/{job_id}/stream for progress.
+    """
     body = await request.json()
     website_tld = body.get('tld')
     if not website_tld:
         raise HTTPException(status_code=400, detail="URL is required")
-    parsed_tld = urlparse(website_tld).netloc
-    try:
-        async with aiohttp.ClientSession() as session:
-            website = await get_all_website_links(website_tld, session)
-            tasks = [process_html_content(url, website_tld, session) for url in website.urls]
-            total_tasks = len(tasks)
-            completed_tasks = 0
-            for task in asyncio.as_completed(tasks):
-                await task
-                completed_tasks += 1
-                progress_percentage = (completed_tasks / total_tasks) * 100
-                progress_update = {"status": "Processing", "progress": progress_percentage}
-                asyncio.create_task(log_redis_client.publish('progress_channel', json.dumps(progress_update)))
-        response = {"message": "Scraping and processing completed", "url": parsed_tld, "urls_found": len(website.urls)}
-        log_message = f'Scraping and processing completed for {parsed_tld}'
-        logger.info(log_message)
-        asyncio.create_task(log_redis_client.publish('response_channel', json.dumps(response)))
-    except Exception as e:
-        logger.error(f"Error during processing: {str(e)}")
-        response = {"message": "An error occurred during processing", "error": str(e)}
-    return response
+    return await enqueue_job(JobRequest(kind="process", tld=website_tld))
 
 @app.post("/query/")
 async def make_query_call(query: UserQueries):
     log_message = f"Making query call with LLM over questions: {query.questions}"
-    logger.info(log_message)
-    asyncio.create_task(log_redis_client.publish('response_channel', log_message))
+    logger.info(log_message, extra={"channel": "response_channel"})
     progress_update = {"status": "Query Processing", "progress": 0}
-    asyncio.create_task(log_redis_client.publish('query_progress_channel', json.dumps(progress_update)))
+    log_shipper.publish('query_progress_channel', json.dumps(progress_update))
     answers = await lance_retrieval(query)
     for i, answer in enumerate(answers):
         progress = (i + 1) / len(answers) * 100
-        asyncio.create_task(log_redis_client.publish('query_progress_channel', json.dumps({"progress": progress})))
+        log_shipper.publish('query_progress_channel', json.dumps({"progress": progress}))
     formatted_answers = [{"question": q, "answer": a.answer} for q, a in zip(query.questions, answers)]
     response = {"message": "Inference call made successfully", "data": formatted_answers}
     
-    # Set up the Google Sheets client using your JSON key file for authentication
-    gc = gspread.service_account(filename=os.getenv('GOOGLE_CREDENTIALS_PATH'))
-    sheet_id = os.getenv('GOOGLE_SHEET_ID')  # Replace with your actual Google Sheet ID
-    sheet = gc.open_by_key(sheet_id).sheet1
-    
-    # Ensure each value is a string and not None. If None, replace with a default value, e.g., "N/A"
-    cleaned_answers = []
-    for answer in formatted_answers:
-        cleaned_answer = {key: (str(value) if value is not None else "N/A") for key, value in answer.items()}
-        cleaned_answers.append(cleaned_answer)
-
-    # Convert each dictionary to a list of values in the correct order before appending
-    values_to_append = [[answer['question'], answer['answer']] for answer in cleaned_answers]
-
-    # Use gspread to append `values_to_append` to the sheet in a single batch operation
-    sheet.append_rows([[query.tld] + row for row in values_to_append])
+    result_exporter.submit(answer_rows(query.tld, formatted_answers))
     
     progress_update = {"status": "Query Processing", "progress": 100}
-    asyncio.create_task(log_redis_client.publish('query_progress_channel', json.dumps(progress_update)))
+    log_shipper.publish('query_progress_channel', json.dumps(progress_update))
     
-    logger.info(json.dumps(response, indent=4, cls=ResponseEncoder))
-    asyncio.create_task(log_redis_client.publish('response_channel', json.dumps(response, indent=4, cls=ResponseEncoder)))
+    logger.info(json.dumps(response, cls=ResponseEncoder), extra={"channel": "response_channel"})
     return response
 
+@app.post("/query/stream/")
+async def make_query_stream(query: UserQueries, format: str = "sse"):
+    """
+    Streaming variant of /query/ that sends each answer as soon as it is ready (format=sse or ndjson).
+    """
+    log_message = f"Making streamed query call with LLM over questions: {query.questions}"
+    logger.info(log_message, extra={"channel": "response_channel"})
+
+    async def event_generator():
+        try:
+            async for event in answer_events(query, format):
+                yield event
+        except Exception as e:
+            logger.error(f"Error during streamed query: {str(e)}")
+            yield format_event("error", {"message": "An error occurred during the query", "error": str(e)}, format)
+
+    return streaming_response(event_generator(), format)
+
+async def wait_for_job(job_id, on_progress):
+    """
+    Passes a job's progress updates to `on_progress` until it finishes, then returns the finished job.
+
+    The job's status is also read on every heartbeat, so a job that finished before its channel was subscribed, or a
+    client dropped by the hub for falling behind, does not wait forever.
+    """
+    channel = job_queue.progress_channel(job_id)
+    async for message in pubsub_hub.messages(channel):
+        if message is not None:
+            update = json.loads(message)
+            if update.get("status") not in FINISHED_STATUSES:
+                await on_progress(update)
+                continue
+        job = await job_queue.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return job
+    return await job_queue.get(job_id)
+
+@app.post("/run/stream/")
+async def medscrape_stream(query: UserQueries, format: str = "sse"):
+    """
+    Streaming variant of /run/: queues a run job, sends its progress, then its answers (format=sse or ndjson).
+
+    The job runs on a worker, so dropping the connection does not stop it; its answers stay available at /jobs/{job_id}.
+    """
+    start = time.monotonic()
+    job_id = await submit_job_request(JobRequest(kind="run", tld=query.tld, questions=query.questions))
+
+    async def event_generator():
+        yield format_event("job", {"job_id": job_id, "status": "queued"}, format)
+        progress = asyncio.Queue()
+
+        async def on_progress(progress_update):
+            progress.put_nowait(progress_update)
+
+        async def wait():
+            try:
+                return await wait_for_job(job_id, on_progress)
+            finally:
+                progress.put_nowait(None)
+
+        wait_task = asyncio.create_task(wait())
+        try:
+            while (update := await progress.get()) is not None:
+                yield format_event("progress", update, format)
+            job = await wait_task
+            if job is None or job["status"] != SUCCEEDED:
+                error = job.get("error") if job is not None else "Job not found"
+                status = job["status"] if job is not None else None
+                yield format_event("error", {"message": "An error occurred during processing", "job_id": job_id, "status": status, "error": error}, format)
+                return
+            result = job["result"]
+            yield format_event("progress", {"stage": "processed", "rows_written": result["ingest_stats"]["rows_written"]}, format)
+            for index, answer in enumerate(result["data"]):
+                yield format_event("answer", {"index": index, **answer}, format)
+            yield format_event("summary", {
+                "message": "Inference call made successfully",
+                "tld": query.tld,
+                "job_id": job_id,
+                "answered": len(result["data"]),
+                "elapsed_seconds": round(time.monotonic() - start, 3),
+            }, format)
+            logger.info(f'Processing and answering questions completed for {query.tld}')
+        except Exception as e:
+            logger.error(f"Error during streamed run: {str(e)}")
+            yield format_event("error", {"message": "An error occurred during processing", "job_id": job_id, "error": str(e)}, format)
+        finally:
+            wait_task.cancel()
+
+    return streaming_response(event_generator(), format)
+
 @app.post("/search/")
 async def make_search_call(query: UserQueries):
     log_message = f"Initiating database search over questions: {query.questions}"
-    logger.info(log_message)
-    asyncio.create_task(log_redis_client.publish('log_channel', log_message))
+    logger.info(log_message, extra={"channel": "log_channel"})
     search_results = await lance_search(query)
     formatted_search_results = [{"question": q, "search_result": sr} for q, sr in zip(query.questions, search_results)]
     response = {"message": "Database search call made successfully", "data": formatted_search_results}
-    logger.info(json.dumps(response, indent=4, cls=ResponseEncoder))  # Use the custom encoder here
-    asyncio.create_task(log_redis_client.publish('response_channel', json.dumps(response, indent=4, cls=ResponseEncoder)))
+    logger.info(json.dumps(response, cls=ResponseEncoder), extra={"channel": "response_channel"})  # Use the custom encoder here
     return response
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    log_message = f"Request: {request.method} {request.url}"
-    logger.info(log_message)
-    asyncio.create_task(log_redis_client.publish('log_channel', log_message))
-    response = await call_next(request)
-    log_message = f"Response: {response.status_code}"
-    logger.info(log_message)
-    asyncio.create_task(log_redis_client.publish('log_channel', log_message))
-    return response
+@app.post("/jobs/")
+async def submit_job(job: JobRequest):
+    """
+    Queues a crawl for the worker processes and returns immediately with its id.
+    """
+    return await enqueue_job(job)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    status = await job_queue.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "status": status}
+
+@app.get("/jobs/{job_id}/stream")
+async def job_progress_stream(job_id: str):
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return sse_channel_response(job_queue.progress_channel(job_id), lambda progress_data: progress_data)
+
+@app.get("/cache_stats/")
+async def cache_stats():
+    return {"answer_cache": await answer_cache.stats()}
+
+@app.get("/http_stats/")
+async def http_stats():
+    return {"connection_pool": http_client.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Pipeline stage timings, queue depths, cache and LLM counters in the Prometheus text format.
+    """
+    try:
+        depths = await job_queue.stats()
+        job_queue_depth.set(depths["queued"], state="queued")
+        job_queue_depth.set(depths["running"], state="running")
+    except Exception as e:
+        logger.error(f"Could not read the job queue depth: {e}")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     log_message = f"HTTP error occurred for {request.url}: {exc.detail}"
-    logger.error(log_message)
-    asyncio.create_task(log_redis_client.publish('log_channel', log_message))
+    logger.error(log_message, extra={"channel": "log_channel"})
     return JSONResponse(
         status_code=exc.status_code,
         content={"message": exc.detail},
@@ -201,31 +361,16 @@ async def health_check():
 async def health_check_v1():
     return {"status": "healthy", "version": "v1"}
 
-@app.get("/stream/")
-async def stream(request: Request, channel: str = 'log_channel'):
-    logger.info(f"Attempting to connect to Redis at URL: {REDIS_URL}")
-    r = await Redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'), encoding="utf-8", decode_responses=True) 
-    logger.info("Connected to Redis successfully.")
-    pubsub = r.pubsub()
-    await pubsub.subscribe(channel)
-    logger.info(f"Subscribed to Redis channel: {channel}")
-    
+def sse_channel_response(channel, format_message):
+    """
+    Streams a Redis channel to one client through the shared pub/sub hub, with keep-alive comments while idle.
+    """
     async def event_generator():
         try:
-            while True:
-                message = await pubsub.get_message()
-                if message and message['type'] == 'message':
-                    log_data = message['data']
-                    logger.info(f"Streaming data: {log_data}")
-                    yield f"data: {json.dumps({'message': log_data})}\n\n"
-                await asyncio.sleep(.01)
+            async for message in pubsub_hub.messages(channel):
+                yield ": heartbeat\n\n" if message is None else f"data: {format_message(message)}\n\n"
         except Exception as e:
-            logger.error(f"Error in stream event generator: {str(e)}")
-        finally:
-            await pubsub.unsubscribe(channel)
-            pubsub.close()
-            await r.wait_closed()
-            logger.info(f"Unsubscribed from Redis channel: {channel} and connection closed.")
+            logger.error(f"Error in {channel} stream event generator: {str(e)}")
 
     response = StreamingResponse(event_generator(), media_type="text/event-stream")
     response.headers['Access-Control-Allow-Origin'] = '*'
@@ -233,66 +378,14 @@ async def stream(request: Request, channel: str = 'log_channel'):
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
     return response
 
+@app.get("/stream/")
+async def stream(request: Request, channel: str = 'log_channel'):
+    return sse_channel_response(channel, lambda log_data: json.dumps({'message': log_data}))
+
 @app.get("/progress_stream/")
 async def progress_stream(request: Request, channel: str = 'progress_channel'):
-    logger.info(f"Attempting to connect to Redis for progress updates at URL: {REDIS_URL}")
-    r = await Redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'), encoding="utf-8", decode_responses=True) 
-    logger.info("Connected to Redis for progress updates successfully.")
-    pubsub = r.pubsub()
-    await pubsub.subscribe(channel)
-    logger.info(f"Subscribed to Redis progress channel: {channel}")
-    
-    async def progress_event_generator():
-        try:
-            while True:
-                message = await pubsub.get_message()
-                if message and message['type'] == 'message':
-                    progress_data = message['data']
-                    logger.info(f"Streaming progress data: {progress_data}")
-                    yield f"data: {progress_data}\n\n"
-                await asyncio.sleep(1)  # Adjust sleep time as needed
-        except Exception as e:
-            logger.error(f"Error in progress stream event generator: {str(e)}")
-        finally:
-            await pubsub.unsubscribe(channel)
-            pubsub.close()
-            await r.wait_closed()
-            logger.info(f"Unsubscribed from Redis progress channel: {channel} and connection closed.")
-
-    response = StreamingResponse(progress_event_generator(), media_type="text/event-stream")
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-    return response
+    return sse_channel_response(channel, lambda progress_data: progress_data)
 
 @app.get("/query_progress_stream/")
 async def query_progress_stream(request: Request, channel: str = 'query_progress_channel'):
-    logger.info(f"Attempting to connect to Redis for query progress updates at URL: {REDIS_URL}")
-    r = await Redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'), encoding="utf-8", decode_responses=True) 
-    logger.info("Connected to Redis for query progress updates successfully.")
-    pubsub = r.pubsub()
-    await pubsub.subscribe(channel)
-    logger.info(f"Subscribed to Redis query progress channel: {channel}")
-    
-    async def query_progress_event_generator():
-        try:
-            while True:
-                message = await pubsub.get_message()
-                if message and message['type'] == 'message':
-                    query_progress_data = message['data']
-                    logger.info(f"Streaming query progress data: {query_progress_data}")
-                    yield f"data: {query_progress_data}\n\n"
-                await asyncio.sleep(1)  # Adjust sleep time as needed
-        except Exception as e:
-            logger.error(f"Error in query progress stream event generator: {str(e)}")
-        finally:
-            await pubsub.unsubscribe(channel)
-            pubsub.close()
-            await r.wait_closed()
-            logger.info(f"Unsubscribed from Redis query progress channel: {channel} and connection closed.")
-
-    response = StreamingResponse(query_progress_event_generator(), media_type="text/event-stream")
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-    return response
\ No newline at end of file
+    return sse_channel_response(channel, lambda query_progress_data: query_progress_data)
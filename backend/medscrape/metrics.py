@@ -0,0 +1,207 @@
+import os
+import time
+import bisect
+import threading
+
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Seconds; spans a cached Redis lookup up to a slow LLM completion or a large LanceDB write
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """
+    Base for metrics rendered in the Prometheus text format.
+
+    Values are kept per combination of label values, passed as keyword arguments when recording. Recording takes
+    a lock, so metrics can be updated from executor and shipper threads as well as the event loop.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames: Sequence[str] = (), function: Optional[Callable] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Called at scrape time for values another component already keeps; returns a number or {label values: number}
+        self.function = function
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        if self.function is not None:
+            value = self.function()
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            return [(self.name, key if isinstance(key, tuple) else (key,), sample) for key, sample in items]
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram; an observation costs a bisect and a few additions under the lock.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[:-1]) if series else 0
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            # Modules may be reloaded in tests; keep the first instance so recorded values are not split
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=(), function=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                continue  # A failing scrape-time callback should not hide the other metrics
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# Pipeline stages: fetch, partition, embed, write, search, rerank, llm
+stage_seconds = registry.histogram("medscrape_stage_seconds", "Time spent in each pipeline stage; search includes its rerank.", ["stage"])
+stage_errors = registry.counter("medscrape_stage_errors_total", "Failures in each pipeline stage.", ["stage"])
+crawl_pages = registry.counter("medscrape_crawl_pages_total", "Pages handled by the crawler by outcome.", ["outcome"])
+crawl_fetches_in_flight = registry.gauge("medscrape_crawl_fetches_in_flight", "Page fetches currently in progress across all crawls.")
+ingest_chunks = registry.counter("medscrape_ingest_chunks_total", "Chunks embedded and written to ExtractedData.")
+cache_requests = registry.counter("medscrape_cache_requests_total", "Lookups in the answer and content caches by result.", ["cache", "result"])
+llm_requests = registry.counter("medscrape_llm_requests_total", "LLM completions by outcome.", ["outcome"])
+llm_tokens = registry.counter("medscrape_llm_tokens_total", "Tokens reported by the LLM API.", ["type"])
+http_request_seconds = registry.histogram("medscrape_http_request_seconds", "API request latency by route.", ["method", "route", "status"])
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Times a block as one observation of `stage`, counting an error if it raises.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
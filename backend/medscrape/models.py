@@ -1,6 +1,6 @@
 import pydantic
 import re
-from typing import List
+from typing import List, Literal
 from pydantic import BaseModel, Field, model_validator, ValidationInfo
 from lancedb.pydantic import LanceModel
 
@@ -11,6 +11,11 @@ class UserQueries(BaseModel):
     tld: str = Field(..., description="The top-level domain to pre-filter the search.")
     questions: List[str] = Field(..., description="The questions to query the language model.")
 
+class JobRequest(BaseModel):
+    kind: Literal["process", "run"] = Field("process", description="process crawls and ingests the site; run also answers the questions.")
+    tld: str = Field(..., description="The website to crawl.")
+    questions: List[str] = Field(default_factory=list, description="The questions to answer once a run job has ingested the site.")
+
 class ResponseData(LanceModel):
     url: str = Field(description="The URL of the website.")
     text_chunk: str = Field(description="The text chunk text from the DB website.")
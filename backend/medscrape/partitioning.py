@@ -0,0 +1,88 @@
+import io
+import hashlib
+
+from typing import List, Tuple
+from unstructured.partition.html import partition_html
+from unstructured.partition.pdf import partition_pdf
+from urllib.parse import urljoin
+
+# Functions in this module run inside the partition executor. They are kept free of LanceDB, Redis and embedding
+# imports so that spawning a worker process stays cheap and never touches the ExtractedData table.
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+
+def chunk_id(url, index):
+    """
+    Returns the stable id of the `index`-th chunk of `url`, so re-ingesting a page replaces its rows in place.
+    """
+    return hashlib.sha256(f"{url}#{index}".encode("utf-8")).hexdigest()
+
+def partition_html_rows(url, parsed_tld, html=None, include_metadata=True, ssl_verify=True, headers=None, html_assemble_articles=False) -> Tuple[List[dict], List[str]]:
+    """
+    Partitions and chunks an HTML page into ExtractedData rows.
+
+    :return: The rows for the page and the absolute URLs of the PDFs it links to.
+    """
+    # Only download the page here when no crawled body was handed over
+    source = {"text": html} if html is not None else {"url": url, "ssl_verify": ssl_verify, "headers": headers or {'User-Agent': USER_AGENT}}
+    elements = partition_html(
+        **source,
+        include_metadata=include_metadata,
+        html_assemble_articles=html_assemble_articles,
+        chunking_strategy="by-title",
+        max_characters=1000,
+        new_after_n_chars=500,
+        combine_text_under_n_chars=500,
+        overlap=30
+    )
+    extracted_data_list = []
+    pdf_links = []
+    for index, element in enumerate(elements):
+        metadata = element.metadata.to_dict()
+        extracted_data = {
+            "chunk_id": chunk_id(url, index),
+            "tld": parsed_tld,
+            "url": url,
+            "text_chunk": element.text,
+            "text_as_html": metadata.get("text_as_html", None),
+            "parent_id": metadata.get("parent_id", None),
+            "category_depth": metadata.get("category_depth", None),
+            "link_urls": metadata.get("link_urls", []),
+            "link_texts": metadata.get("link_texts", []),
+            "is_continuation": metadata.get("is_continuation", None),
+        }
+        extracted_data_list.append(extracted_data)
+        for link_url in metadata.get("link_urls", []):
+            if link_url.endswith(".pdf"):
+                pdf_links.append(urljoin(url, link_url))
+    return extracted_data_list, pdf_links
+
+def partition_pdf_rows(url, parsed_tld, pdf) -> List[dict]:
+    """
+    Partitions a downloaded PDF into ExtractedData rows.
+
+    :param pdf: The PDF as bytes (process pool) or as an open binary file (thread pool).
+    """
+    elements = partition_pdf(
+        file=io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf,
+        url=None,  # Set url=None to run inference locally
+        strategy="fast", #Can be set to "hi_res", but there are open issues in unstructured that need to be resolved
+    )
+
+    extracted_data_list = []
+    for index, element in enumerate(elements):
+        metadata = element.metadata.to_dict()
+        extracted_data = {
+            "chunk_id": chunk_id(url, index),
+            "tld": parsed_tld,
+            "url": url,
+            "text_chunk": element.text,
+            "text_as_html": metadata.get("text_as_html", None),
+            "parent_id": metadata.get("parent_id", None),
+            "category_depth": metadata.get("category_depth", None),
+            "link_urls": [],
+            "link_texts": [],
+            "is_continuation": metadata.get("is_continuation", None)
+        }
+        extracted_data_list.append(extracted_data)
+    return extracted_data_list
@@ -0,0 +1,76 @@
+import aiohttp
+import logging
+
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlparse
+
+from .checkpoint import WRITTEN, CrawlCheckpoint
+from .enumeration import get_all_website_links, redis_client
+from .export import answer_rows, result_exporter
+from .fetching import http_client
+from .models import UserQueries
+from .processing import page_state_store, process_pages
+from .retrieval import lance_retrieval
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[dict], Awaitable[None]]
+
+async def ingest_site(website_url, session=None, on_progress: Optional[ProgressCallback] = None) -> dict:
+    """
+    Crawls a website and ingests its new and changed pages into ExtractedData.
+
+    Progress is checkpointed per tld, so if a previous call was interrupted this one resumes its crawl and only
+    processes the pages whose rows were not yet written. The checkpoint is removed once the ingest completes.
+
+    :param session: aiohttp session shared by the crawl and PDF downloads; defaults to the process-wide session, or one
+        created for the call when that is not open.
+    :param on_progress: Optional coroutine function called with a progress update after the crawl and after each page.
+    :return: A summary of the crawl with the BulkWriter's ingest statistics.
+    """
+    if session is None and http_client.session is not None:
+        session = http_client.session
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await ingest_site(website_url, session, on_progress)
+
+    parsed_tld = urlparse(website_url).netloc if urlparse(website_url).netloc else urlparse(website_url).path
+    checkpoint = CrawlCheckpoint(redis_client, parsed_tld)
+    website = await get_all_website_links(website_url, session, checkpoint=checkpoint)
+    changed_urls = website.changed_urls()
+    written = [url for url in changed_urls if checkpoint.state(url) == WRITTEN]
+    if written:
+        logger.info(f"Resuming ingest of {parsed_tld}: {len(written)} pages were already written", extra={"channel": "log_channel"})
+        await page_state_store.save({url: website.page_states[url] for url in written if url in website.page_states})
+        changed_urls = [url for url in changed_urls if checkpoint.state(url) != WRITTEN]
+    if on_progress is not None:
+        await on_progress({"stage": "crawled", "urls_found": len(website.urls), "urls_unchanged": len(website.unchanged_urls)})
+
+    async def on_page_done(completed, total):
+        await on_progress({"stage": "processing", "status": "Processing", "completed": completed, "total": total, "progress": completed / total * 100})
+
+    ingest_stats = await process_pages(changed_urls, parsed_tld, session, on_page_done=on_page_done if on_progress is not None else None, page_states=website.page_states, checkpoint=checkpoint, on_progress=on_progress)
+    await checkpoint.clear()
+    return {"url": parsed_tld, "urls_found": len(website.urls), "urls_unchanged": len(website.unchanged_urls), "connection_stats": website.connection_stats, "ingest_stats": ingest_stats}
+
+async def answer_and_export(query: UserQueries) -> list:
+    """
+    Answers every question for the tld and queues the answers for export.
+
+    :return: The answers as JSON-serializable {"question", "answer"} dicts in question order.
+    """
+    answers = await lance_retrieval(query)
+    formatted_answers = [{"question": q, "answer": [response.model_dump() for response in a.answer]} for q, a in zip(query.questions, answers)]
+    result_exporter.submit(answer_rows(query.tld, formatted_answers))
+    return formatted_answers
+
+async def run_job(job: dict, on_progress: ProgressCallback) -> dict:
+    """
+    Runs a queued job: "process" crawls and ingests a site, "run" also answers the job's questions afterwards.
+    """
+    payload = job["payload"]
+    summary = await ingest_site(payload["tld"], on_progress=on_progress)
+    if job["kind"] == "run":
+        await on_progress({"stage": "answering", "questions": len(payload["questions"])})
+        summary["data"] = await answer_and_export(UserQueries(tld=payload["tld"], questions=payload["questions"]))
+    return summary
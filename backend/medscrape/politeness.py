@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import logging
+
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+from aiolimiter import AsyncLimiter
+
+logger = logging.getLogger(__name__)
+
+CRAWL_RATE_PER_HOST = float(os.getenv('CRAWL_RATE_PER_HOST', 10))  # Requests per second to a single host
+CRAWL_INITIAL_HOST_CONCURRENCY = float(os.getenv('CRAWL_INITIAL_HOST_CONCURRENCY', 4))
+CRAWL_MAX_HOST_CONCURRENCY = float(os.getenv('CRAWL_MAX_HOST_CONCURRENCY', 32))
+CRAWL_LATENCY_FACTOR = float(os.getenv('CRAWL_LATENCY_FACTOR', 3.0))  # Back off once latency exceeds this multiple of the host's best
+CRAWL_MAX_RETRY_AFTER = float(os.getenv('CRAWL_MAX_RETRY_AFTER', 120))
+CRAWL_RESPECT_ROBOTS = os.getenv('CRAWL_RESPECT_ROBOTS', 'true').lower() == 'true'
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+class HostPolicy:
+    """
+    Rate limit and adaptive concurrency window for one host.
+
+    Requests pass a token bucket of `rate` per second (or one per Crawl-delay) and may only start while fewer than
+    `window` are in flight. The window follows AIMD: it grows by about one per window of healthy responses and is
+    halved on 429/5xx or errors, or cut by a quarter when latency rises well above the best seen, at most once per
+    round trip. A Retry-After header pauses the host for the requested time.
+    """
+
+    def __init__(self, host, rate=CRAWL_RATE_PER_HOST, initial_window=CRAWL_INITIAL_HOST_CONCURRENCY, max_window=CRAWL_MAX_HOST_CONCURRENCY, latency_factor=CRAWL_LATENCY_FACTOR, crawl_delay=None):
+        self.host = host
+        self.crawl_delay = crawl_delay
+        if crawl_delay:
+            # Crawl-delay asks for one request at a time with a pause in between
+            self.limiter = AsyncLimiter(1, crawl_delay)
+            self.max_window = 1.0
+        else:
+            self.limiter = AsyncLimiter(rate, 1)
+            self.max_window = max_window
+        self.window = min(initial_window, self.max_window)
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.best_latency = None
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < max(1, int(self.window)))
+            self.in_flight += 1
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.limiter.acquire()
+        except BaseException:
+            async with self._changed:
+                self.in_flight -= 1
+                self._changed.notify_all()
+            raise
+
+    def _decrease(self, factor):
+        now = time.monotonic()
+        # One response burst reflects a single congestion event, so shrink at most once per round trip
+        if now - self._last_decrease >= (self.latency_ewma or 0):
+            self.window = max(1.0, self.window * factor)
+            self._last_decrease = now
+
+    async def release(self, status=None, latency=None, retry_after=None):
+        self.requests += 1
+        if status is None or status in THROTTLE_STATUSES:
+            self.throttled += 1
+            self._decrease(0.5)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + min(retry_after, CRAWL_MAX_RETRY_AFTER))
+        elif latency is not None:
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            self.best_latency = self.latency_ewma if self.best_latency is None else min(self.best_latency, self.latency_ewma)
+            if self.latency_ewma > self.best_latency * self.latency_factor:
+                self._decrease(0.75)
+            else:
+                self.window = min(self.max_window, self.window + 1 / self.window)
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "window": round(self.window, 2),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "crawl_delay": self.crawl_delay,
+        }
+
+class FetchSlot:
+    """
+    Permission to send one request to a host; call `done` with the response so the host's window can adapt.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.status = None
+        self.latency = None
+        self.retry_after = None
+
+    def done(self, status, headers=None):
+        self.status = status
+        self.latency = time.monotonic() - self.started
+        try:
+            self.retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+        except (TypeError, ValueError):
+            self.retry_after = None
+
+def parse_retry_after(value) -> Optional[float]:
+    """
+    Returns the seconds to wait from a Retry-After header, given either as delay-seconds or as an HTTP-date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        retry_at = parsedate_to_datetime(value)  # Raises ValueError for anything that is not a date either
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)  # A -0000 zone means UTC with no local zone known
+        return max(0.0, retry_at.timestamp() - time.time())
+
+def parse_crawl_delay(robots_txt, user_agent) -> Optional[float]:
+    """
+    Returns the Crawl-delay that applies to `user_agent`, falling back to the ``*`` group.
+
+    RobotFileParser only understands whole seconds, and fractional delays are common.
+    """
+    delays = {}
+    agents, in_rules = [], False
+    for line in robots_txt.splitlines():
+        field, _, value = line.split("#", 1)[0].partition(":")
+        field, value = field.strip().lower(), value.strip()
+        if field == "user-agent":
+            if in_rules:
+                agents, in_rules = [], False
+            agents.append(value.lower())
+        elif field:
+            in_rules = True
+            if field == "crawl-delay":
+                try:
+                    for agent in agents:
+                        delays.setdefault(agent, float(value))
+                except ValueError:
+                    pass
+    product = user_agent.split("/")[0].lower()
+    for agent, delay in delays.items():
+        if agent != "*" and agent in product:
+            return delay
+    return delays.get("*")
+
+class PolitenessScheduler:
+    """
+    Hands out per-host fetch slots for a crawl and keeps each host's robots.txt rules.
+    """
+
+    def __init__(self, user_agent, respect_robots=CRAWL_RESPECT_ROBOTS, **policy_options):
+        self.user_agent = user_agent
+        self.respect_robots = respect_robots
+        self.policy_options = policy_options
+        self.robots: Dict[str, Optional[RobotFileParser]] = {}
+        self._hosts: Dict[str, HostPolicy] = {}
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+
+    async def _load_robots(self, scheme, host, session) -> Tuple[Optional[RobotFileParser], Optional[float]]:
+        robots_url = f"{scheme}://{host}/robots.txt"
+        try:
+            async with session.get(robots_url, headers={'User-Agent': self.user_agent}) as response:
+                if response.status >= 400:
+                    return None, None
+                text = await response.text()
+        except Exception as e:
+            logger.warning(f"Could not fetch {robots_url}: {e}")
+            return None, None
+        parser = RobotFileParser(robots_url)
+        parser.parse(text.splitlines())
+        return parser, parse_crawl_delay(text, self.user_agent)
+
+    async def host_policy(self, url, session) -> HostPolicy:
+        parsed = urlparse(url)
+        host = parsed.netloc
+        if host in self._hosts:
+            return self._hosts[host]
+        async with self._host_locks.setdefault(host, asyncio.Lock()):
+            if host not in self._hosts:
+                robots, crawl_delay = await self._load_robots(parsed.scheme, host, session) if self.respect_robots else (None, None)
+                self.robots[host] = robots
+                self._hosts[host] = HostPolicy(host, crawl_delay=crawl_delay, **self.policy_options)
+                if crawl_delay:
+                    logger.info(f"Honouring Crawl-delay of {crawl_delay}s for {host}")
+        return self._hosts[host]
+
+    async def allowed(self, url, session) -> bool:
+        await self.host_policy(url, session)
+        robots = self.robots.get(urlparse(url).netloc)
+        return robots is None or robots.can_fetch(self.user_agent, url)
+
+    @asynccontextmanager
+    async def slot(self, url, session):
+        """
+        Waits for the host's rate limit and concurrency window, then yields a FetchSlot for one request.
+
+        A request that raises, or that leaves `done` uncalled, counts as a failure and shrinks the window.
+        """
+        policy = await self.host_policy(url, session)
+        await policy.acquire()
+        slot = FetchSlot()
+        try:
+            yield slot
+        finally:
+            await policy.release(slot.status, slot.latency, slot.retry_after)
+
+    def stats(self) -> dict:
+        return {host: policy.stats() for host, policy in self._hosts.items()}
@@ -1,27 +1,50 @@
 import logging
 import os
-import json
-import lancedb
+import hashlib
 import tempfile
-import requests
+import aiohttp
+import lancedb
+import multiprocessing
+import threading
 from redis.asyncio import Redis
 import asyncio
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from typing import List, Optional
 from pydantic import Field
-from unstructured.partition.html import partition_html
-from unstructured.partition.pdf import partition_pdf
 from lancedb.embeddings import EmbeddingFunctionRegistry, get_registry
 from lancedb.pydantic import Vector, LanceModel
 from urllib.parse import urlparse
 
+from .answer_cache import answer_cache
+from .checkpoint import PARTITIONED, WRITTEN, CrawlCheckpoint
+from .content_cache import content_cache
+from .embedding_cache import EmbeddingCache
+from .indexing import ensure_indexes
+from .metrics import cache_requests, timed_stage
+from .partitioning import USER_AGENT, partition_html_rows, partition_pdf_rows
+from .visited import PageStateStore
+from .writer import BulkWriter, upsert_rows
+
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize Redis client for publishing logs
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
-log_redis_client = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+redis_client = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+page_state_store = PageStateStore(redis_client)
+
+PARTITION_EXECUTOR = os.getenv('PARTITION_EXECUTOR', 'process')  # "process" or "thread"
+PARTITION_WORKERS = int(os.getenv('PARTITION_WORKERS', os.cpu_count() or 4))
+MAX_IN_FLIGHT_PAGES = int(os.getenv('MAX_IN_FLIGHT_PAGES', PARTITION_WORKERS * 2))
+MAX_PDF_BYTES = int(os.getenv('MAX_PDF_BYTES', 50 * 1024 * 1024))
+PDF_SPOOL_BYTES = int(os.getenv('PDF_SPOOL_BYTES', 4 * 1024 * 1024))  # Larger downloads roll over to disk
+PDF_HASHES_KEY = "pdf_hashes"
+EMBEDDING_CACHE = os.getenv('EMBEDDING_CACHE', 'true').lower() == 'true'
+
+partition_executor = None
+table_write_lock = threading.Lock()
 
 uri = os.getenv("LANCE_DB_URI")
 db = lancedb.connect(uri)
@@ -43,7 +66,12 @@ embed_func = registry.get("sentence-transformers").create(device="cpu")
 # embed_func = ollama.create(name=ollama_model, base_url=base_url)
 
 
+# Content-addressed cache in front of the embedding model for rows written by the BulkWriter
+embedding_cache = EmbeddingCache(model_name=getattr(embed_func, "name", type(embed_func).__name__)) if EMBEDDING_CACHE else None
+
+
 class ExtractedData(LanceModel):
+    chunk_id: str = Field(description="Stable id of the chunk, derived from its URL and position, used for upserts.")
     tld: str = Field(description="The top-level domain of the website.")
     url: str = Field(description="The URL of the website.")
     text_chunk: str = embed_func.SourceField()
@@ -55,128 +83,274 @@ class ExtractedData(LanceModel):
     link_texts: Optional[List[str]] = Field(default_factory=list)
     is_continuation: Optional[bool] = None
 
-log_message = "Creating ExtractedData table..."
+FTS_COLUMNS = ["text_chunk", "text_as_html", "parent_id", "url"]
+
 try:
-    table = db.create_table("ExtractedData", schema=ExtractedData, mode="overwrite", exist_ok=True)
-    logger.info(log_message)
-    table.create_fts_index(["text_chunk", "text_as_html", "parent_id", "url"], replace=True)
+    # Keep the corpus across restarts; only tables from before chunk ids existed are rebuilt
+    if "ExtractedData" in db.table_names() and "chunk_id" in db.open_table("ExtractedData").schema.names:
+        log_message = "Opening existing ExtractedData table..."
+        table = db.open_table("ExtractedData")
+        logger.info(log_message)
+    else:
+        log_message = "Creating ExtractedData table..."
+        table = db.create_table("ExtractedData", schema=ExtractedData, mode="overwrite")
+        logger.info(log_message)
+        table.create_fts_index(FTS_COLUMNS, replace=True)
 except Exception as e:
     log_message = f"Error during table creation or FTS index creation: {e}"
     logger.error(log_message)
     raise
 
-async def process_pdf_content(url, tld):
-    parsed_tld = urlparse(tld).netloc if urlparse(tld).netloc else urlparse(tld).path
-    extracted_data_list = []
-    temp_file_path = None  # Initialize temp_file_path here
-    
+def get_partition_executor():
+    """
+    Returns the shared executor that runs partitioning off the event loop, creating it on first use.
+    """
+    global partition_executor
+    if partition_executor is None:
+        if PARTITION_EXECUTOR == "thread":
+            partition_executor = ThreadPoolExecutor(max_workers=PARTITION_WORKERS, thread_name_prefix="partition")
+        else:
+            # Spawn rather than fork so workers never inherit the embedding model or open LanceDB handles
+            partition_executor = ProcessPoolExecutor(max_workers=PARTITION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return partition_executor
+
+def shutdown_partition_executor():
+    global partition_executor
+    if partition_executor is not None:
+        partition_executor.shutdown(wait=False, cancel_futures=True)
+        partition_executor = None
+
+def _add_rows(extracted_data_list):
+    with table_write_lock:
+        upsert_rows(table, extracted_data_list)
+
+async def add_to_table(extracted_data_list):
+    # Embedding and the Lance commit are synchronous; run them in a thread and one at a time
+    await asyncio.to_thread(_add_rows, extracted_data_list)
+
+async def store_rows(extracted_data_list, writer=None):
+    # Crawls buffer rows in a BulkWriter; one-off calls write straight to the table
+    if writer is not None:
+        await writer.add(extracted_data_list)
+    else:
+        await add_to_table(extracted_data_list)
+
+def _rebuild_fts_index():
+    with table_write_lock:
+        table.create_fts_index(FTS_COLUMNS, replace=True)
+
+def _ensure_indexes():
+    with table_write_lock:
+        return ensure_indexes(table)
+
+async def download_pdf(url, session):
+    """
+    Streams a PDF into a spooled temporary file, enforcing MAX_PDF_BYTES while reading.
+
+    :return: The spooled file positioned at the start and the SHA-256 of its content.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_BYTES)
+    digest = hashlib.sha256()
+    size = 0
     try:
-        # Download the PDF file
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        # Save the PDF to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(response.content)
-            temp_file_path = temp_file.name
-
-        # Process the local PDF file
-        elements = partition_pdf(
-            filename=temp_file_path,
-            url=None,  # Set url=None to run inference locally
-            strategy="fast", #Can be set to "hi_res", but there are open issues in unstructured that need to be resolved
-        )
-
-        for element in elements:
-            metadata = element.metadata.to_dict()
-            extracted_data = {
-                "tld": parsed_tld,
-                "url": url,
-                "text_chunk": element.text,
-                "text_as_html": metadata.get("text_as_html", None),
-                "parent_id": metadata.get("parent_id", None),
-                "category_depth": metadata.get("category_depth", None),
-                "link_urls": [],  
-                "link_texts": [],
-                "is_continuation": metadata.get("is_continuation", None)
-            }
-            extracted_data_list.append(extracted_data)
-        
+        async with session.get(url, headers={'User-Agent': USER_AGENT}) as response:
+            response.raise_for_status()
+            if response.content_length is not None and response.content_length > MAX_PDF_BYTES:
+                raise ValueError(f"PDF is {response.content_length} bytes, limit is {MAX_PDF_BYTES}")
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                size += len(chunk)
+                if size > MAX_PDF_BYTES:
+                    raise ValueError(f"PDF exceeds the {MAX_PDF_BYTES} byte limit")
+                digest.update(chunk)
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest()
 
+async def process_pdf_content(url, tld, session=None, seen_pdfs=None, writer=None, pdf_hashes=None) -> bool:
+    """
+    Downloads, partitions and stores one PDF unless its content was already stored for the tld.
+
+    Content hashes are recorded as stored only once the rows are durable. Without a writer that is as soon as they are
+    written; with one, the hash is appended to `pdf_hashes` for the caller to record after the writer has flushed.
+
+    :return: False if the PDF could not be downloaded or partitioned.
+    """
+    parsed_tld = urlparse(tld).netloc if urlparse(tld).netloc else urlparse(tld).path
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await process_pdf_content(url, tld, session, seen_pdfs, writer, pdf_hashes)
+    if seen_pdfs is None:
+        seen_pdfs = set()
+
+    loop = asyncio.get_running_loop()
+    try:
+        spool, content_hash = await download_pdf(url, session)
+        with spool:
+            # The same document is often linked under several URLs; parse and embed each content hash once per tld
+            if content_hash in seen_pdfs or await redis_client.sismember(f"{PDF_HASHES_KEY}:{parsed_tld}", content_hash):
+                logger.info(f"PDF content already stored for {parsed_tld}, skipping: {url}")
+                return True
+            seen_pdfs.add(content_hash)
+            # Process workers need the bytes; thread workers can read the spooled file directly
+            pdf = spool.read() if isinstance(get_partition_executor(), ProcessPoolExecutor) else spool
+            with timed_stage("partition"):
+                extracted_data_list = await loop.run_in_executor(get_partition_executor(), partition_pdf_rows, url, parsed_tld, pdf)
     except Exception as e:
         log_message = f"Error processing PDF {url}: {e}"
-        logger.error(log_message)
-        asyncio.create_task(log_redis_client.publish('log_channel', log_message))
-        return
-    finally:
-        # Clean up the temporary file
-        if temp_file_path:
-            os.unlink(temp_file_path)
-    
+        logger.error(log_message, extra={"channel": "log_channel"})
+        return False
+
     if extracted_data_list:
         log_message = f"Adding extracted PDF data for {url}"
-        logger.info(log_message)
-        asyncio.create_task(log_redis_client.publish('response_channel', log_message))
-        table.add(extracted_data_list)
+        logger.info(log_message, extra={"channel": "response_channel"})
+        await store_rows(extracted_data_list, writer)
+    if writer is None:
+        await redis_client.sadd(f"{PDF_HASHES_KEY}:{parsed_tld}", content_hash)
+    elif pdf_hashes is not None:
+        pdf_hashes.append(content_hash)
+    return True
 
-async def process_html_content(url, tld, include_metadata=True, ssl_verify=True, headers=None, html_assemble_articles=False):
-    if headers is None:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
+async def process_html_content(url, tld, include_metadata=True, ssl_verify=True, headers=None, html_assemble_articles=False, html=None, session=None, seen_pdfs=None, writer=None, pdf_hashes=None, on_progress=None) -> bool:
+    """
+    Partitions and stores a page, then the PDFs it links to that this crawl has not processed yet.
+
+    :param on_progress: Optional coroutine function called with a progress update after each of the page's PDFs.
+    :return: False if the page or one of its PDFs failed, so the page must not be recorded as ingested.
+    """
     parsed_tld = urlparse(tld).netloc if urlparse(tld).netloc else urlparse(tld).path
-    extracted_data_list = []
-    tasks = []  # Initialize tasks list for parallel processing
+    if html is None:
+        # Reuse the body the crawler already downloaded instead of fetching the page again
+        html = await asyncio.to_thread(content_cache.get, url)
+        cache_requests.inc(cache="content", result="miss" if html is None else "hit")
+    loop = asyncio.get_running_loop()
     try:
-        elements = partition_html(
-            url=url, 
-            include_metadata=include_metadata, 
-            ssl_verify=ssl_verify, 
-            headers=headers, 
-            html_assemble_articles=html_assemble_articles, 
-            chunking_strategy="by-title",
-            max_characters=1000,  
-            new_after_n_chars=500,
-            combine_text_under_n_chars=500,
-            overlap=30
-        )
-        for element in elements:
-            metadata = element.metadata.to_dict()
-            
-            extracted_data = {
-                "tld": parsed_tld,
-                "url": url,
-                "text_chunk": element.text,
-                "text_as_html": metadata.get("text_as_html", None),
-                "parent_id": metadata.get("parent_id", None),
-                "category_depth": metadata.get("category_depth", None),
-                "link_urls": metadata.get("link_urls", []),
-                "link_texts": metadata.get("link_texts", []),
-                "is_continuation": metadata.get("is_continuation", None),
-            }
-            extracted_data_list.append(extracted_data)
-            for link_url in metadata.get("link_urls", []):
-                if link_url.endswith(".pdf"):
-                    tasks.append(process_pdf_content(link_url, tld))
-            
+        # Includes time queued for a partition worker, which is where a saturated pool shows up
+        with timed_stage("partition"):
+            extracted_data_list, pdf_links = await loop.run_in_executor(
+                get_partition_executor(),
+                partial(
+                    partition_html_rows,
+                    url,
+                    parsed_tld,
+                    html=html,
+                    include_metadata=include_metadata,
+                    ssl_verify=ssl_verify,
+                    headers=headers,
+                    html_assemble_articles=html_assemble_articles,
+                ),
+            )
     except ValueError as e:
         log_message = f"Error processing URL {url}: {e}"
-        logger.error(log_message)
-        asyncio.create_task(log_redis_client.publish('response_channel', log_message))
-        return
+        logger.error(log_message, extra={"channel": "response_channel"})
+        return False
     
     if extracted_data_list:
         log_message = f"Adding extracted data for {url}"
-        logger.info(log_message)
-        asyncio.create_task(log_redis_client.publish('response_channel', log_message))
-        table.add(extracted_data_list)
+        logger.info(log_message, extra={"channel": "response_channel"})
+        await store_rows(extracted_data_list, writer)
 
-    # Run PDF processing tasks in parallel and publish progress updates
+    # Run PDF processing tasks in parallel and report progress to the caller
+    # Footer and sidebar PDFs are linked from many pages; only the first page of a crawl to see one processes it.
+    # The same set also records content hashes, so copies served under different URLs are parsed once.
+    if seen_pdfs is None:
+        seen_pdfs = set()
+    new_pdf_links = []
+    for pdf_url in pdf_links:
+        if pdf_url not in seen_pdfs:
+            seen_pdfs.add(pdf_url)
+            new_pdf_links.append(pdf_url)
+    tasks = [process_pdf_content(pdf_url, tld, session, seen_pdfs, writer, pdf_hashes) for pdf_url in new_pdf_links]
+    succeeded = True
     if tasks:
         total_tasks = len(tasks)
         completed_tasks = 0
         for task in asyncio.as_completed(tasks):
-            await task
+            succeeded = await task and succeeded
             completed_tasks += 1
-            progress_percentage = (completed_tasks / total_tasks) * 100
-            progress_update = {"status": "Processing", "progress": progress_percentage}
-            asyncio.create_task(log_redis_client.publish('progress_channel', json.dumps(progress_update)))
+            if on_progress is not None:
+                await on_progress({"stage": "pdfs", "url": url, "completed": completed_tasks, "total": total_tasks, "progress": completed_tasks / total_tasks * 100})
+    return succeeded
+
+async def process_pages(urls, tld, session=None, on_page_done=None, page_states=None, checkpoint: Optional[CrawlCheckpoint] = None, on_progress=None):
+    """
+    Processes crawled pages with at most MAX_IN_FLIGHT_PAGES pages being partitioned or written at any time.
+
+    Rows from every page are written through one BulkWriter, which is flushed and compacted once all pages are done.
+
+    :param session: aiohttp session used to download linked PDFs; one is created for the call if omitted.
+    :param on_page_done: Optional coroutine function called with (completed, total) after each page.
+    :param on_progress: Optional coroutine function called with a progress update as each page's PDFs complete.
+    :param page_states: Validators and content hashes from the crawl, recorded for pages once their rows are written.
+        Pages that failed are left out, so the next crawl ingests them again.
+    :param checkpoint: Optional crawl checkpoint in which pages are marked partitioned, then written once a flush has
+        made their rows durable.
+    :return: Ingest statistics from the BulkWriter.
+    """
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await process_pages(urls, tld, session, on_page_done, page_states, checkpoint, on_progress)
+
+    parsed_tld = urlparse(tld).netloc if urlparse(tld).netloc else urlparse(tld).path
+    total = len(urls)
+    pending = iter(urls)
+    completed = 0
+    seen_pdfs = set()
+    pdf_hashes = []
+    processed = []
+    writer = BulkWriter(table, embed_func, write_lock=table_write_lock, embedding_cache=embedding_cache)
+    awaiting_flush = []  # (url, writer generation when its rows were all buffered)
+
+    async def record_progress(url):
+        checkpoint.mark(url, PARTITIONED)
+        awaiting_flush.append((url, writer.generation))
+        while awaiting_flush and awaiting_flush[0][1] < writer.written_generation:
+            checkpoint.mark(awaiting_flush.pop(0)[0], WRITTEN)
+        try:
+            await checkpoint.maybe_save("processing")
+        except Exception as e:
+            logger.error(f"Could not save the crawl checkpoint for {tld}: {e}")
+
+    async def worker():
+        nonlocal completed
+        for url in pending:  # Workers share the iterator, so each page is taken exactly once
+            try:
+                if await process_html_content(url, tld, session=session, seen_pdfs=seen_pdfs, writer=writer, pdf_hashes=pdf_hashes, on_progress=on_progress):
+                    processed.append(url)
+                    if checkpoint is not None:
+                        await record_progress(url)
+            except Exception as e:
+                log_message = f"Error processing URL {url}: {e}"
+                logger.error(log_message, extra={"channel": "log_channel"})
+            completed += 1
+            if on_page_done is not None:
+                await on_page_done(completed, total)
+
+    await asyncio.gather(*(worker() for _ in range(min(MAX_IN_FLIGHT_PAGES, total))))
+
+    # Raises if buffered rows could not be written; nothing below is recorded then, so every page is ingested again
+    stats = await writer.close()
+    if pdf_hashes:
+        # Recorded only after the flush, so a PDF whose rows never reached the table is processed again next time
+        await redis_client.sadd(f"{PDF_HASHES_KEY}:{parsed_tld}", *pdf_hashes)
+    if page_states:
+        # Only now are the pages' rows durable, so the next crawl may treat them as unchanged
+        await page_state_store.save({url: page_states[url] for url in processed if url in page_states})
+    if checkpoint is not None:
+        for url in processed:
+            checkpoint.mark(url, WRITTEN)
+        await checkpoint.save("processed")
+    if writer.rows_written:
+        # The full-text index does not pick up appended rows, so rebuild it once per crawl
+        await asyncio.to_thread(_rebuild_fts_index)
+        try:
+            stats["indexes"] = await asyncio.to_thread(_ensure_indexes)
+        except Exception as e:
+            logger.error(f"Error building ExtractedData indexes: {e}")
+        # Answers cached against the previous corpus no longer reflect this tld
+        await answer_cache.record_ingest(parsed_tld, table.version)
+    log_message = f"Ingest for {tld} finished: {stats['rows_written']} rows at {stats['rows_per_second']} rows/s, {stats['fragments_after_compaction']} fragments after compaction"
+    logger.info(log_message, extra={"channel": "log_channel"})
+    return stats
@@ -1,13 +1,19 @@
 import os
+import time
+import asyncio
+import threading
 from urllib.parse import urlparse
 import lancedb
 import logging
 
-from typing import List
+from typing import AsyncIterator, List, Tuple
 from lancedb.rerankers import ColbertReranker
 
 from .models import UserQueries, QuestionAnswered, ResponseData
-from .inference import query_llm
+from .inference import LLM_MODEL, query_llm
+from .answer_cache import answer_cache
+from .context import build_context
+from .metrics import timed_stage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,66 +21,149 @@ logger = logging.getLogger(__name__)
 uri = os.getenv("LANCE_DB_URI")
 db = lancedb.connect(uri)
 
-# Move the table opening logic inside the lance_retrieval function
-async def lance_retrieval(user_queries: UserQueries) -> List[QuestionAnswered]:
+TABLE_REFRESH_SECONDS = float(os.getenv('TABLE_REFRESH_SECONDS', 5))
+SEARCH_LIMIT = int(os.getenv('SEARCH_LIMIT', 20))
+
+class TimedColbertReranker(ColbertReranker):
     """
-    Performs a hybrid search in LanceDB with pre-filtering by tld and queries the language model for answers to each question.
-    
+    ColbertReranker that records the time spent reranking, which the hybrid query otherwise hides inside `search`.
+    """
+
+    def rerank_hybrid(self, *args, **kwargs):
+        with timed_stage("rerank"):
+            return super().rerank_hybrid(*args, **kwargs)
+
+class RetrievalService:
+    """
+    Keeps the ExtractedData table handle and the ColBERT reranker loaded across requests.
+
+    The table handle (and with it the embedding function LanceDB resolves from the table metadata) is reopened
+    only when a newer table version has been committed, checked at most every `refresh_seconds`.
+    """
+
+    def __init__(self, db, table_name="ExtractedData", refresh_seconds=TABLE_REFRESH_SECONDS):
+        self.db = db
+        self.table_name = table_name
+        self.refresh_seconds = refresh_seconds
+        self._table = None
+        self._reranker = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def reranker(self):
+        with self._lock:
+            if self._reranker is None:
+                self._reranker = TimedColbertReranker(column="text_chunk")
+            return self._reranker
+
+    @property
+    def table(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._table is None:
+                self._table = self.db.open_table(self.table_name)
+                self._checked_at = now
+            elif now - self._checked_at >= self.refresh_seconds:
+                self._checked_at = now
+                if self._table.to_lance().latest_version != self._table.version:
+                    logger.info(f"{self.table_name} has a new version, reopening table handle")
+                    self._table = self.db.open_table(self.table_name)
+            return self._table
+
+    def search(self, question, tld=None, limit=SEARCH_LIMIT) -> List[ResponseData]:
+        """
+        Runs a reranked hybrid search, pre-filtered by tld when one is given.
+        """
+        with timed_stage("search"):
+            query = self.table.search(question, query_type="hybrid", vector_column_name="embeddings").rerank(reranker=self.reranker)
+            if tld:
+                query = query.where(f"tld = '{tld}'", prefilter=True)
+            return query.limit(limit).to_pydantic(ResponseData)
+
+    def warmup(self):
+        """
+        Opens the table and runs one search so the embedding and ColBERT models are loaded before the first request.
+        """
+        start = time.monotonic()
+        try:
+            self.search("warmup", limit=1)
+            logger.info(f"Retrieval service warmed up in {time.monotonic() - start:.2f}s")
+        except Exception as e:
+            logger.error(f"Retrieval warmup failed: {e}")
+
+retrieval_service = RetrievalService(db)
+
+def get_retrieval_service() -> RetrievalService:
+    return retrieval_service
+
+def _normalize_tld(tld):
+    parsed_tld = urlparse(tld)
+    return parsed_tld.netloc if parsed_tld.netloc else parsed_tld.path
+
+async def stream_answers(user_queries: UserQueries) -> AsyncIterator[Tuple[int, QuestionAnswered]]:
+    """
+    Searches and answers every question concurrently, yielding each answer as soon as it is ready.
+
     :param user_queries: UserQueries model containing the tld and questions for the search.
-    :return: A list of QuestionAnswered models with the language model's responses for each question.
+    :return: An async iterator of (question index, QuestionAnswered) pairs in completion order.
     """
-    
-    parsed_tld = urlparse(user_queries.tld)
-    user_queries.tld = parsed_tld.netloc if parsed_tld.netloc else parsed_tld.path
-
-    # Open the table here, ensuring it's done after it has been created
-    table = db.open_table("ExtractedData")
-    reranker = ColbertReranker(column="text_chunk")
-    answers = []
-    # Pre-filter by tld and perform a hybrid search for each question
-    for question in user_queries.questions:
-        search_results = table.search(question, query_type="hybrid", vector_column_name="embeddings") \
-                                 .rerank(reranker=reranker) \
-                                 .where(f"tld = '{user_queries.tld}'", prefilter=True) \
-                                 .limit(20) \
-                                 .to_pydantic(ResponseData)
+    user_queries.tld = _normalize_tld(user_queries.tld)
+
+    service = get_retrieval_service()
+    corpus_version = await answer_cache.corpus_version(user_queries.tld)
+
+    async def answer_question(index, question):
+        cache_key = answer_cache.key(user_queries.tld, question, LLM_MODEL, corpus_version)
+        cached = await answer_cache.get(cache_key)
+        if cached is not None:
+            return index, cached.model_copy(update={"question": question})
+
+        # Pre-filter by tld and perform a hybrid search for the question
+        search_results = await asyncio.to_thread(service.search, question, user_queries.tld)
         
         if search_results:
-            combined_context = " ".join([result.model_dump_json() for result in search_results])
+            # Deduplicated chunks grouped by URL, packed by rerank order up to CONTEXT_TOKEN_BUDGET
+            combined_context = build_context(search_results)
         else:
             default_response_data = ResponseData(text_chunk="no context found in the data for this query", url="none")
             combined_context = default_response_data.model_dump_json()
         
-        question_answers = await query_llm(question, combined_context, user_queries.tld)
-        answers.append(question_answers)
+        answer = await query_llm(question, combined_context, user_queries.tld)
+        await answer_cache.set(cache_key, answer)
+        return index, answer
+
+    # query_llm caps in-flight LLM calls; the rest of the questions wait on its semaphore
+    tasks = [asyncio.create_task(answer_question(index, question)) for index, question in enumerate(user_queries.questions)]
+    try:
+        for next_answer in asyncio.as_completed(tasks):
+            yield await next_answer
+    finally:
+        # The consumer went away or a question failed, so stop answering the rest
+        for task in tasks:
+            task.cancel()
+
+async def lance_retrieval(user_queries: UserQueries) -> List[QuestionAnswered]:
+    """
+    Performs a hybrid search in LanceDB with pre-filtering by tld and queries the language model for answers to each question.
     
+    :param user_queries: UserQueries model containing the tld and questions for the search.
+    :return: A list of QuestionAnswered models with the language model's responses for each question.
+    """
+    answers = [None] * len(user_queries.questions)
+    async for index, answer in stream_answers(user_queries):
+        answers[index] = answer
     return answers
-# New method as per instructions
-async def lance_search(user_queries: UserQueries) -> List[ResponseData]:
+
+async def lance_search(user_queries: UserQueries) -> List[List[ResponseData]]:
     """
     Performs a hybrid search in LanceDB with pre-filtering by tld without interacting with the query_llm function.
     
     :param user_queries: UserQueries model containing the tld and questions for the search.
     :return: A list of lists of ResponseData models with the search results for each question.
     """
-    parsed_tld = urlparse(user_queries.tld)
-    user_queries.tld = parsed_tld.netloc if parsed_tld.netloc else parsed_tld.path
-
-    table = db.open_table("ExtractedData")
-    reranker = ColbertReranker(column="text_chunk")
-    search_results_list = []
-    # Pre-filter by tld and perform a hybrid search for each question
-    for question in user_queries.questions:
-        search_results = table.search(question, query_type="hybrid", vector_column_name="embeddings") \
-                                 .rerank(reranker=reranker) \
-                                 .limit(20) \
-                                 .to_pydantic(ResponseData)
-        # Check if search_results list is empty before adding to search_results_list
-        if search_results:
-            combined_context = " ".join([result.model_dump_json() for result in search_results])
-        else:
-            default_response_data = ResponseData(text_chunk="no context found in the data for this query", url="none")
-            combined_context = default_response_data.model_dump_json()
-    
-    return combined_context
+    user_queries.tld = _normalize_tld(user_queries.tld)
 
+    service = get_retrieval_service()
+    # Pre-filter by tld and perform a hybrid search for each question concurrently
+    return list(await asyncio.gather(*(asyncio.to_thread(service.search, question, user_queries.tld) for question in user_queries.questions)))
@@ -0,0 +1,152 @@
+import os
+import zlib
+import logging
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_MAX_FILES = int(os.getenv('SITEMAP_MAX_FILES', 50))  # Sitemaps fetched per crawl, counting nested indexes
+SITEMAP_MAX_BYTES = int(os.getenv('SITEMAP_MAX_BYTES', 50 * 1024 * 1024))  # The sitemap protocol's limit for one uncompressed file
+SITEMAP_CHUNK_BYTES = 64 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+def parse_lastmod(value) -> Optional[float]:
+    """
+    Converts a W3C datetime (a date, or a date and time with an optional offset) to a UTC timestamp.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+class SitemapParser:
+    """
+    Incrementally parses a sitemap or sitemap index as its bytes arrive, decompressing gzip on the fly.
+
+    `max_bytes` caps the uncompressed size. Gzip is inflated at most SITEMAP_CHUNK_BYTES at a time, so a small
+    compressed file that expands far past the cap is rejected before it is held in memory.
+    """
+
+    def __init__(self, max_bytes=SITEMAP_MAX_BYTES):
+        self.urls: Dict[str, Optional[float]] = {}
+        self.sitemaps: List[str] = []
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._parser = XMLPullParser(events=("end",))
+        self._decompressor = None
+        self._started = False
+        self._fields = {}
+
+    def feed(self, chunk: bytes):
+        """
+        :raises ValueError: Once more than `max_bytes` of XML has been fed.
+        """
+        if not self._started:
+            self._started = True
+            # .gz sitemaps are usually served as plain files, so aiohttp does not decompress them
+            if chunk.startswith(GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._decompressor is None:
+            self._parse(chunk)
+            return
+        while chunk:
+            self._parse(self._decompressor.decompress(chunk, SITEMAP_CHUNK_BYTES))
+            chunk = self._decompressor.unconsumed_tail
+
+    def close(self):
+        if self._decompressor is not None:
+            self._parse(self._decompressor.flush())
+        self._parser.close()
+        self._collect()
+
+    def _parse(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise ValueError(f"larger than {self.max_bytes} bytes uncompressed")
+        self._parser.feed(data)
+        self._collect()
+
+    def _collect(self):
+        for _, element in self._parser.read_events():
+            name = _local_name(element.tag)
+            if name in ("loc", "lastmod"):
+                # The entry's own <loc> comes before nested ones such as <image:loc>
+                self._fields.setdefault(name, (element.text or "").strip())
+            elif name in ("url", "sitemap"):
+                loc = self._fields.get("loc")
+                if loc and name == "url":
+                    self.urls[loc.split("#")[0]] = parse_lastmod(self._fields.get("lastmod"))
+                elif loc:
+                    self.sitemaps.append(loc)
+                self._fields = {}
+                element.clear()  # Keep memory flat on sitemaps with tens of thousands of entries
+
+async def _read_sitemap(sitemap_url, session, scheduler=None) -> SitemapParser:
+    parser = SitemapParser()
+    if scheduler is not None:
+        async with scheduler.slot(sitemap_url, session) as slot:
+            await _stream_into(parser, sitemap_url, session, slot)
+    else:
+        await _stream_into(parser, sitemap_url, session)
+    return parser
+
+async def _stream_into(parser, sitemap_url, session, slot=None):
+    async with session.get(sitemap_url) as response:
+        if slot is not None:
+            slot.done(response.status, response.headers)
+        if response.status != 200:
+            raise ValueError(f"HTTP {response.status}")
+        async for chunk in response.content.iter_chunked(SITEMAP_CHUNK_BYTES):
+            parser.feed(chunk)  # Raises once the uncompressed sitemap passes SITEMAP_MAX_BYTES
+        parser.close()
+
+async def fetch_sitemap_urls(base_url, session, domain_name, robots_sitemaps=None, scheduler=None, max_urls=None, max_files=SITEMAP_MAX_FILES) -> Dict[str, Optional[float]]:
+    """
+    Collects the same-domain page URLs listed in a site's sitemaps.
+
+    Sitemaps named in robots.txt are read when there are any, otherwise /sitemap.xml. Sitemap indexes are followed
+    breadth-first up to `max_files` files in total.
+
+    :return: A mapping of page URL to its lastmod timestamp (None when the sitemap gives none).
+    """
+    parsed_base = urlparse(base_url)
+    root = f"{parsed_base.scheme}://{parsed_base.netloc}/"
+    pending = list(robots_sitemaps or []) or [urljoin(root, "sitemap.xml")]
+    fetched = set()
+    urls: Dict[str, Optional[float]] = {}
+
+    while pending and len(fetched) < max_files and (max_urls is None or len(urls) < max_urls):
+        sitemap_url = pending.pop(0)
+        if sitemap_url in fetched:
+            continue
+        fetched.add(sitemap_url)
+        try:
+            parser = await _read_sitemap(sitemap_url, session, scheduler)
+        except (ParseError, ValueError, zlib.error) as e:
+            logger.warning(f"Skipping sitemap {sitemap_url}: {e}")
+            continue
+        except Exception as e:
+            logger.warning(f"Could not fetch sitemap {sitemap_url}: {e}")
+            continue
+        pending.extend(parser.sitemaps)
+        for url, lastmod in parser.urls.items():
+            parsed_url = urlparse(url)
+            if parsed_url.scheme in ("http", "https") and parsed_url.netloc == domain_name:
+                urls[url] = lastmod
+                if max_urls is not None and len(urls) >= max_urls:
+                    break
+
+    logger.info(f"Found {len(urls)} URLs for {domain_name} in {len(fetched)} sitemaps", extra={"channel": "log_channel"})
+    return urls
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import logging
+
+from typing import AsyncIterator, Dict, Optional, Set
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+SSE_CLIENT_QUEUE_SIZE = int(os.getenv('SSE_CLIENT_QUEUE_SIZE', 256))
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+PUBSUB_RECONNECT_SECONDS = 1.0
+
+# Put on a client's queue in place of the messages it could not keep up with
+_DROPPED = object()
+
+class PubSubHub:
+    """
+    Shares one Redis pub/sub connection between every SSE client of this process.
+
+    A single reader task blocks on `listen()` and copies each message to the bounded queue of every client watching
+    its channel. A client whose queue is full is disconnected rather than allowed to hold up the others or grow memory;
+    browsers' EventSource reconnects on its own. Clients receive None every `heartbeat_seconds` while idle so the
+    endpoint can send a keep-alive frame.
+    """
+
+    def __init__(self, redis_client=None, queue_size=SSE_CLIENT_QUEUE_SIZE, heartbeat_seconds=SSE_HEARTBEAT_SECONDS):
+        self.redis_client = redis_client
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.dropped_clients = 0
+        self.messages_delivered = 0
+        self._clients: Dict[str, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _subscribe(self, channel):
+        async with self._lock:
+            if self.redis_client is None:
+                self.redis_client = Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+            if self._pubsub is None:
+                self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            # A channel whose unsubscribe is not yet confirmed must be subscribed again, or the confirmation drops it
+            if channel not in self._pubsub.channels or channel in self._pubsub.pending_unsubscribe_channels:
+                await self._pubsub.subscribe(channel)
+                logger.info(f"Pub/sub hub subscribed to {channel}")
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+
+    async def _unsubscribe(self, channel):
+        async with self._lock:
+            if self._clients.get(channel):
+                return  # Another client joined while this one was leaving
+            self._clients.pop(channel, None)
+            if self._pubsub is not None and channel in self._pubsub.channels:
+                await self._pubsub.unsubscribe(channel)
+                logger.info(f"Pub/sub hub unsubscribed from {channel}")
+
+    async def _read(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] == "message":
+                        self._publish(message["channel"], message["data"])
+                return  # No channels left to listen on
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pub/sub hub lost its Redis connection: {e}")
+                await asyncio.sleep(PUBSUB_RECONNECT_SECONDS)
+                try:
+                    # Resubscribing reconnects the pub/sub connection
+                    await self._pubsub.subscribe(*self._pubsub.channels)
+                except Exception as e:
+                    logger.error(f"Pub/sub hub could not resubscribe: {e}")
+
+    def _publish(self, channel, data):
+        for queue in list(self._clients.get(channel, ())):
+            try:
+                queue.put_nowait(data)
+                self.messages_delivered += 1
+            except asyncio.QueueFull:
+                self._clients[channel].discard(queue)
+                self.dropped_clients += 1
+                queue.get_nowait()
+                queue.put_nowait(_DROPPED)
+                logger.warning(f"Dropped a slow {channel} client after {self.queue_size} undelivered messages")
+
+    async def messages(self, channel) -> AsyncIterator[Optional[str]]:
+        """
+        Yields the messages published on `channel` from now on, and None whenever `heartbeat_seconds` pass without one.
+
+        Ends when the client falls too far behind. Once a channel's last client leaves, the hub unsubscribes from it, so
+        per-job channels do not accumulate.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.setdefault(channel, set()).add(queue)
+        try:
+            await self._subscribe(channel)
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if message is _DROPPED:
+                    return
+                yield message
+        finally:
+            self._clients.get(channel, set()).discard(queue)
+            if not self._clients.get(channel):
+                await self._unsubscribe(channel)
+
+    def stats(self) -> dict:
+        return {
+            "clients": {channel: len(queues) for channel, queues in self._clients.items()},
+            "messages_delivered": self.messages_delivered,
+            "dropped_clients": self.dropped_clients,
+        }
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        if self.redis_client is not None:
+            await self.redis_client.close()
+
+pubsub_hub = PubSubHub()
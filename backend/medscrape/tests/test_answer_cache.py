@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+
+from ..answer_cache import AnswerCache, normalize_question
+from ..models import QuestionAnswered, Response
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def make_answer(question):
+    return QuestionAnswered(tld="example.com", question=question, answer=[
+        Response(flag=True, response="Yes", reasoning="Stated on the page", substring_quote=["yes"], source_url=["https://example.com/"]),
+    ])
+
+def test_normalize_question_ignores_case_whitespace_and_punctuation():
+    assert normalize_question("  Is the trial   RECRUITING? ") == normalize_question("is the trial recruiting")
+
+@pytest.mark.asyncio
+async def test_answers_are_cached_per_corpus_version():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    cache = AnswerCache(redis_client, ttl=60)
+
+    version = await cache.corpus_version("example.com")
+    key = cache.key("example.com", "Is the trial recruiting?", "gpt-4", version)
+    assert await cache.get(key) is None
+    await cache.set(key, make_answer("Is the trial recruiting?"))
+
+    cached = await cache.get(cache.key("example.com", "is the trial recruiting", "gpt-4", version))
+    assert cached.answer[0].response == "Yes"
+    assert 0 < await redis_client.ttl(key) <= 60
+
+    # Re-ingesting the tld moves it to a new version and drops the old entries
+    await cache.record_ingest("example.com", 7)
+    new_version = await cache.corpus_version("example.com")
+    assert new_version == "7"
+    assert not await redis_client.exists(key)
+    assert await cache.get(cache.key("example.com", "Is the trial recruiting?", "gpt-4", new_version)) is None
+
+    stats = await cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 0)
+
+@pytest.mark.asyncio
+async def test_least_recently_used_answers_are_evicted():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    cache = AnswerCache(redis_client, max_entries=2)
+    keys = [cache.key("example.com", f"question {i}", "gpt-4", "0") for i in range(3)]
+
+    await cache.set(keys[0], make_answer("question 0"))
+    await cache.set(keys[1], make_answer("question 1"))
+    await cache.get(keys[0])  # Touch the first entry so the second becomes the oldest
+    await cache.set(keys[2], make_answer("question 2"))
+
+    assert await redis_client.exists(keys[0]) and await redis_client.exists(keys[2])
+    assert not await redis_client.exists(keys[1])
+
+@pytest.mark.asyncio
+async def test_expired_answers_do_not_count_towards_the_size_limit():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    cache = AnswerCache(redis_client, ttl=1, max_entries=2)
+    keys = [cache.key("example.com", f"question {i}", "gpt-4", "0") for i in range(3)]
+
+    await cache.set(keys[0], make_answer("question 0"))
+    await asyncio.sleep(1.1)  # Redis expires the first entry, but it is still indexed
+    await cache.set(keys[1], make_answer("question 1"))
+    await cache.set(keys[2], make_answer("question 2"))
+
+    # Only the expired entry left the index; both live entries stay cached
+    assert await redis_client.exists(keys[1]) and await redis_client.exists(keys[2])
+    assert await redis_client.zrange(cache.lru_key, 0, -1) == keys[1:]
+    assert (await cache.stats())["entries"] == 2
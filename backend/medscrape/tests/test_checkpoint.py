@@ -0,0 +1,105 @@
+import json
+import aiohttp
+import pytest
+import pytest_asyncio
+
+from aiohttp import web
+
+from ..checkpoint import DISCOVERED, FETCHED, WRITTEN, CrawlCheckpoint
+
+fakeredis = pytest.importorskip("fakeredis")
+
+PAGES = {
+    "/": '<a href="/a">A</a><a href="/b">B</a>',
+    "/a": '<a href="/c">C</a>',
+    "/b": "<p>B</p>",
+    "/c": "<p>C</p>",
+}
+
+@pytest_asyncio.fixture
+async def site():
+    requests = []
+
+    async def page(request):
+        requests.append(request.path)
+        return web.Response(text=f"<html><body>{PAGES[request.path]}</body></html>", content_type="text/html")
+
+    app = web.Application()
+    for path in PAGES:
+        app.router.add_get(path, page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", requests
+    await runner.cleanup()
+
+@pytest.fixture
+def crawl_redis(monkeypatch, tmp_path):
+    from .. import content_cache, enumeration
+
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(enumeration, "redis_client", redis_client)
+    monkeypatch.setattr(enumeration, "content_cache", content_cache.ContentCache(str(tmp_path)))
+    return redis_client
+
+@pytest.mark.asyncio
+async def test_checkpoint_round_trip():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    checkpoint = CrawlCheckpoint(redis_client, "example.org", interval=3600)
+    assert await checkpoint.load() is None
+
+    checkpoint.mark("https://example.org/", DISCOVERED, depth=0)
+    checkpoint.mark("https://example.org/", FETCHED, unchanged=False, page_state={"content_hash": "abc"})
+    await checkpoint.maybe_save("crawling")
+    assert not await redis_client.exists(checkpoint.urls_key)  # Within the interval nothing is written
+    await checkpoint.save("crawling", {"skipped_by_lastmod": 2})
+
+    loaded = await CrawlCheckpoint(redis_client, "example.org").load()
+    assert loaded["stage"] == "crawling"
+    assert loaded["counters"] == {"skipped_by_lastmod": 2}
+    assert loaded["urls"]["https://example.org/"] == {"depth": 0, "unchanged": False, "page_state": {"content_hash": "abc"}, "state": FETCHED}
+    assert await redis_client.ttl(checkpoint.meta_key) > 0
+
+    await checkpoint.clear()
+    assert await CrawlCheckpoint(redis_client, "example.org").load() is None
+
+@pytest.mark.asyncio
+async def test_crawl_resumes_from_its_frontier(site, crawl_redis):
+    from ..enumeration import get_all_website_links
+
+    base_url, requests = site
+    domain = base_url.split("//")[1]
+    # An interrupted crawl had fetched the root and /b, leaving /a in the frontier
+    await crawl_redis.hset(f"crawl_checkpoint:{domain}", mapping={"stage": "crawling"})
+    await crawl_redis.hset(f"crawl_checkpoint:{domain}:urls", mapping={
+        f"{base_url}/": json.dumps({"state": FETCHED, "depth": 0, "unchanged": False, "page_state": {"content_hash": "root"}}),
+        f"{base_url}/a": json.dumps({"state": DISCOVERED, "depth": 1}),
+        f"{base_url}/b": json.dumps({"state": WRITTEN, "depth": 1, "unchanged": False, "page_state": {"content_hash": "b"}}),
+    })
+
+    checkpoint = CrawlCheckpoint(crawl_redis, domain)
+    async with aiohttp.ClientSession() as session:
+        website = await get_all_website_links(f"{base_url}/", session, workers=2, mode="links", checkpoint=checkpoint)
+
+    assert requests == ["/a", "/c"]
+    assert sorted(website.urls) == [f"{base_url}/", f"{base_url}/a", f"{base_url}/b", f"{base_url}/c"]
+    assert website.page_states[f"{base_url}/"] == {"content_hash": "root"}
+    assert checkpoint.state(f"{base_url}/c") == FETCHED
+    assert (await CrawlCheckpoint(crawl_redis, domain).load())["stage"] == "crawled"
+
+@pytest.mark.asyncio
+async def test_recently_visited_pages_are_read_from_the_content_cache(site, crawl_redis):
+    from ..enumeration import get_all_website_links
+
+    base_url, requests = site
+    async with aiohttp.ClientSession() as session:
+        first = await get_all_website_links(f"{base_url}/", session, workers=2, mode="links")
+        fetched = len(requests)
+        # Every page is now within REVISIT_INTERVAL, and none was ingested
+        second = await get_all_website_links(f"{base_url}/", session, workers=2, mode="links")
+
+    assert len(requests) == fetched
+    assert sorted(second.urls) == sorted(first.urls)
+    assert sorted(second.changed_urls()) == sorted(first.urls)
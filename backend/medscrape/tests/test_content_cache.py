@@ -0,0 +1,19 @@
+from ..content_cache import ContentCache
+
+def test_content_cache_round_trip_and_etag(tmp_path):
+    cache = ContentCache(directory=str(tmp_path), max_bytes=1024 * 1024)
+    cache.put("https://example.com/", "<html>hello</html>", etag='"abc"')
+
+    assert cache.get("https://example.com/") == "<html>hello</html>"
+    assert cache.get("https://example.com/", etag='"abc"') == "<html>hello</html>"
+    assert cache.get("https://example.com/", etag='"changed"') is None
+    assert cache.get("https://example.com/missing") is None
+
+def test_content_cache_evicts_oldest_entries_over_budget(tmp_path):
+    cache = ContentCache(directory=str(tmp_path), max_bytes=2000)
+    for i in range(10):
+        cache.put(f"https://example.com/{i}", "x" * 500)
+
+    assert cache.get("https://example.com/9") is not None
+    assert cache.get("https://example.com/0") is None
+    assert cache._total_bytes <= 2000
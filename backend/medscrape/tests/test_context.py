@@ -0,0 +1,34 @@
+from ..context import build_context, estimate_tokens
+from ..models import ResponseData
+
+def test_build_context_dedups_overlaps_and_groups_by_url():
+    first = "Participants must be over 18 years of age and in good health."
+    second = first[-30:] + " Pregnant women are excluded from the study."
+    results = [
+        ResponseData(url="https://example.com/a", text_chunk=first),
+        ResponseData(url="https://example.com/b", text_chunk="The trial is run at three sites."),
+        ResponseData(url="https://example.com/a", text_chunk=second),
+        ResponseData(url="https://example.com/b", text_chunk="The trial is run at three sites."),
+    ]
+
+    context = build_context(results, token_budget=1000)
+
+    assert context.count("Source: https://example.com/a") == 1
+    assert context.count("The trial is run at three sites.") == 1
+    assert context.count("in good health.") == 1
+    assert "Pregnant women are excluded" in context
+    # Pages are ordered by their best chunk and each page's chunks stay together
+    assert context.index("example.com/a") < context.index("Pregnant") < context.index("example.com/b")
+
+def test_build_context_respects_token_budget():
+    results = [ResponseData(url=f"https://example.com/{i}", text_chunk=f"chunk {i} " + "x" * 400) for i in range(20)]
+
+    context = build_context(results, token_budget=300)
+
+    assert estimate_tokens(context) <= 300
+    assert "chunk 0 " in context and "chunk 19 " not in context
+
+def test_build_context_truncates_an_oversized_best_chunk():
+    context = build_context([ResponseData(url="https://example.com/", text_chunk="y" * 5000)], token_budget=100)
+
+    assert 0 < estimate_tokens(context) <= 100
@@ -0,0 +1,27 @@
+from ..embedding_cache import EmbeddingCache
+
+def test_embedding_cache_only_computes_unseen_texts(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "embeddings.sqlite"), max_entries=100, model_name="test-model")
+    computed = []
+
+    def compute(texts):
+        computed.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    first = cache.embed(["cookie banner", "page text", "cookie banner"], compute)
+    second = cache.embed(["cookie banner", "other page"], compute)
+
+    assert computed == [["cookie banner", "page text"], ["other page"]]
+    assert first == [[13.0, 1.0], [9.0, 1.0], [13.0, 1.0]]
+    assert second[0] == [13.0, 1.0]
+    assert cache.hits == 2
+    assert cache.misses == 3
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "embeddings.sqlite"), max_entries=10)
+    for i in range(12):
+        cache.embed([f"text {i}"], lambda texts: [[0.0] for _ in texts])
+
+    assert cache._entries <= 10
+    assert cache.key("text 0") not in cache.get_many([cache.key("text 0")])
+    assert cache.key("text 11") in cache.get_many([cache.key("text 11")])
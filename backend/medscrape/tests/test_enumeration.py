@@ -1,6 +1,14 @@
 import asyncio
 import aiohttp
+import pytest
+import pytest_asyncio
+
+from aiohttp import web
+
 from ..enumeration import get_all_website_links
+from ..fetching import HttpClient
+
+PAGES = 100
 
 async def test_enumeration():
     async with aiohttp.ClientSession() as session:
@@ -9,5 +17,71 @@ async def test_enumeration():
         for url in website.urls:
             print(url)
 
+@pytest_asyncio.fixture
+async def tree_site():
+    """
+    Page n links to pages 2n+1 and 2n+2, so page n sits at depth floor(log2(n + 1)).
+    """
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    async def page(request):
+        n = int(request.match_info["n"])
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        links = "".join(f'<a href="/page/{child}">{child}</a>' for child in (2 * n + 1, 2 * n + 2) if child < PAGES)
+        return web.Response(text=f"<html><body>{links}</body></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/page/{n}", page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", state
+    await runner.cleanup()
+
+@pytest.fixture
+def crawl_redis(monkeypatch, tmp_path):
+    from .. import content_cache, enumeration
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(enumeration, "redis_client", redis_client)
+    monkeypatch.setattr(enumeration, "content_cache", content_cache.ContentCache(str(tmp_path)))
+    return redis_client
+
+@pytest.mark.asyncio
+async def test_frontier_respects_depth_and_worker_limits(tree_site, crawl_redis):
+    base_url, state = tree_site
+    client = HttpClient()
+    await client.start()
+    session = client.session
+    try:
+        website = await get_all_website_links(f"{base_url}/page/0", session, max_depth=3, workers=3, mode="links")
+    finally:
+        await client.close()
+
+    assert len(website.urls) == 15  # Depths 0 to 3 of the binary tree
+    assert all(website.depths[f"{base_url}/page/{n}"] == (n + 1).bit_length() - 1 for n in range(15))
+    assert state["max_in_flight"] <= 3
+    # Every page went over the one shared session, reusing its keep-alive connections
+    assert website.connection_stats["requests"] >= 15
+    assert website.connection_stats["reused_connections"] > 0
+    assert session.closed and client.session is None
+
+@pytest.mark.asyncio
+async def test_frontier_stops_at_max_pages(tree_site, crawl_redis):
+    base_url, _ = tree_site
+    async with aiohttp.ClientSession() as session:
+        website = await get_all_website_links(f"{base_url}/page/0", session, max_pages=10, workers=4, mode="links")
+
+    assert len(website.urls) == 10
+    # Shallowest-first, so the cap cuts off the deep end of the tree
+    assert {f"{base_url}/page/{n}" for n in range(3)} <= set(website.urls)
+    assert max(website.depths.values()) <= 4
+
 if __name__ == "__main__":
     asyncio.run(test_enumeration())
@@ -0,0 +1,77 @@
+import csv
+import time
+import sqlite3
+
+from typing import List
+
+from ..export import CsvSink, ResultExporter, SqliteSink, answer_rows
+
+class FlakySink:
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+
+    def append_rows(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("sheets unavailable")
+        self.batches.append(rows)
+
+def test_answer_rows_stringifies_answers():
+    rows = answer_rows("example.com", [{"question": "Q1", "answer": ["yes"]}, {"question": "Q2", "answer": None}])
+
+    assert rows == [["example.com", "Q1", '["yes"]'], ["example.com", "Q2", "N/A"]]
+
+def test_answer_rows_formats_models_and_dumps_alike():
+    from pydantic import BaseModel
+
+    class Answer(BaseModel):
+        response: str
+        source_url: List[str]
+
+    answer = Answer(response="Dr. Doe leads cardiology.", source_url=["https://example.com/cardiology"])
+    from_models = answer_rows("example.com", [{"question": "Q", "answer": [answer]}])
+    from_dumps = answer_rows("example.com", [{"question": "Q", "answer": [answer.model_dump()]}])
+
+    assert from_models == from_dumps
+    assert from_models[0][2] == '[{"response": "Dr. Doe leads cardiology.", "source_url": ["https://example.com/cardiology"]}]'
+
+def test_exporter_coalesces_submissions_and_retries():
+    sink = FlakySink(failures=2)
+    exporter = ResultExporter(sink, batch_rows=100, flush_seconds=0.2, backoff_seconds=0.01)
+
+    for i in range(3):
+        exporter.submit([["example.com", f"Q{i}", "A"]])
+    exporter.close()
+
+    assert sink.batches == [[["example.com", f"Q{i}", "A"] for i in range(3)]]
+    assert exporter.stats()["rows_exported"] == 3 and exporter.stats()["appends"] == 1
+
+def test_close_interrupts_the_retry_backoff():
+    sink = FlakySink(failures=2)
+    exporter = ResultExporter(sink, flush_seconds=0, backoff_seconds=60)
+
+    exporter.submit([["example.com", "Q", "A"]])
+    time.sleep(0.2)  # The first append has failed and the exporter is backing off
+    start = time.monotonic()
+    exporter.close(timeout=5)
+
+    assert time.monotonic() - start < 5
+    assert sink.batches == [[["example.com", "Q", "A"]]]
+
+def test_exporter_gives_up_after_max_retries():
+    exporter = ResultExporter(FlakySink(failures=10), flush_seconds=0, max_retries=1, backoff_seconds=0.01)
+
+    exporter.submit([["example.com", "Q", "A"]])
+    exporter.close()
+
+    assert exporter.rows_failed == 1
+
+def test_local_sinks(tmp_path):
+    rows = [["example.com", "Q", "A"]]
+    CsvSink(str(tmp_path / "out" / "answers.csv")).append_rows(rows)
+    SqliteSink(str(tmp_path / "answers.sqlite")).append_rows(rows)
+
+    with open(tmp_path / "out" / "answers.csv", newline="") as f:
+        assert list(csv.reader(f)) == rows
+    assert sqlite3.connect(tmp_path / "answers.sqlite").execute("SELECT tld, question, answer FROM answers").fetchall() == [("example.com", "Q", "A")]
@@ -0,0 +1,72 @@
+import pytest
+import pytest_asyncio
+
+from aiohttp import web
+
+from ..fetching import ConnectionStats, HttpClient, SkippedResponse, crawl_connection_stats, read_html
+
+@pytest_asyncio.fixture
+async def site():
+    async def page(request):
+        return web.Response(text="<html><body>café</body></html>", content_type="text/html", charset="utf-8")
+
+    async def image(request):
+        return web.Response(body=b"\x89PNG" + b"\0" * 1024, content_type="image/png")
+
+    async def large(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await response.prepare(request)
+        for _ in range(64):
+            await response.write(b"<p>" + b"x" * 1024 + b"</p>")
+        return response
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    app.router.add_get("/page.html", image)
+    app.router.add_get("/large", large)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    await runner.cleanup()
+
+@pytest_asyncio.fixture
+async def client():
+    client = HttpClient()
+    await client.start()
+    yield client
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_read_html_guards_content_type_and_size(site, client):
+    async with client.session.get(f"{site}/page") as response:
+        assert await read_html(response) == "<html><body>café</body></html>"
+
+    with pytest.raises(SkippedResponse, match="image/png"):
+        async with client.session.get(f"{site}/page.html") as response:
+            await read_html(response)
+
+    # Streamed without a Content-Length, so the cap applies while reading
+    with pytest.raises(SkippedResponse, match="limit"):
+        async with client.session.get(f"{site}/large") as response:
+            await read_html(response, max_bytes=16 * 1024)
+
+@pytest.mark.asyncio
+async def test_connections_are_reused_and_counted_per_crawl(site, client):
+    crawl_stats = ConnectionStats()
+    token = crawl_connection_stats.set(crawl_stats)
+    try:
+        for _ in range(5):
+            async with client.session.get(f"{site}/page") as response:
+                await response.read()
+    finally:
+        crawl_connection_stats.reset(token)
+    async with client.session.get(f"{site}/page") as response:
+        await response.read()
+
+    assert crawl_stats.stats()["requests"] == 5
+    assert crawl_stats.new_connections == 1
+    assert crawl_stats.reused_connections == 4
+    assert client.stats()["requests"] == 6
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from .. import indexing
+
+class FakeTable:
+    name = "ExtractedData"
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.indices = []
+        self.vector_builds = []
+        self.scalar_builds = []
+        self.schema = SimpleNamespace(field=lambda name: SimpleNamespace(type=SimpleNamespace(list_size=384)))
+
+    def count_rows(self):
+        return self.rows
+
+    def to_lance(self):
+        return SimpleNamespace(list_indices=lambda: [{"name": name} for name in self.indices])
+
+    def create_index(self, **options):
+        self.vector_builds.append(options)
+        self.indices.append("embeddings_idx")
+
+    def create_scalar_index(self, column, replace=True):
+        self.scalar_builds.append(column)
+        self.indices.append(f"{column}_idx")
+
+def test_ensure_indexes_builds_once_threshold_is_crossed_and_on_growth(monkeypatch):
+    monkeypatch.setattr(indexing, "VECTOR_INDEX_MIN_ROWS", 1000)
+    monkeypatch.setattr(indexing, "indexed_row_counts", {})
+    table = FakeTable(rows=500)
+
+    summary = indexing.ensure_indexes(table)
+    assert not summary["vector_index_built"]
+    assert table.scalar_builds == ["tld"]
+
+    table.rows = 1200
+    assert indexing.ensure_indexes(table)["vector_index_built"]
+    assert table.vector_builds[0]["num_sub_vectors"] == 96
+    assert table.vector_builds[0]["num_partitions"] == 34
+
+    table.rows = 1500
+    assert not indexing.ensure_indexes(table)["vector_index_built"]
+
+    table.rows = 1800
+    assert indexing.ensure_indexes(table)["vector_index_built"]
+    assert len(table.vector_builds) == 2
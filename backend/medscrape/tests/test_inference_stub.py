@@ -0,0 +1,89 @@
+import os
+import json
+import asyncio
+import pytest
+import pytest_asyncio
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # The module-level client needs a key even when a stub is used
+
+import instructor
+from aiohttp import web
+from openai import AsyncOpenAI
+
+from .. import inference
+from ..metrics import llm_requests, llm_tokens, stage_seconds
+from ..models import QuestionAnswered
+
+def completion(arguments):
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{"id": "call_stub", "type": "function", "function": {"name": "QuestionAnswered", "arguments": json.dumps(arguments)}}],
+            },
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    }
+
+@pytest_asyncio.fixture
+async def stub_llm(monkeypatch):
+    """
+    Local OpenAI-compatible server that rate limits the first request and answers the rest after a short delay.
+    """
+    state = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def chat_completions(request):
+        body = await request.json()
+        state["requests"] += 1
+        if state["requests"] == 1:
+            return web.json_response({"error": {"message": "rate limited", "type": "rate_limit"}}, status=429, headers={"Retry-After": "0"})
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(0.2)
+        state["in_flight"] -= 1
+        question = body["messages"][-1]["content"].removeprefix("Question: ")
+        return web.json_response(completion({
+            "tld": "com",
+            "question": question,
+            "answer": [{"flag": True, "response": "Water", "reasoning": "Stated in context", "substring_quote": ["Rain"], "source_url": ["https://example.com"]}],
+        }))
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    monkeypatch.setattr(inference, "LLM_CONCURRENCY", 2)
+    llm_client = instructor.patch(AsyncOpenAI(base_url=f"http://127.0.0.1:{port}/v1", api_key="test-key", max_retries=0))
+    yield llm_client, state
+    await runner.cleanup()
+
+@pytest.mark.asyncio
+async def test_query_llm_retries_and_limits_concurrency(stub_llm):
+    llm_client, state = stub_llm
+    questions = [f"What causes rain {i}?" for i in range(4)]
+    prompt_tokens, retried, timed = llm_tokens.value(type="prompt"), llm_requests.value(outcome="retried"), stage_seconds.count(stage="llm")
+
+    started = asyncio.get_running_loop().time()
+    answers = await asyncio.gather(*(inference.query_llm(question, "Rain is water from the sky.", "com", llm_client=llm_client) for question in questions))
+    elapsed = asyncio.get_running_loop().time() - started
+
+    assert all(isinstance(answer, QuestionAnswered) for answer in answers)
+    assert [answer.question for answer in answers] == questions
+    assert state["requests"] == 5  # One rate-limited attempt was retried
+    assert state["max_in_flight"] == 2
+    # Four 0.2s calls, two at a time, instead of 0.8s sequentially
+    assert elapsed < 0.7
+    assert llm_tokens.value(type="prompt") - prompt_tokens == 40
+    assert llm_requests.value(outcome="retried") - retried == 1
+    assert stage_seconds.count(stage="llm") - timed == 5
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+
+from ..jobs import CANCELLED, FAILED, QUEUED, SUCCEEDED, JobQueue
+from ..worker import run_worker
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def make_queue():
+    return JobQueue(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+async def run_until_finished(queue, run, job_ids, concurrency=2):
+    stop = asyncio.Event()
+    worker = asyncio.create_task(run_worker(queue, run, concurrency=concurrency, worker_id="test-worker", stop=stop))
+    for _ in range(200):
+        jobs = [await queue.get(job_id) for job_id in job_ids]
+        if all(job["status"] not in (QUEUED, "running") for job in jobs):
+            break
+        await asyncio.sleep(0.02)
+    stop.set()
+    await asyncio.wait_for(worker, timeout=5)
+    return jobs
+
+@pytest.mark.asyncio
+async def test_worker_runs_jobs_and_records_progress():
+    queue = make_queue()
+
+    async def run(job, on_progress):
+        await on_progress({"stage": "processing", "progress": 50})
+        if job["payload"]["tld"] == "broken.example":
+            raise RuntimeError("crawl failed")
+        return {"url": job["payload"]["tld"]}
+
+    ok = await queue.submit("process", {"tld": "example.com"})
+    broken = await queue.submit("process", {"tld": "broken.example"})
+    jobs = await run_until_finished(queue, run, [ok, broken])
+
+    assert jobs[0]["status"] == SUCCEEDED and jobs[0]["result"] == {"url": "example.com"}
+    assert jobs[0]["progress"] == {"stage": "processing", "progress": 50}
+    assert jobs[0]["worker"] == "test-worker"
+    assert jobs[1]["status"] == FAILED and jobs[1]["error"] == "crawl failed"
+    assert await queue.stats() == {"queued": 0, "running": 0}
+
+@pytest.mark.asyncio
+async def test_cancel_queued_and_running_jobs(monkeypatch):
+    monkeypatch.setattr("medscrape.worker.JOB_HEARTBEAT_SECONDS", 0.05)
+    queue = make_queue()
+    started = asyncio.Event()
+
+    async def run(job, on_progress):
+        started.set()
+        await asyncio.sleep(30)
+
+    running = await queue.submit("process", {"tld": "slow.example"})
+    queued = await queue.submit("process", {"tld": "later.example"})
+    assert await queue.cancel(queued) == CANCELLED
+
+    stop = asyncio.Event()
+    worker = asyncio.create_task(run_worker(queue, run, concurrency=1, stop=stop))
+    await asyncio.wait_for(started.wait(), timeout=2)
+    assert await queue.cancel(running) == "running"
+    for _ in range(100):
+        if (await queue.get(running))["status"] == CANCELLED:
+            break
+        await asyncio.sleep(0.02)
+    stop.set()
+    await asyncio.wait_for(worker, timeout=5)
+
+    assert (await queue.get(running))["status"] == CANCELLED
+    assert (await queue.get(queued))["status"] == CANCELLED
+
+@pytest.mark.asyncio
+async def test_jobs_of_dead_workers_are_requeued():
+    queue = make_queue()
+    job_id = await queue.submit("process", {"tld": "example.com"})
+    await queue.claim("dead-worker", timeout=1)
+    await queue.redis_client.hset(queue.job_key(job_id), "heartbeat_at", 0)
+
+    assert await queue.requeue_stale(stale_seconds=60) == 1
+    assert (await queue.claim("live-worker", timeout=1))["id"] == job_id
@@ -0,0 +1,36 @@
+from ..links import extract_links
+
+BASE_URL = "https://www.example.org/services/cardiology/"
+DOMAIN = "www.example.org"
+
+def test_extract_links_matches_the_crawler_rules():
+    html = """
+    <html><body>
+      <a href="/about?ref=nav#team">About</a>
+      <A HREF="../doctors/">Doctors</A>
+      <a href="https://www.example.org/news/../contact">Contact</a>
+      <a href="/a/./b/../c">Dot segments</a>
+      <a href=" /padded ">Padded</a>
+      <a href="//www.example.org/protocol-relative">Protocol relative</a>
+      <a href="https://other.example.com/page">External</a>
+      <a href="#top">Anchor</a>
+      <a href="mailto:info@example.org">Mail</a>
+      <a href="/files/brochure.PDF">Download</a>
+      <a href="/patients/login">Login</a>
+      <a>No href</a>
+    </body></html>
+    """
+    assert extract_links(html, BASE_URL, DOMAIN) == {
+        "https://www.example.org/about",
+        "https://www.example.org/services/doctors/",
+        "https://www.example.org/news/../contact",
+        "https://www.example.org/a/c",
+        "https://www.example.org/padded",
+        "https://www.example.org/protocol-relative",
+    }
+
+def test_extract_links_handles_encoding_declarations_and_empty_pages():
+    xhtml = '<?xml version="1.0" encoding="utf-8"?><html><body><a href="page">Page</a></body></html>'
+    assert extract_links(xhtml, BASE_URL, DOMAIN) == {"https://www.example.org/services/cardiology/page"}
+    assert extract_links("", BASE_URL, DOMAIN) == set()
+    assert extract_links("<p>No links here</p>", BASE_URL, DOMAIN) == set()
@@ -0,0 +1,53 @@
+import logging
+import pytest
+import redis
+
+from ..log_shipping import LogShipper
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def test_log_shipper_batches_records_into_streams_and_channels():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe("log_channel")
+    shipper = LogShipper(redis_client=redis_client, flush_seconds=0.05, stream_maxlen=100, max_message_chars=50)
+    logger = logging.getLogger("medscrape.tests.shipping")
+    logger.addHandler(shipper)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    logger.info("not shipped")  # No channel, so it only goes to the regular handlers
+    logger.info("Visiting: https://example.com/", extra={"channel": "log_channel"})
+    logger.info("x" * 200, extra={"channel": "log_channel"})
+    shipper.publish("progress_channel", '{"progress": 50}')
+    shipper.close()
+    logger.removeHandler(shipper)
+
+    entries = [fields["message"] for _, fields in redis_client.xrange("logs:log_channel")]
+    assert entries[0] == "Visiting: https://example.com/"
+    assert entries[1] == "x" * 50 + "... [150 characters truncated]"
+    assert redis_client.xrange("logs:progress_channel")[0][1]["message"] == '{"progress": 50}'
+    published = [pubsub.get_message(timeout=0.1) for _ in range(3)]
+    assert [message["data"] for message in published if message] == ["Visiting: https://example.com/", entries[1]]
+    assert shipper.stats() == {"queued": 0, "shipped": 3, "dropped": 0, "failed": 0}
+
+def test_log_shipper_drops_when_the_queue_is_full():
+    shipper = LogShipper(redis_client=fakeredis.FakeRedis(), queue_size=2)
+    shipper._start = lambda: None  # Keep the drain thread from emptying the queue
+    for i in range(5):
+        shipper.publish("log_channel", str(i))
+
+    assert shipper.dropped == 3
+
+class UnreachableRedis:
+    def pipeline(self, transaction=True):
+        raise redis.ConnectionError("Connection refused")
+
+def test_log_shipper_rate_limits_failure_reports(capsys):
+    shipper = LogShipper(redis_client=UnreachableRedis(), batch_size=1, flush_seconds=0.05, failure_report_seconds=60)
+    for i in range(5):
+        shipper.publish("log_channel", str(i))
+    shipper.close()
+
+    assert capsys.readouterr().err.splitlines() == ["Log shipper failed to send 1 entries (1 in total): Connection refused"]
+    assert shipper.stats() == {"queued": 0, "shipped": 0, "dropped": 0, "failed": 5}
@@ -1,3 +1,6 @@
+import asyncio
+import pytest
+
 from fastapi.testclient import TestClient
 from ..main import app
 
@@ -13,25 +16,67 @@ def test_health_check_v1():
     assert response.status_code == 200
     assert response.json() == {"status": "healthy", "version": "v1"}
 
+def test_metrics_endpoint():
+    client.get("/health/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'medscrape_http_request_seconds_count{method="GET",route="/health/",status="200"}' in response.text
+    assert "# TYPE medscrape_stage_seconds histogram" in response.text
+    assert 'medscrape_queue_depth{queue="log_shipper"}' in response.text
+    assert 'medscrape_log_entries_total{outcome="dropped"}' in response.text
+
 def test_run_endpoint():
     test_data = {
         "tld": "https://example.com",
         "questions": ["What is the main topic?", "How many articles?"]
     }
     response = client.post("/run/", json=test_data)
-    assert response.status_code == 200
-    assert "message" in response.json()
-    assert "data" in response.json()
-    assert len(response.json()["data"]) == len(test_data["questions"])
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.headers["location"] == f"/jobs/{job_id}"
+    job = client.get(response.headers["location"]).json()
+    assert job["kind"] == "run"
+    assert job["payload"]["questions"] == test_data["questions"]
 
 def test_process_endpoint():
     test_url = "https://example.com"
-    response = client.post("/process/", json={"url": test_url})
-    assert response.status_code == 200
-    assert response.json()["message"] == "Scraping and processing completed"
-    assert response.json()["url"] == test_url
-    # Assuming the number of URLs found is variable, check if it's an integer
-    assert isinstance(response.json()["urls_found"], int)
+    response = client.post("/process/", json={"tld": test_url})
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    job = client.get(response.headers["location"]).json()
+    assert job["kind"] == "process"
+    assert job["payload"]["tld"] == test_url
+
+@pytest.mark.asyncio
+async def test_wait_for_job_relays_progress_until_the_job_finishes(monkeypatch):
+    from .. import main
+    from ..jobs import SUCCEEDED, JobQueue
+    from ..streaming import PubSubHub
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    queue, hub = JobQueue(redis_client), PubSubHub(redis_client, heartbeat_seconds=0.05)
+    monkeypatch.setattr(main, "job_queue", queue)
+    monkeypatch.setattr(main, "pubsub_hub", hub)
+    job_id = await queue.submit("run", {"tld": "https://example.com", "questions": ["Who leads cardiology?"]})
+    updates = []
+
+    async def on_progress(update):
+        updates.append(update)
+
+    waiting = asyncio.create_task(main.wait_for_job(job_id, on_progress))
+    await asyncio.sleep(0.1)
+    await queue.update_progress(job_id, {"stage": "processing", "status": "Processing", "progress": 50.0})
+    await asyncio.sleep(0.1)
+    await queue.finish(job_id, SUCCEEDED, result={"data": []})
+    job = await asyncio.wait_for(waiting, timeout=2)
+
+    assert updates == [{"stage": "processing", "status": "Processing", "progress": 50.0}]
+    assert job["status"] == SUCCEEDED and job["result"] == {"data": []}
+    # A job that finished before anyone listened is picked up on the next heartbeat
+    assert (await asyncio.wait_for(main.wait_for_job(job_id, on_progress), timeout=2))["status"] == SUCCEEDED
+    await hub.close()
 
 def test_query_endpoint():
     test_data = {
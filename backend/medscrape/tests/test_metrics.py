@@ -0,0 +1,73 @@
+import time
+import pytest
+
+from ..metrics import MetricsRegistry, timed_stage, stage_errors, stage_seconds
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests.", ["route"])
+    registry.gauge("test_queue_depth", "Queued items.", ["queue"], function=lambda: {"logs": 3, "exports": 0})
+    latency = registry.histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+
+    requests.inc(route="/query/")
+    requests.inc(2, route="/query/")
+    requests.inc(route='/say "hi"')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{route="/query/"} 3' in lines
+    assert 'test_requests_total{route="/say \\"hi\\""} 1' in lines
+    assert 'test_queue_depth{queue="logs"} 3' in lines
+    assert 'test_queue_depth{queue="exports"} 0' in lines
+    assert "# TYPE test_latency_seconds histogram" in lines
+    # Buckets are cumulative and end with +Inf
+    assert [line for line in lines if line.startswith("test_latency_seconds_bucket")] == [
+        'test_latency_seconds_bucket{le="0.1"} 1',
+        'test_latency_seconds_bucket{le="1.0"} 2',
+        'test_latency_seconds_bucket{le="+Inf"} 3',
+    ]
+    assert "test_latency_seconds_sum 5.55" in lines
+    assert "test_latency_seconds_count 3" in lines
+
+def test_failing_callback_does_not_hide_other_metrics():
+    registry = MetricsRegistry()
+    registry.gauge("test_broken", "Raises on scrape.", function=lambda: 1 / 0)
+    registry.counter("test_ok_total", "Still rendered.").inc()
+    assert "test_ok_total 1" in registry.render().splitlines()
+
+def test_registering_a_name_twice_returns_the_first_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("test_total", "First.")
+    assert registry.counter("test_total", "Second.") is first
+
+def test_timed_stage_records_duration_and_errors():
+    count, errors = stage_seconds.count(stage="test"), stage_errors.value(stage="test")
+    with timed_stage("test"):
+        pass
+    with pytest.raises(ValueError):
+        with timed_stage("test"):
+            raise ValueError("boom")
+    assert stage_seconds.count(stage="test") - count == 2
+    assert stage_errors.value(stage="test") - errors == 1
+
+def _best_of(record, runs=5, calls=20000):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(calls):
+            record(stage="fetch")
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def test_recording_overhead_is_small():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_overhead_seconds", "Overhead.", ["stage"])
+    requests = registry.counter("test_overhead_total", "Baseline.", ["stage"])
+    # Relative to the cheapest labelled update, so the bound holds on slow or loaded machines
+    observe = _best_of(lambda **labels: latency.observe(0.3, **labels))
+    baseline = _best_of(requests.inc)
+    assert observe < 5 * baseline
+    assert latency.count(stage="fetch") == 100000
@@ -0,0 +1,146 @@
+import time
+import aiohttp
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import pytest
+import pytest_asyncio
+
+from aiohttp import web
+
+from ..politeness import FetchSlot, HostPolicy, PolitenessScheduler, parse_crawl_delay, parse_retry_after
+
+pytest.importorskip("aiolimiter")
+
+@pytest_asyncio.fixture
+async def site():
+    state = {"throttled": 1, "requests": []}
+
+    async def robots(request):
+        return web.Response(text="User-agent: *\nDisallow: /private\nCrawl-delay: 0.2\n")
+
+    async def page(request):
+        state["requests"].append(time.monotonic())
+        if state["throttled"]:
+            state["throttled"] -= 1
+            return web.Response(status=429, headers={"Retry-After": "0.3"})
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/robots.txt", robots)
+    app.router.add_get("/{path:.*}", page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", state
+    await runner.cleanup()
+
+@pytest_asyncio.fixture
+async def unavailable_site():
+    """
+    Answers 503 without a Retry-After twice, then serves the page.
+    """
+    state = {"unavailable": 2, "requests": []}
+
+    async def page(request):
+        state["requests"].append(time.monotonic())
+        if state["unavailable"]:
+            state["unavailable"] -= 1
+            return web.Response(status=503)
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", state
+    await runner.cleanup()
+
+@pytest.mark.asyncio
+async def test_window_grows_when_healthy_and_halves_on_throttling():
+    policy = HostPolicy("example.com", rate=1000, initial_window=4, max_window=8)
+    for _ in range(20):
+        await policy.acquire()
+        await policy.release(200, latency=0.05)
+    assert policy.window > 6
+
+    grown = policy.window
+    await policy.acquire()
+    await policy.release(429, latency=0.05)
+    assert policy.window == pytest.approx(grown / 2)
+    assert policy.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_scheduler_honours_robots_and_retry_after(site):
+    from ..enumeration import get_page
+
+    base_url, state = site
+    scheduler = PolitenessScheduler("medscrape-test")
+    async with aiohttp.ClientSession() as session:
+        assert not await scheduler.allowed(f"{base_url}/private/records", session)
+        assert await scheduler.allowed(f"{base_url}/about", session)
+
+        status, _, _ = await get_page(f"{base_url}/about", session, {}, scheduler)
+        await get_page(f"{base_url}/contact", session, {}, scheduler)
+
+    assert status == 200
+    # The 429 was retried only after its Retry-After, and Crawl-delay spaced every request
+    first, retry, second = state["requests"]
+    assert retry - first >= 0.3
+    assert second - retry >= 0.15
+    assert scheduler.stats()[base_url.split("//")[1]]["throttled"] == 1
+
+def test_parse_crawl_delay_prefers_the_matching_group():
+    robots_txt = "User-agent: medscrape\nCrawl-delay: 0.5\n\nUser-agent: *\nDisallow: /private\nCrawl-delay: 2\n"
+
+    assert parse_crawl_delay(robots_txt, "medscrape-test/1.0") == 0.5
+    assert parse_crawl_delay(robots_txt, "Mozilla/5.0") == 2.0
+    assert parse_crawl_delay("User-agent: *\nDisallow:\n", "Mozilla/5.0") is None
+
+@pytest.mark.asyncio
+async def test_throttled_pages_back_off_before_retrying(unavailable_site, monkeypatch):
+    from .. import enumeration
+
+    base_url, state = unavailable_site
+    monkeypatch.setattr(enumeration, "CRAWL_RETRY_BACKOFF_SECONDS", 0.1)
+    # The window stays open after a single decrease, so only the backoff spaces the retries
+    scheduler = PolitenessScheduler("medscrape-test", respect_robots=False, rate=1000)
+    async with aiohttp.ClientSession() as session:
+        status, _, _ = await enumeration.get_page(f"{base_url}/about", session, {}, scheduler)
+
+    assert status == 200
+    first, second, third = state["requests"]
+    assert second - first >= 0.05  # 0.1s with jitter between half and one and a half times
+    assert third - second >= 0.1  # Doubled on the second retry
+
+@pytest.mark.asyncio
+async def test_retries_stop_at_the_retry_time_budget(unavailable_site, monkeypatch):
+    from .. import enumeration
+
+    base_url, state = unavailable_site
+    monkeypatch.setattr(enumeration, "CRAWL_RETRY_BACKOFF_SECONDS", 0.1)
+    monkeypatch.setattr(enumeration, "CRAWL_MAX_RETRY_SECONDS", 0.01)
+    scheduler = PolitenessScheduler("medscrape-test", respect_robots=False, rate=1000)
+    async with aiohttp.ClientSession() as session:
+        status, _, body = await enumeration.get_page(f"{base_url}/about", session, {}, scheduler)
+
+    assert (status, body) == (503, None)
+    assert len(state["requests"]) == 1
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after(None) is None
+    in_ten_seconds = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    assert parse_retry_after(in_ten_seconds) == pytest.approx(10, abs=1.5)
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # Already passed
+
+    slot = FetchSlot()
+    slot.done(503, {"Retry-After": in_ten_seconds})
+    assert slot.retry_after == pytest.approx(10, abs=1.5)
+    slot.done(503, {"Retry-After": "soon"})
+    assert slot.retry_after is None
@@ -1,6 +1,11 @@
 import os
+import time
 import asyncio
+import threading
+import pytest
+import pytest_asyncio
 from urllib.parse import urlparse
+from aiohttp import web
 from dotenv import load_dotenv  # Import load_dotenv
 
 from ..processing import process_html_content
@@ -14,5 +19,224 @@ async def test_process_html_content():
     await process_html_content(url, tld)
     print("Test completed successfully.")
 
+@pytest.mark.asyncio
+async def test_process_html_content_without_a_writer_writes_to_the_table(monkeypatch):
+    from .. import processing
+
+    written = []
+    monkeypatch.setattr(processing, "PARTITION_EXECUTOR", "thread")
+    monkeypatch.setattr(processing, "partition_executor", None)
+    monkeypatch.setattr(processing, "_add_rows", written.append)
+    html = "<html><body><h1>Cardiology</h1><p>Our cardiology team treats atrial fibrillation.</p></body></html>"
+    try:
+        await process_html_content("https://example.org/cardiology", "example.org", html=html)
+    finally:
+        processing.shutdown_partition_executor()
+
+    assert len(written) == 1
+    assert {row["url"] for row in written[0]} == {"https://example.org/cardiology"}
+
+@pytest.mark.asyncio
+async def test_process_html_content_reports_partition_failures(monkeypatch):
+    from .. import processing
+
+    def failing_partition(*args, **kwargs):
+        raise ValueError("unparseable page")
+
+    monkeypatch.setattr(processing, "PARTITION_EXECUTOR", "thread")
+    monkeypatch.setattr(processing, "partition_executor", None)
+    monkeypatch.setattr(processing, "partition_html_rows", failing_partition)
+    try:
+        assert await process_html_content("https://example.org/broken", "example.org", html="<p>Broken</p>") is False
+    finally:
+        processing.shutdown_partition_executor()
+
+@pytest.mark.asyncio
+async def test_process_pages_does_not_record_failed_pages(monkeypatch):
+    from .. import processing
+    from ..checkpoint import FETCHED, WRITTEN, CrawlCheckpoint
+    from ..visited import PageStateStore
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    page_state_store = PageStateStore(redis_client)
+    checkpoint = CrawlCheckpoint(redis_client, "example.org", interval=3600)
+    ok_url, failed_url = "https://example.org/ok", "https://example.org/failed"
+    for url in (ok_url, failed_url):
+        checkpoint.mark(url, FETCHED, unchanged=False)
+
+    async def fake_process_html_content(url, tld, **kwargs):
+        return url == ok_url
+
+    monkeypatch.setattr(processing, "process_html_content", fake_process_html_content)
+    monkeypatch.setattr(processing, "page_state_store", page_state_store)
+    page_states = {url: {"content_hash": url} for url in (ok_url, failed_url)}
+    await processing.process_pages([ok_url, failed_url], "example.org", page_states=page_states, checkpoint=checkpoint)
+
+    assert await page_state_store.get(ok_url) == {"content_hash": ok_url}
+    assert await page_state_store.get(failed_url) is None  # The next crawl sees it as changed and ingests it again
+    assert checkpoint.state(ok_url) == WRITTEN
+    assert checkpoint.state(failed_url) == FETCHED
+
+@pytest.mark.asyncio
+async def test_process_pages_records_nothing_when_the_final_write_fails(monkeypatch):
+    from .. import processing
+    from ..checkpoint import FETCHED, WRITTEN, CrawlCheckpoint
+    from ..visited import PageStateStore
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    page_state_store = PageStateStore(redis_client)
+    checkpoint = CrawlCheckpoint(redis_client, "example.org", interval=3600)
+    urls = ["https://example.org/a", "https://example.org/b"]
+    for url in urls:
+        checkpoint.mark(url, FETCHED, unchanged=False)
+
+    class FailingWriter(processing.BulkWriter):
+        def _write(self, rows):
+            raise OSError("disk full")
+
+    async def fake_process_html_content(url, tld, writer=None, **kwargs):
+        await writer.add([{"chunk_id": url, "url": url, "text_chunk": "Cardiology"}])
+        return True
+
+    monkeypatch.setattr(processing, "BulkWriter", FailingWriter)
+    monkeypatch.setattr(processing, "process_html_content", fake_process_html_content)
+    monkeypatch.setattr(processing, "page_state_store", page_state_store)
+    with pytest.raises(OSError):
+        await processing.process_pages(urls, "example.org", page_states={url: {"content_hash": url} for url in urls}, checkpoint=checkpoint)
+
+    for url in urls:
+        assert await page_state_store.get(url) is None
+        assert checkpoint.state(url) != WRITTEN
+
+@pytest_asyncio.fixture
+async def pdf_site():
+    documents = {"/guide.pdf": b"%PDF-1.4 guide", "/guide-copy.pdf": b"%PDF-1.4 guide", "/other.pdf": b"%PDF-1.4 other"}
+
+    async def document(request):
+        return web.Response(body=documents[request.path], content_type="application/pdf")
+
+    app = web.Application()
+    for path in documents:
+        app.router.add_get(path, document)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    await runner.cleanup()
+
+@pytest.fixture
+def pdf_processing(monkeypatch):
+    from .. import processing
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    partitioned, written = [], []
+
+    def fake_partition_pdf_rows(url, parsed_tld, pdf):
+        partitioned.append(url)
+        return [{"chunk_id": url, "tld": parsed_tld, "url": url, "text_chunk": "Patient guide"}]
+
+    monkeypatch.setattr(processing, "PARTITION_EXECUTOR", "thread")
+    monkeypatch.setattr(processing, "partition_executor", None)
+    monkeypatch.setattr(processing, "partition_pdf_rows", fake_partition_pdf_rows)
+    monkeypatch.setattr(processing, "redis_client", redis_client)
+    monkeypatch.setattr(processing, "_add_rows", written.append)
+    yield processing, redis_client, partitioned, written
+    processing.shutdown_partition_executor()
+
+@pytest.mark.asyncio
+async def test_pdf_content_is_processed_once_per_tld(pdf_site, pdf_processing):
+    processing, redis_client, partitioned, written = pdf_processing
+
+    assert await processing.process_pdf_content(f"{pdf_site}/guide.pdf", "example.org") is True
+    assert await redis_client.scard(f"{processing.PDF_HASHES_KEY}:example.org") == 1
+    # A later crawl finds the same bytes under another URL already stored
+    assert await processing.process_pdf_content(f"{pdf_site}/guide-copy.pdf", "example.org") is True
+    await processing.process_pdf_content(f"{pdf_site}/other.pdf", "example.org")
+
+    assert partitioned == [f"{pdf_site}/guide.pdf", f"{pdf_site}/other.pdf"]
+    assert len(written) == 2
+
+@pytest.mark.asyncio
+async def test_pdf_hash_waits_for_the_writer(pdf_site, pdf_processing):
+    processing, redis_client, partitioned, _ = pdf_processing
+
+    class BufferingWriter:
+        def __init__(self):
+            self.rows = []
+
+        async def add(self, rows):
+            self.rows.extend(rows)
+
+    writer, seen_pdfs, pdf_hashes = BufferingWriter(), set(), []
+    for path in ("/guide.pdf", "/guide-copy.pdf"):
+        await processing.process_pdf_content(f"{pdf_site}{path}", "example.org", seen_pdfs=seen_pdfs, writer=writer, pdf_hashes=pdf_hashes)
+
+    assert partitioned == [f"{pdf_site}/guide.pdf"]
+    assert len(pdf_hashes) == 1
+    # Nothing is recorded until the caller has flushed the writer
+    assert await redis_client.scard(f"{processing.PDF_HASHES_KEY}:example.org") == 0
+
+@pytest.mark.asyncio
+async def test_pdf_progress_goes_to_the_callers_callback(pdf_site, pdf_processing, monkeypatch):
+    from ..log_shipping import log_shipper
+
+    processing, _, partitioned, _ = pdf_processing
+    pdf_links = [f"{pdf_site}/guide.pdf", f"{pdf_site}/other.pdf"]
+    published, updates = [], []
+
+    async def on_progress(update):
+        updates.append(update)
+
+    monkeypatch.setattr(processing, "partition_html_rows", lambda *args, **kwargs: ([], pdf_links))
+    monkeypatch.setattr(log_shipper, "publish", lambda channel, message: published.append(channel))
+    assert await processing.process_html_content("https://example.org/guides", "example.org", html="<p>Guides</p>", on_progress=on_progress)
+
+    assert sorted(partitioned) == pdf_links
+    assert [(update["stage"], update["completed"], update["total"]) for update in updates] == [("pdfs", 1, 2), ("pdfs", 2, 2)]
+    assert "progress_channel" not in published  # Other jobs' viewers never see this crawl's progress
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["thread", "process"])
+async def test_partition_executor_runs_off_the_event_loop(monkeypatch, mode):
+    from .. import processing
+
+    monkeypatch.setattr(processing, "PARTITION_EXECUTOR", mode)
+    monkeypatch.setattr(processing, "PARTITION_WORKERS", 2)
+    monkeypatch.setattr(processing, "partition_executor", None)
+    loop = asyncio.get_running_loop()
+    executor = processing.get_partition_executor()
+    assert processing.get_partition_executor() is executor  # Created once and shared
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    try:
+        # Only builtins are sent, so spawned workers need not import the test module
+        worker_pid = await loop.run_in_executor(executor, os.getpid)
+        worker_thread = await loop.run_in_executor(executor, threading.get_ident)
+        ticking = asyncio.create_task(ticker())
+        await loop.run_in_executor(executor, time.sleep, 0.3)
+        ticking.cancel()
+    finally:
+        processing.shutdown_partition_executor()
+
+    assert ticks >= 10  # The loop kept running while the partition call blocked
+    if mode == "process":
+        assert worker_pid != os.getpid()
+    else:
+        assert worker_thread != threading.get_ident()
+    assert processing.partition_executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(os.getpid)
+
 if __name__ == "__main__":
-    asyncio.run(test_process_html_content())
\ No newline at end of file
+    asyncio.run(test_process_html_content())
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import pytest
+import lancedb
+import pyarrow as pa
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("LANCE_DB_URI", tempfile.mkdtemp())
+
+from .. import retrieval
+
+@pytest.fixture
+def db(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    db.create_table("ExtractedData", pa.table({"url": ["https://example.org/"], "text_chunk": ["Cardiology"]}))
+    return db
+
+def add_row(db):
+    db.open_table("ExtractedData").add(pa.table({"url": ["https://example.org/new"], "text_chunk": ["Oncology"]}))
+
+def test_table_handle_is_kept_until_a_new_version_is_committed(db):
+    service = retrieval.RetrievalService(db, refresh_seconds=0)
+    table = service.table
+    assert service.table is table  # No write since the last check
+
+    add_row(db)
+    reopened = service.table
+    assert reopened is not table
+    assert reopened.count_rows() == 2
+
+def test_version_check_waits_for_the_refresh_interval(db):
+    service = retrieval.RetrievalService(db, refresh_seconds=3600)
+    table = service.table
+    add_row(db)
+    assert service.table is table
+
+def test_reranker_is_loaded_once(monkeypatch, db):
+    created = []
+
+    class FakeReranker:
+        def __init__(self, column):
+            created.append(column)
+
+    monkeypatch.setattr(retrieval, "TimedColbertReranker", FakeReranker)
+    service = retrieval.RetrievalService(db)
+    assert service.reranker is service.reranker
+    assert created == ["text_chunk"]
+
+def test_warmup_runs_one_search_and_survives_errors(monkeypatch, db):
+    service = retrieval.RetrievalService(db)
+    searches = []
+
+    def failing_search(question, tld=None, limit=retrieval.SEARCH_LIMIT):
+        searches.append((question, limit))
+        raise RuntimeError("model not downloaded")
+
+    monkeypatch.setattr(service, "search", failing_search)
+    service.warmup()
+    assert searches == [("warmup", 1)]
@@ -0,0 +1,88 @@
+import gzip
+import aiohttp
+import pytest
+import pytest_asyncio
+
+from aiohttp import web
+
+from ..sitemap import SitemapParser, fetch_sitemap_urls, parse_lastmod
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+@pytest_asyncio.fixture
+async def site():
+    async def robots(request):
+        return web.Response(text=f"User-agent: *\nSitemap: http://{request.host}/sitemap_index.xml.gz\n")
+
+    async def sitemap_index(request):
+        body = f'<?xml version="1.0"?><sitemapindex {NS}><sitemap><loc>http://{request.host}/pages.xml</loc></sitemap></sitemapindex>'
+        return web.Response(body=gzip.compress(body.encode()), content_type="application/octet-stream")
+
+    async def pages(request):
+        origin = f"http://{request.host}"
+        entries = "".join(f"<url><loc>{origin}/page{i}</loc><lastmod>2024-01-0{i + 1}</lastmod></url>" for i in range(3))
+        entries += "<url><loc>https://elsewhere.example/page</loc></url>"
+        return web.Response(text=f'<?xml version="1.0"?><urlset {NS}>{entries}</urlset>', content_type="application/xml")
+
+    app = web.Application()
+    app.router.add_get("/robots.txt", robots)
+    app.router.add_get("/sitemap_index.xml.gz", sitemap_index)
+    app.router.add_get("/pages.xml", pages)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server = web.TCPSite(runner, "127.0.0.1", 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    await runner.cleanup()
+
+def test_parse_lastmod_accepts_w3c_datetimes():
+    assert parse_lastmod("2024-01-01") == 1704067200
+    assert parse_lastmod("2024-01-01T01:00:00+01:00") == 1704067200
+    assert parse_lastmod("2024-01-01T00:00:00Z") == 1704067200
+    assert parse_lastmod("yesterday") is None
+    assert parse_lastmod(None) is None
+
+def test_parser_handles_split_chunks_and_nested_locs():
+    document = (
+        f'<urlset {NS} xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">'
+        "<url><loc>https://a.example/x#top</loc><image:image><image:loc>https://a.example/x.png</image:loc></image:image></url>"
+        "</urlset>"
+    ).encode()
+    parser = SitemapParser()
+    for i in range(0, len(document), 7):
+        parser.feed(document[i:i + 7])
+    parser.close()
+    assert parser.urls == {"https://a.example/x": None}
+
+def test_parser_caps_the_uncompressed_size_of_gzipped_sitemaps():
+    url = "<url><loc>https://a.example/page</loc></url>"
+    document = gzip.compress(f"<urlset {NS}>{url * 200000}</urlset>".encode())
+    parser = SitemapParser(max_bytes=1024 * 1024)
+    with pytest.raises(ValueError):
+        for i in range(0, len(document), 4096):
+            parser.feed(document[i:i + 4096])
+        parser.close()
+    # Stopped within one inflated chunk of the cap, though the whole document is ~9 MB
+    assert len(document) < 100 * 1024
+    assert parser.size <= 1024 * 1024 + 64 * 1024
+
+@pytest.mark.asyncio
+async def test_fetch_follows_robots_and_gzipped_indexes(site):
+    from ..politeness import PolitenessScheduler
+
+    pytest.importorskip("aiolimiter")
+    scheduler = PolitenessScheduler("medscrape-test")
+    domain = site.split("//")[1]
+    async with aiohttp.ClientSession() as session:
+        await scheduler.host_policy(site, session)
+        robots_sitemaps = scheduler.robots[domain].site_maps()
+        urls = await fetch_sitemap_urls(site, session, domain, robots_sitemaps, scheduler)
+
+    assert list(urls) == [f"{site}/page{i}" for i in range(3)]
+    assert urls[f"{site}/page0"] == parse_lastmod("2024-01-01")
+
+@pytest.mark.asyncio
+async def test_fetch_without_sitemaps_returns_nothing(site):
+    async with aiohttp.ClientSession() as session:
+        assert await fetch_sitemap_urls(f"{site}/missing/", session, site.split("//")[1], ["%s/nothing.xml" % site]) == {}
@@ -0,0 +1,45 @@
+import os
+import time
+import asyncio
+import tempfile
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("LANCE_DB_URI", tempfile.mkdtemp())
+
+from .. import retrieval
+from ..answer_cache import AnswerCache
+from ..models import QuestionAnswered, ResponseData, UserQueries
+
+fakeredis = pytest.importorskip("fakeredis")
+
+class StubService:
+    def search(self, question, tld=None):
+        return [ResponseData(url=f"https://{tld}/", text_chunk=f"About {question}")]
+
+@pytest.mark.asyncio
+async def test_answers_are_streamed_in_completion_order(monkeypatch):
+    delays = {"slow": 0.3, "fast": 0.05, "medium": 0.15}
+
+    async def fake_query_llm(question, context, tld):
+        await asyncio.sleep(delays[question])
+        return QuestionAnswered(tld=tld, question=question, answer=[])
+
+    monkeypatch.setattr(retrieval, "query_llm", fake_query_llm)
+    monkeypatch.setattr(retrieval, "get_retrieval_service", lambda: StubService())
+    monkeypatch.setattr(retrieval, "answer_cache", AnswerCache(fakeredis.aioredis.FakeRedis(decode_responses=True)))
+
+    start = time.monotonic()
+    streamed = []
+    async for index, answer in retrieval.stream_answers(UserQueries(tld="https://example.com", questions=["slow", "fast", "medium"])):
+        streamed.append((index, answer.question, time.monotonic() - start))
+
+    assert [question for _, question, _ in streamed] == ["fast", "medium", "slow"]
+    assert [index for index, _, _ in streamed] == [1, 2, 0]
+    # The first answer arrives after one LLM round trip, not after all of them
+    assert streamed[0][2] < 0.2
+
+    # lance_retrieval keeps question order, and the repeats are served from the answer cache
+    answers = await retrieval.lance_retrieval(UserQueries(tld="https://example.com", questions=["slow", "fast", "medium"]))
+    assert [answer.question for answer in answers] == ["slow", "fast", "medium"]
+    assert retrieval.answer_cache.hits == 3
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+
+from ..streaming import PubSubHub
+
+fakeredis = pytest.importorskip("fakeredis")
+
+async def collect(hub, channel, count, received):
+    async for message in hub.messages(channel):
+        received.append(message)
+        if len(received) == count:
+            return
+
+@pytest.mark.asyncio
+async def test_hub_fans_out_one_subscription_to_many_clients():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    hub = PubSubHub(redis_client, heartbeat_seconds=5)
+    inboxes = [[] for _ in range(20)]
+    clients = [asyncio.create_task(collect(hub, "progress_channel", 2, inbox)) for inbox in inboxes]
+    await asyncio.sleep(0.1)
+
+    assert (await redis_client.pubsub_numsub("progress_channel"))[0][1] == 1
+    await redis_client.publish("progress_channel", "one")
+    await redis_client.publish("progress_channel", "two")
+    await asyncio.wait_for(asyncio.gather(*clients), timeout=2)
+
+    assert all(inbox == ["one", "two"] for inbox in inboxes)
+    assert hub.stats()["clients"] == {}
+    await hub.close()
+
+@pytest.mark.asyncio
+async def test_hub_unsubscribes_once_a_channels_last_client_leaves():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    hub = PubSubHub(redis_client, heartbeat_seconds=5)
+
+    for job in range(3):
+        channel = f"jobs:{job}:progress"
+        received = []
+        client = asyncio.create_task(collect(hub, channel, 1, received))
+        await asyncio.sleep(0.05)
+        await redis_client.publish(channel, "done")
+        await asyncio.wait_for(client, timeout=2)
+        await asyncio.sleep(0.05)
+        assert received == ["done"]
+        assert (await redis_client.pubsub_numsub(channel))[0][1] == 0
+
+    assert hub.stats()["clients"] == {}
+    # A channel can be watched again after the hub left it
+    received = []
+    client = asyncio.create_task(collect(hub, "jobs:0:progress", 1, received))
+    await asyncio.sleep(0.05)
+    await redis_client.publish("jobs:0:progress", "again")
+    await asyncio.wait_for(client, timeout=2)
+    assert received == ["again"]
+    await hub.close()
+
+@pytest.mark.asyncio
+async def test_hub_sends_heartbeats_and_drops_slow_clients():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    hub = PubSubHub(redis_client, queue_size=2, heartbeat_seconds=0.05)
+
+    idle = hub.messages("log_channel")
+    assert await asyncio.wait_for(idle.__anext__(), timeout=1) is None  # Heartbeat while nothing is published
+
+    for i in range(3):
+        await redis_client.publish("log_channel", str(i))
+    await asyncio.sleep(0.1)
+
+    # The client never read, so its queue overflowed and it was disconnected
+    assert hub.dropped_clients == 1
+    assert await idle.__anext__() == "1"
+    with pytest.raises(StopAsyncIteration):
+        await idle.__anext__()
+    await hub.close()
@@ -0,0 +1,29 @@
+import time
+import pytest
+
+from ..visited import VisitedUrlCache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.mark.asyncio
+async def test_visited_recently_batches_lookups_and_writes():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    await redis_client.hset("visited_urls", mapping={
+        "https://example.com/recent": time.time(),
+        "https://example.com/stale": time.time() - 100000,
+    })
+    visited = VisitedUrlCache(redis_client, revisit_interval=3600)
+
+    visited.mark("https://example.com/")
+    result = await visited.visited_recently(["https://example.com/recent", "https://example.com/stale", "https://example.com/new"])
+
+    assert result == {
+        "https://example.com/recent": True,
+        "https://example.com/stale": False,
+        "https://example.com/new": False,
+    }
+    # The pending visit was written in the same pipeline as the lookup
+    assert await redis_client.hexists("visited_urls", "https://example.com/")
+    # Resolved URLs are answered from memory afterwards
+    await redis_client.delete("visited_urls")
+    assert (await visited.visited_recently(["https://example.com/recent"]))["https://example.com/recent"] is True
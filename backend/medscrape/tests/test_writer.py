@@ -0,0 +1,127 @@
+import pytest
+
+from types import SimpleNamespace
+
+from ..writer import BulkWriter
+
+class FakeEmbedder:
+    def __init__(self):
+        self.batches = []
+
+    def compute_source_embeddings(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+class FakeMergeInsert:
+    def __init__(self, table, on):
+        self.table = table
+        self.on = on
+        self.delete_condition = None
+
+    def when_matched_update_all(self):
+        return self
+
+    def when_not_matched_insert_all(self):
+        return self
+
+    def when_not_matched_by_source_delete(self, condition=None):
+        self.delete_condition = condition
+        return self
+
+    def execute(self, rows):
+        self.table.adds.append(list(rows))
+        self.table.delete_conditions.append(self.delete_condition)
+        urls = {row["url"] for row in rows}
+        source = {row["chunk_id"] for row in rows}
+        self.table.rows = {key: row for key, row in self.table.rows.items() if row["url"] not in urls or key in source}
+        self.table.rows.update((row["chunk_id"], row) for row in rows)
+
+class FakeTable:
+    name = "ExtractedData"
+
+    def __init__(self):
+        self.adds = []
+        self.delete_conditions = []
+        self.rows = {}
+
+    def merge_insert(self, on):
+        assert on == "chunk_id"
+        return FakeMergeInsert(self, on)
+
+@pytest.mark.asyncio
+async def test_bulk_writer_buffers_across_pages_and_embeds_in_batches():
+    table, embedder = FakeTable(), FakeEmbedder()
+    writer = BulkWriter(table, embedder, max_rows=5, max_seconds=3600, embed_batch_size=2)
+
+    for page in range(4):
+        await writer.add([
+            {"chunk_id": f"{page}-0", "url": f"https://example.com/{page}", "text_chunk": "abc"},
+            {"chunk_id": f"{page}-1", "url": f"https://example.com/{page}", "text_chunk": "de"},
+        ])
+
+    # The third page pushed the buffer past max_rows; the fourth is still buffered
+    assert [len(rows) for rows in table.adds] == [6]
+    assert embedder.batches == [2, 2, 2]
+    assert table.adds[0][0]["embeddings"] == [3.0]
+    # Stale chunks are only removed for the URLs in the batch
+    assert table.delete_conditions[0] == "url IN ('https://example.com/0', 'https://example.com/1', 'https://example.com/2')"
+
+    stats = await writer.close(compact=False)
+    assert [len(rows) for rows in table.adds] == [6, 2]
+    assert stats["rows_written"] == 8
+    assert stats["flushes"] == 2
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rows_buffered():
+    table = FakeTable()
+    writer = BulkWriter(table, FakeEmbedder(), max_rows=100, max_seconds=3600)
+    failures = [OSError("disk full")]
+
+    def merge_insert(on):
+        if failures:
+            raise failures.pop()
+        return FakeMergeInsert(table, on)
+
+    table.merge_insert = merge_insert
+    await writer.add([{"chunk_id": "a-0", "url": "https://example.com/a", "text_chunk": "abc"}])
+    await writer.add([{"chunk_id": "b-0", "url": "https://example.com/b", "text_chunk": "de"}])
+    with pytest.raises(OSError):
+        await writer.flush()
+    assert writer.written_generation == 0  # Neither page may be recorded as written
+
+    await writer.add([{"chunk_id": "c-0", "url": "https://example.com/c", "text_chunk": "f"}])
+    stats = await writer.close(compact=False)
+    assert [row["chunk_id"] for row in table.adds[0]] == ["a-0", "b-0", "c-0"]
+    assert stats["rows_written"] == 3
+    assert writer.written_generation == writer.generation
+
+@pytest.mark.asyncio
+async def test_pages_sharing_a_chunk_keep_their_own_rows(monkeypatch):
+    pytest.importorskip("unstructured")
+    from .. import partitioning
+
+    class Element:
+        def __init__(self, text):
+            self.text = text
+            self.metadata = SimpleNamespace(to_dict=dict)
+
+    def rows(url, *texts):
+        monkeypatch.setattr(partitioning, "partition_html", lambda **kwargs: [Element(text) for text in texts])
+        return partitioning.partition_html_rows(url, "example.com", html="")[0]
+
+    table = FakeTable()
+    writer = BulkWriter(table, FakeEmbedder(), max_seconds=3600)
+    a, b = "https://example.com/a", "https://example.com/b"
+    await writer.add(rows(a, "Footer", "About A", "Footer"))
+    await writer.add(rows(b, "Footer", "About B"))
+    await writer.flush()
+    assert sorted((row["url"], row["text_chunk"]) for row in table.rows.values()) == [
+        (a, "About A"), (a, "Footer"), (a, "Footer"), (b, "About B"), (b, "Footer"),
+    ]
+
+    # Page a dropping the footer must not delete page b's copy
+    await writer.add(rows(a, "About A"))
+    await writer.close(compact=False)
+    assert sorted((row["url"], row["text_chunk"]) for row in table.rows.values()) == [
+        (a, "About A"), (b, "About B"), (b, "Footer"),
+    ]
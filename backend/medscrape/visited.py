@@ -0,0 +1,103 @@
+import os
+import json
+import time
+
+from typing import Dict, Iterable, Optional
+
+REVISIT_INTERVAL = int(os.getenv('REVISIT_INTERVAL', 43200))  # Default to 12 hours
+VISITED_URLS_KEY = "visited_urls"
+
+class VisitedUrlCache:
+    """
+    Async, batched view of the Redis `visited_urls` hash with an in-process cache in front of it.
+
+    Lookups are answered from memory where possible and the remainder is resolved with a single HMGET, pipelined
+    with the HSET of any visits recorded since the last round trip, so a crawled page costs one Redis call.
+    """
+
+    def __init__(self, redis_client, key=VISITED_URLS_KEY, revisit_interval=REVISIT_INTERVAL):
+        self.redis_client = redis_client
+        self.key = key
+        self.revisit_interval = revisit_interval
+        self._timestamps: Dict[str, float] = {}  # 0.0 records a URL Redis has never seen
+        self._pending: Dict[str, float] = {}
+
+    def _is_recent(self, timestamp, now):
+        return (now - timestamp) < self.revisit_interval
+
+    def mark(self, url, timestamp=None):
+        """
+        Records a visit locally; it is written to Redis with the next lookup or flush.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        self._timestamps[url] = timestamp
+        self._pending[url] = timestamp
+
+    async def visited_recently(self, urls: Iterable[str]) -> Dict[str, bool]:
+        """
+        Returns, for each URL, whether it was visited within the revisit interval.
+        """
+        now = time.time()
+        result = {}
+        unknown = []
+        for url in urls:
+            if url in self._timestamps:
+                result[url] = self._is_recent(self._timestamps[url], now)
+            elif url not in result:
+                result[url] = False
+                unknown.append(url)
+
+        pending, self._pending = self._pending, {}
+        if not pending and not unknown:
+            return result
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        if pending:
+            pipe.hset(self.key, mapping=pending)
+        if unknown:
+            pipe.hmget(self.key, unknown)
+        try:
+            replies = await pipe.execute()
+        except Exception:
+            pending.update(self._pending)
+            self._pending = pending  # Keep unsent visits so the next round trip retries them
+            raise
+
+        if unknown:
+            for url, timestamp in zip(unknown, replies[-1]):
+                timestamp = float(timestamp) if timestamp is not None else 0.0
+                self._timestamps.setdefault(url, timestamp)
+                result[url] = self._is_recent(self._timestamps[url], now)
+        return result
+
+    async def flush(self):
+        """
+        Writes any visits recorded since the last round trip to Redis.
+        """
+        pending, self._pending = self._pending, {}
+        if pending:
+            await self.redis_client.hset(self.key, mapping=pending)
+
+PAGE_STATE_KEY = "page_state"
+
+class PageStateStore:
+    """
+    Validators (ETag, Last-Modified) and content hash of every page as of its last successful ingest, kept in Redis.
+
+    The crawler uses them to send conditional requests and to recognise pages whose content has not changed.
+    """
+
+    def __init__(self, redis_client, key=PAGE_STATE_KEY):
+        self.redis_client = redis_client
+        self.key = key
+
+    async def get(self, url) -> Optional[dict]:
+        state = await self.redis_client.hget(self.key, url)
+        return json.loads(state) if state else None
+
+    async def save(self, states: Dict[str, dict]):
+        """
+        Records the state of pages whose rows have been written.
+        """
+        if states:
+            await self.redis_client.hset(self.key, mapping={url: json.dumps(state) for url, state in states.items()})
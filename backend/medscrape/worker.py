@@ -0,0 +1,99 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+
+from .jobs import CANCELLED, FAILED, SUCCEEDED, JobQueue, job_queue
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', 1))  # Jobs run at once by one worker process
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', 10))
+
+async def execute_job(queue: JobQueue, job: dict, run):
+    """
+    Runs one claimed job, heartbeating and watching for a cancel request until it finishes.
+
+    :param run: Coroutine function called with (job, on_progress) that returns the job's result.
+    """
+    job_id = job["id"]
+
+    async def on_progress(progress):
+        await queue.update_progress(job_id, progress)
+
+    task = asyncio.create_task(run(job, on_progress))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=JOB_HEARTBEAT_SECONDS)
+        if done:
+            break
+        if await queue.cancel_requested(job_id):
+            task.cancel()
+            break
+        await queue.heartbeat(job_id)
+
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        await queue.finish(job_id, CANCELLED)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}", extra={"channel": "log_channel"})
+        await queue.finish(job_id, FAILED, error=str(e))
+    else:
+        await queue.finish(job_id, SUCCEEDED, result=result)
+
+async def run_worker(queue: JobQueue, run, concurrency=JOB_WORKER_CONCURRENCY, worker_id=None, stop: asyncio.Event = None):
+    """
+    Claims and executes jobs until `stop` is set, running up to `concurrency` of them at once.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or asyncio.Event()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    last_requeue_check = 0.0
+    logger.info(f"Worker {worker_id} started with concurrency {concurrency}")
+
+    while not stop.is_set():
+        await slots.acquire()
+        try:
+            if time.monotonic() - last_requeue_check >= JOB_HEARTBEAT_SECONDS:
+                last_requeue_check = time.monotonic()
+                await queue.requeue_stale()
+            job = await queue.claim(worker_id, timeout=1)
+        except Exception as e:
+            slots.release()
+            logger.error(f"Worker {worker_id} could not claim a job: {e}")
+            await asyncio.sleep(1)
+            continue
+        if job is None:
+            slots.release()
+            continue
+        logger.info(f"Worker {worker_id} picked up {job['kind']} job {job['id']}")
+        task = asyncio.create_task(execute_job(queue, job, run))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+    await asyncio.gather(*running, return_exceptions=True)
+    logger.info(f"Worker {worker_id} stopped")
+
+async def main():
+    # Imported here so run_worker can be used without loading the crawl and embedding stack
+    from .export import result_exporter
+    from .fetching import http_client
+    from .log_shipping import log_shipper
+    from .pipeline import run_job
+    from .processing import shutdown_partition_executor
+
+    await http_client.start()
+    try:
+        await run_worker(job_queue, run_job)
+    finally:
+        await http_client.close()
+        shutdown_partition_executor()
+        result_exporter.close()
+        log_shipper.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
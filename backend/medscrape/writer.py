@@ -0,0 +1,161 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+from typing import List
+
+from .metrics import ingest_chunks, timed_stage
+
+logger = logging.getLogger(__name__)
+
+BULK_WRITE_ROWS = int(os.getenv('BULK_WRITE_ROWS', 2000))
+BULK_WRITE_SECONDS = float(os.getenv('BULK_WRITE_SECONDS', 30))
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 256))
+
+def upsert_rows(table, rows):
+    """
+    Writes `rows` as the complete set of chunks for every URL they contain.
+
+    Chunks are matched on `chunk_id`: existing ones are updated, new ones inserted, and chunks those URLs no longer
+    produce are deleted, so re-ingesting a changed page never leaves stale or duplicate rows behind.
+    """
+    urls = ", ".join("'" + url.replace("'", "''") + "'" for url in sorted({row["url"] for row in rows}))
+    (
+        table.merge_insert("chunk_id")
+        .when_matched_update_all()
+        .when_not_matched_insert_all()
+        .when_not_matched_by_source_delete(f"url IN ({urls})")
+        .execute(rows)
+    )
+
+class BulkWriter:
+    """
+    Buffers ExtractedData rows across pages and writes them to LanceDB in large batches.
+
+    Rows are embedded explicitly in batches of `embed_batch_size` before being upserted, so LanceDB stores the vectors
+    as given instead of embedding each small page on its own. A flush happens once `max_rows` rows are buffered or
+    `max_seconds` have passed since the previous flush, and `close` compacts the fragments written by the crawl.
+    """
+
+    def __init__(self, table, embed_func, write_lock=None, max_rows=BULK_WRITE_ROWS, max_seconds=BULK_WRITE_SECONDS, embed_batch_size=EMBED_BATCH_SIZE, embedding_cache=None):
+        self.table = table
+        self.embed_func = embed_func
+        self.embedding_cache = embedding_cache
+        self.write_lock = write_lock or threading.Lock()
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.embed_batch_size = embed_batch_size
+        self.rows_written = 0
+        self.flushes = 0
+        # Rows buffered while `generation` is n are durable once `written_generation` exceeds n
+        self.generation = 0
+        self.written_generation = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        self._buffer: List[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._started = time.monotonic()
+        self._last_flush = self._started
+
+    async def add(self, rows: List[dict]):
+        """
+        Buffers the rows of one page or PDF, flushing if a threshold has been reached.
+        """
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.max_rows or time.monotonic() - self._last_flush >= self.max_seconds:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Embeds and writes everything buffered so far.
+
+        If the write fails the rows go back into the buffer and the error is raised, so pages that already handed
+        their rows over are neither lost nor reported as written; the next flush or `close` tries them again.
+        """
+        async with self._flush_lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if rows:
+                self.generation += 1
+                generation = self.generation
+                try:
+                    await asyncio.to_thread(self._write, rows)
+                except BaseException:
+                    self._buffer[:0] = rows
+                    raise
+                self.written_generation = generation
+
+    def _compute_embeddings(self, texts):
+        vectors = []
+        for i in range(0, len(texts), self.embed_batch_size):
+            vectors.extend(self.embed_func.compute_source_embeddings(texts[i:i + self.embed_batch_size]))
+        return vectors
+
+    def _write(self, rows):
+        start = time.monotonic()
+        # merge_insert rejects a batch with two rows for the same chunk id, e.g. a page buffered twice
+        rows = list({row["chunk_id"]: row for row in rows}.values())
+        texts = [row["text_chunk"] for row in rows]
+        with timed_stage("embed"):
+            if self.embedding_cache is not None:
+                vectors = self.embedding_cache.embed(texts, self._compute_embeddings)
+            else:
+                vectors = self._compute_embeddings(texts)
+        for row, vector in zip(rows, vectors):
+            row["embeddings"] = vector
+        embedded = time.monotonic()
+
+        with timed_stage("write"), self.write_lock:
+            upsert_rows(self.table, rows)
+
+        self.embed_seconds += embedded - start
+        self.write_seconds += time.monotonic() - embedded
+        self.rows_written += len(rows)
+        ingest_chunks.inc(len(rows))
+        self.flushes += 1
+        logger.info(f"Flushed {len(rows)} rows to {self.table.name} in {time.monotonic() - start:.2f}s")
+
+    def fragment_count(self):
+        return len(self.table.to_lance().get_fragments())
+
+    def _compact(self):
+        with self.write_lock:
+            fragments_before = self.fragment_count()
+            if hasattr(self.table, "optimize"):
+                self.table.optimize()
+            else:
+                self.table.compact_files()
+                self.table.cleanup_old_versions()
+            return fragments_before, self.fragment_count()
+
+    async def close(self, compact=True) -> dict:
+        """
+        Flushes remaining rows, optionally compacts the table, and returns ingest statistics.
+        """
+        await self.flush()
+        fragments_before = fragments_after = None
+        if compact and self.rows_written:
+            try:
+                fragments_before, fragments_after = await asyncio.to_thread(self._compact)
+            except Exception as e:
+                logger.error(f"Error compacting {self.table.name}: {e}")
+        stats = self.stats()
+        stats["fragments_before_compaction"] = fragments_before
+        stats["fragments_after_compaction"] = fragments_after
+        logger.info(f"Bulk writer closed: {stats}")
+        return stats
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started
+        busy = self.embed_seconds + self.write_seconds
+        return {
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "rows_per_second": round(self.rows_written / elapsed, 2) if elapsed else 0.0,
+            "write_rows_per_second": round(self.rows_written / busy, 2) if busy else 0.0,
+            "embed_seconds": round(self.embed_seconds, 3),
+            "write_seconds": round(self.write_seconds, 3),
+            "embedding_cache_hit_rate": round(self.embedding_cache.hit_rate(), 4) if self.embedding_cache is not None else None,
+        }
@@ -2,7 +2,7 @@
  
 import { zodResolver } from "@hookform/resolvers/zod"
 import { useForm } from "react-hook-form"
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { z } from "zod"
  
 import { Button } from "@/components/ui/button"
@@ -39,6 +39,9 @@ export function ProcessInputForm({ appendLog }: ProcessInputFormProps) {
  
   const [isLoading, setIsLoading] = useState(false); // State to track loading status
   const [progress, setProgress] = useState(0); // State to track progress
+  const [jobId, setJobId] = useState<string | null>(null); // Queued job being processed
+  const appendLogRef = useRef(appendLog); // The parent passes a new function on every render
+  appendLogRef.current = appendLog;
 
   useEffect(() => {
     if (!isLoading) {
@@ -47,22 +50,37 @@ export function ProcessInputForm({ appendLog }: ProcessInputFormProps) {
   }, [isLoading]);
 
   useEffect(() => {
-    if (isLoading) {
-      const eventSource = new EventSource(`${process.env.NEXT_PUBLIC_API_URL}/progress_stream/`);  
-      eventSource.onmessage = function(event) {
-        const data = JSON.parse(event.data);
-        setProgress(data.progress);
-        console.log("Progress updated:", data.progress);
-      };
-      return () => {
-        eventSource.close();
-      };
+    if (!jobId) {
+      return;
     }
-  }, [isLoading]);
+    // The crawl runs as a job on a worker; poll it until it finishes
+    const interval = setInterval(async () => {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/jobs/${jobId}`);
+      if (!response.ok) {
+        return;
+      }
+      const job = await response.json();
+      if (job.progress?.stage === "processing") {
+        setProgress(job.progress.progress);
+      }
+      if (["succeeded", "failed", "cancelled"].includes(job.status)) {
+        clearInterval(interval);
+        setJobId(null);
+        setIsLoading(false);
+        appendLogRef.current(`Processing ${job.status}: ${JSON.stringify(job.result ?? job.error ?? {})}`, "response");
+        toast({
+          title: job.status === "succeeded" ? "Processing complete" : "Error",
+          description: job.status === "succeeded" ? "The website has been processed." : `Processing ${job.status}.`,
+        });
+      }
+    }, 2000);
+    return () => {
+      clearInterval(interval);
+    };
+  }, [jobId]);
 
   async function onSubmit(data: z.infer<typeof FormSchema>) {
     setIsLoading(true); // Set loading to true when process starts
-    console.log("isLoading set to true");
     setProgress(0); // Reset progress to 0 on new submission
     appendLog(`Processing website: ${data.url}`, "request");
 
@@ -78,17 +96,16 @@ export function ProcessInputForm({ appendLog }: ProcessInputFormProps) {
       body: JSON.stringify(requestData),
     });
 
-    setIsLoading(false); // Set loading to false when process ends
-    console.log("isLoading set to false");
-
     if (response.ok) {
       const result = await response.json();
-      appendLog(`Processing initiated: ${JSON.stringify(result)}`, "response");
+      appendLog(`Processing queued: ${JSON.stringify(result)}`, "response");
+      setJobId(result.job_id); // Loading ends once the job finishes
       toast({
-        title: "Processing initiated",
+        title: "Processing queued",
         description: "The website is being processed.",
       });
     } else {
+      setIsLoading(false);
       toast({
         title: "Error",
         description: "There was an error processing the website.",